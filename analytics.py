@@ -0,0 +1,232 @@
+import heapq
+import logging
+import os
+import pickle
+from collections import Counter
+from urllib.parse import urlparse
+
+import crawl_log
+from crawl_log import CrawlLog
+from seen_store import SeenSet
+from tokenizer import Tokenizer
+
+logger = logging.getLogger(__name__)
+
+
+class Analytics:
+    """
+    This class accumulates the analytics of a crawl while it runs, so the report can be written without fetching the
+    crawled pages again. The outcome of every url is written to a CrawlLog as it happens, and the lists of crawled,
+    trap and duplicate urls of the report are streamed from the log, so only the totals are kept in memory. Its state
+    can be saved and loaded together with the frontier so the report of a resumed crawl covers the pages crawled
+    before the restart.
+
+    Attributes:
+        subdomains: a Counter of subdomain -> number of crawled urls in it
+        page_most_links: the crawled url with the most valid out links and its count
+        longest_page: the crawled url with the most tokens and its count
+        vocabulary: a Counter of word -> number of times it appears in all the crawled pages, stop words excluded
+        downloaded: the number of crawled urls
+        removed_seen: the urls identified as traps, so each is logged once
+        log: the CrawlLog of the outcome of every url
+        log_files: the crawl logs the report is generated from, None for the log of this crawl only
+    """
+
+    # File names to be used when loading and saving the analytics state, next to the frontier state
+    ANALYTICS_DIR_NAME = "frontier_state"
+    ANALYTICS_FILE_NAME = os.path.join(".", ANALYTICS_DIR_NAME, "analytics.pkl")
+
+    def __init__(self, stop_words=()):
+        self.tokenizer = Tokenizer(stop_words)
+        self.subdomains = Counter()
+        self.page_most_links = {"link": "", "count": 0}
+        self.longest_page = {"link": "", "count": 0}
+        self.vocabulary = Counter()
+        self.downloaded = 0
+        self.removed_seen = SeenSet()
+        self.log = CrawlLog()
+        self.log_files = None
+
+    def add_page(self, url, record, valid_links_count):
+        """
+        Updates the analytics with a crawled page, its PageRecord and the number of valid links found in it
+        """
+        self.downloaded += 1
+        self.log.fetched(url, record.http_code, len(record.links), valid_links_count, record.token_count)
+
+        # -----------Analytics #1----------
+        # counting urls each subdomains fetched
+        self.subdomains[urlparse(url).netloc] += 1
+
+        # update link with the most valid links out
+        if valid_links_count > self.page_most_links["count"]:
+            self.page_most_links = {
+                "link": url,
+                "count": valid_links_count
+            }
+
+        # ----------Analytics #4--------
+        if record.content_type is None or record.token_count == 0:
+            return
+        # finding largest page
+        if record.token_count > self.longest_page["count"]:
+            self.longest_page = {
+                "link": url,
+                "count": record.token_count
+            }
+        # accumulating counts for each word from all webpages and adding it to vocabulary
+        self.vocabulary.update(self.tokenizer.remove_stop_words(record.tokens))
+
+    def add_removed(self, url, reason=None):
+        """
+        Records a url that was identified as a trap by the rule of the given reason code
+        """
+        if self.removed_seen.add(url):
+            self.log.rejected(url, reason)
+
+    def add_duplicate(self, url, canonical_url):
+        """
+        Records a crawled url whose page is an exact copy of the page of canonical_url
+        """
+        self.log.duplicate(url, canonical_url)
+
+    def get_log_files(self):
+        """
+        Returns the file names of the crawl logs the report is generated from
+        """
+        return self.log_files if self.log_files is not None else [self.log.LOG_FILE_NAME]
+
+    def merge(self, other):
+        """
+        Adds the analytics of a crawl of other urls, such as another shard of a sharded crawl, to these analytics
+        """
+        self.subdomains.update(other.subdomains)
+        if other.page_most_links["count"] > self.page_most_links["count"]:
+            self.page_most_links = other.page_most_links
+        if other.longest_page["count"] > self.longest_page["count"]:
+            self.longest_page = other.longest_page
+        self.vocabulary.update(other.vocabulary)
+        self.downloaded += other.downloaded
+        # the lists of the report are streamed from the logs of both crawls, one after the other
+        self.log_files = self.get_log_files() + other.get_log_files()
+
+    def top_words(self, n=50):
+        """
+        Returns the n most common words of the vocabulary and their counts, most common first
+        """
+        return heapq.nlargest(n, self.vocabulary.items(), key=lambda item: item[1])
+
+    def write_report(self, file_name="analytics.txt"):
+        """
+        Writes the report of the analytics to the given file, replacing the report of a previous run. The lists of
+        urls are streamed from the crawl logs, one pass per list
+        """
+        self.log.flush()
+        log_files = self.get_log_files()
+        with open(file_name, "w", encoding="utf-8") as file:
+            # Analytics 2: getting most valid out links
+            file.write(f"Link with the most valid out links:\n{self.page_most_links}\n")
+
+            # Analytics 3: List of downloaded and list of identified traps
+            file.write("\n\nList of downloaded urls:\n")
+            for entry in self.read_logs(log_files, crawl_log.FETCHED):
+                file.write(f"URL: {entry['url']}\n")
+            file.write("\n\nList of identified trap urls:\n")
+            # every log has each trap once, but the crawls of merged logs can share traps
+            removed_seen = SeenSet() if len(log_files) > 1 else None
+            for entry in self.read_logs(log_files, crawl_log.REJECTED):
+                if removed_seen is None or removed_seen.add(entry["url"]):
+                    file.write(f"URL: {entry['url']}\n")
+            file.write("\n\nList of duplicate urls:\n")
+            for entry in self.read_logs(log_files, crawl_log.DUPLICATE):
+                file.write(f"URL: {entry['url']} (copy of {entry['copy_of']})\n")
+
+            # Analytics 1: writing to file the subdomains and number of links
+            file.write("\n\nSubdomains: Links proccessed\n")
+            for subdomain, count in self.subdomains.items():
+                file.write(f"{subdomain}: {count}\n")
+
+            # Analytics 4: writing to analytics page the longest page url and its count
+            file.write(f"\n\nLongest Page: \n{self.longest_page}\n")
+
+            # Analytics 5: writing to analytics the 50 most common words in all webpages and its count
+            file.write("\n\n50 most common words:\n")
+            for rank, (word, count) in enumerate(self.top_words(50), 1):
+                file.write(f"{rank}. {word}: {count}\n")
+
+    @staticmethod
+    def read_logs(log_files, outcome):
+        """
+        Yields the entries of the given outcome of every crawl log, one log after the other
+        """
+        for log_file in log_files:
+            yield from crawl_log.read_log(log_file, outcome)
+
+    def get_state(self):
+        """
+        Returns the accumulated analytics as a dictionary that can be pickled
+        """
+        return {
+            "subdomains": self.subdomains,
+            "page_most_links": self.page_most_links,
+            "longest_page": self.longest_page,
+            "vocabulary": self.vocabulary,
+            "downloaded": self.downloaded,
+            "removed_seen": self.removed_seen,
+            "log_size": self.log.size()
+        }
+
+    def set_state(self, state):
+        """
+        Replaces the accumulated analytics with a state returned by get_state
+        """
+        self.subdomains = state["subdomains"]
+        self.page_most_links = state["page_most_links"]
+        self.longest_page = state["longest_page"]
+        self.vocabulary = state["vocabulary"]
+        self.removed_seen = state["removed_seen"]
+        # the merged state of a sharded crawl points to the logs of its shards
+        self.log_files = state.get("log_files")
+        if "log_size" in state:
+            self.downloaded = state["downloaded"]
+            self.log.start = state["log_size"]
+            return
+        # states saved before the crawl log kept the lists of urls, which start the log
+        self.downloaded = len(state["downloaded"])
+        self.log.start = 0
+        for url in state["downloaded"]:
+            self.log.write({"url": url, "outcome": crawl_log.FETCHED})
+        for url in state["removed"]:
+            self.log.rejected(url, None)
+        for url, canonical_url in state.get("duplicates", ()):
+            self.log.duplicate(url, canonical_url)
+
+    def restore_state(self, state):
+        """
+        Resumes the analytics of a previous run from a state returned by get_state
+        """
+        self.set_state(state)
+        # the lines logged after the state was saved are dropped now, before the report can read them
+        self.log.open()
+
+    def save_state(self):
+        """
+        saves the accumulated analytics next to the frontier state using pickle
+        """
+        if not os.path.exists(self.ANALYTICS_DIR_NAME):
+            os.makedirs(self.ANALYTICS_DIR_NAME)
+        with open(self.ANALYTICS_FILE_NAME, "wb") as analytics_file:
+            pickle.dump(self.get_state(), analytics_file)
+
+    def load_state(self):
+        """
+        loads the accumulated analytics of a previous run into memory, if exists
+        """
+        if not os.path.isfile(self.ANALYTICS_FILE_NAME):
+            return
+        try:
+            with open(self.ANALYTICS_FILE_NAME, "rb") as analytics_file:
+                self.restore_state(pickle.load(analytics_file))
+            logger.info("Loaded previous analytics state into memory. Downloaded: %s", self.downloaded)
+        except (OSError, EOFError, pickle.UnpicklingError, KeyError) as e:
+            logger.warning("Could not load previous analytics state: %s", e)
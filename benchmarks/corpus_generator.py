@@ -0,0 +1,203 @@
+"""
+Writes a synthetic corpus in the on-disk format read by Corpus: one CBOR file per url, named by Corpus.get_hashed_link,
+with raw_content, http_code, http_headers, is_redirected and final_url. Run from the repository root:
+
+    python -m benchmarks.corpus_generator output_dir [--pages 5000] [--duplicate-rate 0.05] [--trap-rate 0.1]
+"""
+import argparse
+import json
+import os
+import random
+
+from cbor import cbor
+
+from corpus import Corpus
+
+
+class CorpusGenerator:
+    """
+    This class generates a synthetic corpus that looks like a small crawl of ics.uci.edu. Every page is reachable from
+    the seed url: each page is linked from one page generated before it, and also from links_per_page random links of
+    other pages. Besides the regular pages, the corpus has
+
+    - exact duplicates (byte for byte copies of another page) and near duplicates (a copy of the text of another page
+      with a few words changed), duplicate_rate of the pages each. Since an exact duplicate has the links of the page
+      it copies, no page is reachable from an exact duplicate only
+    - redirects, redirect_rate of the pages, served with the content of the page they redirect to
+    - trap chains, trap_rate of the pages: calendars whose days link to the next day, login pages whose links carry a
+      new session id, and directories that repeat themselves deeper and deeper. The pages of a chain have nearly the
+      same content and each chain is trap_depth pages long
+    - links that the crawler must drop: other domains, files, fragments, mailto and javascript urls
+
+    The generation is deterministic for a given seed.
+    """
+
+    SEED_URL = "http://www.ics.uci.edu/"
+    DIRECTORIES = ["people", "research", "courses", "news", "projects", "events", "groups", "about"]
+    TRAP_KINDS = ["calendar", "session", "repeated"]
+
+    def __init__(self, output_dir, pages=5000, hosts=8, links_per_page=20, words_per_page=400, duplicate_rate=0.05,
+                 redirect_rate=0.02, trap_rate=0.1, trap_depth=50, vocabulary_size=20000, seed=0):
+        self.output_dir = output_dir
+        self.pages = pages
+        self.hosts = ["www.ics.uci.edu"] + [f"host{i}.ics.uci.edu" for i in range(1, hosts)]
+        self.links_per_page = links_per_page
+        self.words_per_page = words_per_page
+        self.duplicate_rate = duplicate_rate
+        self.redirect_rate = redirect_rate
+        self.trap_rate = trap_rate
+        self.trap_depth = trap_depth
+        self.random = random.Random(seed)
+        self.vocabulary = [self.make_word() for _ in range(vocabulary_size)]
+        # Zipf-like word frequencies, as in natural text
+        self.cumulative_weights = []
+        total = 0.0
+        for rank in range(1, vocabulary_size + 1):
+            total += 1 / rank
+            self.cumulative_weights.append(total)
+
+    def make_word(self):
+        return "".join(self.random.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(self.random.randint(2, 11)))
+
+    def make_text(self, num_words):
+        return " ".join(self.random.choices(self.vocabulary, cum_weights=self.cumulative_weights, k=num_words))
+
+    def make_kind(self):
+        """
+        Returns the kind of a page that is not the seed: regular, exact_duplicates or near_duplicates
+        """
+        roll = self.random.random()
+        if roll < self.duplicate_rate:
+            return "exact_duplicates"
+        if roll < 2 * self.duplicate_rate:
+            return "near_duplicates"
+        return "regular"
+
+    def make_url(self, i):
+        host = self.random.choice(self.hosts)
+        directories = self.random.sample(self.DIRECTORIES, self.random.randint(0, 2))
+        return f"http://{host}/" + "".join(directory + "/" for directory in directories) + f"page{i}.html"
+
+    def make_trap_chain(self, kind, chain):
+        """
+        Returns the urls of a trap chain of the given kind
+        """
+        host = self.random.choice(self.hosts)
+        if kind == "calendar":
+            return [f"http://{host}/calendar/?date=2019-{1 + day // 28:02d}-{1 + day % 28:02d}&view=day{chain}"
+                    for day in range(self.trap_depth)]
+        if kind == "session":
+            return [f"http://{host}/login.php?sessionid={self.random.getrandbits(64):016x}"
+                    for _ in range(self.trap_depth)]
+        return [f"http://{host}/projects/t{chain}/" + "files/" * depth for depth in range(1, self.trap_depth + 1)]
+
+    def make_html(self, title, text, links):
+        anchors = "".join(f'<li><a href="{link}">{title} link {i}</a></li>' for i, link in enumerate(links))
+        return (f"<!DOCTYPE html><html><head><title>{title}</title>"
+                f"<style>body {{ margin: 0 }} .nav li {{ display: inline }}</style>"
+                f"<script>var page = {{title: '{title}'}};</script></head>"
+                f"<body><ul class='nav'>{anchors}</ul><div class='content'><p>{text}</p></div></body></html>")
+
+    def make_record(self, content, final_url=None, content_type=b"text/html; charset=utf-8"):
+        return {
+            b"raw_content": {b"value": content},
+            b"http_code": {b"value": 200},
+            b"http_headers": {b"value": [{b"k": {b"value": b"Content-Type"}, b"v": {b"value": content_type}}]},
+            b"is_redirected": {b"value": final_url is not None},
+            b"final_url": {b"value": final_url}
+        }
+
+    def write_record(self, url, record):
+        with open(os.path.join(self.output_dir, Corpus.get_hashed_link(url)), "wb") as file:
+            cbor.dump(record, file)
+
+    def generate(self):
+        """
+        Writes the corpus and returns a dictionary of the number of pages of each kind
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        num_traps = int(self.pages * self.trap_rate)
+        num_chains = max(1, num_traps // self.trap_depth) if num_traps else 0
+        num_regular = self.pages - num_chains * self.trap_depth
+
+        urls = [self.SEED_URL] + [self.make_url(i) for i in range(1, num_regular)]
+        kinds = ["regular"] + [self.make_kind() for _ in range(1, num_regular)]
+        # every page but the seed is linked from a page before it that is not an exact duplicate, so the whole corpus
+        # is reachable
+        links = [[] for _ in urls]
+        parents = [0]
+        for i in range(1, len(urls)):
+            links[self.random.choice(parents)].append(urls[i])
+            if kinds[i] != "exact_duplicates":
+                parents.append(i)
+        chains = [self.make_trap_chain(self.TRAP_KINDS[chain % len(self.TRAP_KINDS)], chain)
+                  for chain in range(num_chains)]
+        for chain in chains:
+            links[self.random.choice(parents)].append(chain[0])
+
+        stats = {"regular": 0, "exact_duplicates": 0, "near_duplicates": 0, "redirects": 0, "traps": 0}
+        texts = []
+        contents = []
+        for i, url in enumerate(urls):
+            kind = kinds[i]
+            stats[kind] += 1
+            if kind == "exact_duplicates":
+                source = self.random.randrange(i)
+                text, content = texts[source], contents[source]
+            else:
+                page_links = links[i] + self.random.sample(urls, min(self.links_per_page, len(urls)))
+                page_links += [f"http://www.example.com/page{i}.html", f"/files/report{i}.pdf",
+                               f"{url}#section{i % 3}", "mailto:webmaster@ics.uci.edu", "javascript:void(0)"]
+                if kind == "near_duplicates":
+                    words = self.random.choice(texts).split()
+                    for _ in range(max(1, len(words) // 50)):
+                        words[self.random.randrange(len(words))] = self.random.choice(self.vocabulary)
+                    text = " ".join(words)
+                else:
+                    text = self.make_text(self.words_per_page)
+                content = self.make_html(f"Page {i}", text, page_links).encode("utf-8")
+            texts.append(text)
+            contents.append(content)
+
+            if i != 0 and self.random.random() < self.redirect_rate:
+                # the page moved to https, where its content is served
+                final_url = "https" + url[len("http"):]
+                self.write_record(url, self.make_record(content, final_url))
+                stats["redirects"] += 1
+            else:
+                self.write_record(url, self.make_record(content))
+
+        for chain in chains:
+            text = self.make_text(self.words_per_page)
+            for depth, url in enumerate(chain):
+                next_links = chain[depth + 1:depth + 2] + [self.random.choice(urls)]
+                content = self.make_html(f"Trap {depth}", f"{text} {depth}", next_links).encode("utf-8")
+                self.write_record(url, self.make_record(content))
+                stats["traps"] += 1
+        return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Writes a synthetic corpus in the format read by Corpus")
+    parser.add_argument("output_dir", help="directory the corpus files are written to")
+    parser.add_argument("--pages", type=int, default=5000, help="number of pages, trap pages included")
+    parser.add_argument("--hosts", type=int, default=8, help="number of ics.uci.edu subdomains")
+    parser.add_argument("--links-per-page", type=int, default=20, help="number of random links of every page")
+    parser.add_argument("--words-per-page", type=int, default=400, help="number of words of the text of a page")
+    parser.add_argument("--duplicate-rate", type=float, default=0.05,
+                        help="fraction of the pages that are exact duplicates, and again of near duplicates")
+    parser.add_argument("--redirect-rate", type=float, default=0.02, help="fraction of the pages that are redirects")
+    parser.add_argument("--trap-rate", type=float, default=0.1, help="fraction of the pages that are in trap chains")
+    parser.add_argument("--trap-depth", type=int, default=50, help="number of pages of a trap chain")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random generator")
+    args = parser.parse_args()
+
+    generator = CorpusGenerator(args.output_dir, pages=args.pages, hosts=args.hosts,
+                                links_per_page=args.links_per_page, words_per_page=args.words_per_page,
+                                duplicate_rate=args.duplicate_rate, redirect_rate=args.redirect_rate,
+                                trap_rate=args.trap_rate, trap_depth=args.trap_depth, seed=args.seed)
+    print(json.dumps(generator.generate()))
+
+
+if __name__ == "__main__":
+    main()
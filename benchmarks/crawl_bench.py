@@ -0,0 +1,130 @@
+"""
+Times a full crawl of a corpus and the stages of the crawl, and saves the results as JSON so runs can be compared.
+Run from the repository root, for example on a corpus written by benchmarks.corpus_generator:
+
+    python -m benchmarks.crawl_bench corpus_dir [--crawler serial|parallel] [--similarity links|pages]
+        [--output run.json] [--compare base.json]
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+
+from corpus import Corpus, CorpusIndex
+from corpus_archive import ArchiveCorpus
+from crawler import Crawler
+from frontier import Frontier
+from metrics import registry
+from parallel_crawler import ParallelCrawler
+
+
+def peak_rss_mb(who):
+    """
+    Returns the peak resident set size in MB of this process (resource.RUSAGE_SELF) or of its largest finished child
+    process (resource.RUSAGE_CHILDREN)
+    """
+    max_rss = resource.getrusage(who).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return max_rss / (1024 * 1024) if sys.platform == "darwin" else max_rss / 1024
+
+
+def run(corpus_dir, crawler_type="serial", workers=4, extraction="stream", similarity="links"):
+    """
+    Crawls the corpus from the seed url and returns the results of the run as a dictionary
+    """
+    start = time.perf_counter()
+    if os.path.isfile(corpus_dir):
+        corpus = ArchiveCorpus(corpus_dir)
+        corpus_files = len(corpus)
+    else:
+        # the index is built without saving a snapshot, so the snapshot of the real corpus is kept
+        corpus = Corpus(corpus_dir, CorpusIndex.build(corpus_dir))
+        corpus_files = len(corpus.index)
+    index_seconds = time.perf_counter() - start
+
+    frontier = Frontier()
+    frontier.add_url("http://www.ics.uci.edu/")
+    if crawler_type == "parallel":
+        crawler = ParallelCrawler(frontier, corpus, workers=workers)
+    else:
+        crawler = Crawler(frontier, corpus)
+    crawler.page_processor.extraction = extraction
+    crawler.deferred_similarity = similarity == "pages"
+
+    # the stages are timed by the timers of the metrics registry, which the crawler runs through anyway. A stage
+    # includes the stages run inside it, such as the fetch and parse of the pages checked for similarity
+    registry.reset()
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory() as report_dir:
+        # the crawl log goes next to the report instead of the frontier state of a real crawl
+        crawler.analytics.log.LOG_DIR_NAME = report_dir
+        crawler.analytics.log.LOG_FILE_NAME = os.path.join(report_dir, "crawl_log.jsonl")
+        crawler.start_crawling()
+        crawler.analytics.write_report(os.path.join(report_dir, "analytics.txt"))
+        crawler.analytics.log.close()
+    crawl_seconds = time.perf_counter() - start
+
+    stages = {name: {"seconds": timer.histogram.total, "calls": timer.histogram.count}
+              for name, timer in registry.stages.items() if timer.histogram.count}
+    return {
+        "corpus_dir": os.path.abspath(corpus_dir),
+        "corpus_files": corpus_files,
+        "crawler": crawler_type,
+        "workers": workers if crawler_type == "parallel" else 1,
+        "extraction": extraction,
+        "similarity": similarity,
+        "python": platform.python_version(),
+        "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "pages": frontier.fetched,
+        "index_seconds": index_seconds,
+        "crawl_seconds": crawl_seconds,
+        "pages_per_sec": frontier.fetched / crawl_seconds if crawl_seconds else 0.0,
+        "peak_rss_mb": peak_rss_mb(resource.RUSAGE_SELF),
+        "peak_worker_rss_mb": peak_rss_mb(resource.RUSAGE_CHILDREN),
+        "stages": stages
+    }
+
+
+def print_results(results, baseline=None):
+    print(f"{results['pages']} pages in {results['crawl_seconds']:.2f} s: {results['pages_per_sec']:.1f} pages/sec, "
+          f"peak RSS {results['peak_rss_mb']:.1f} MB (workers {results['peak_worker_rss_mb']:.1f} MB)")
+    if baseline is not None:
+        print(f"baseline: {baseline['pages']} pages, {baseline['pages_per_sec']:.1f} pages/sec "
+              f"({results['pages_per_sec'] / baseline['pages_per_sec']:.2f}x), "
+              f"peak RSS {baseline['peak_rss_mb']:.1f} MB")
+    for stage, values in sorted(results["stages"].items(), key=lambda item: -item[1]["seconds"]):
+        line = f"  {stage:<12} {values['seconds']:9.3f} s {values['calls']:9d} calls"
+        if baseline is not None and stage in baseline["stages"]:
+            line += f"   baseline {baseline['stages'][stage]['seconds']:9.3f} s"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Times a full crawl of a corpus and its stages")
+    parser.add_argument("corpus_dir", help="directory of the corpus to crawl, or a corpus archive file")
+    parser.add_argument("--crawler", choices=["serial", "parallel"], default="serial")
+    parser.add_argument("--workers", type=int, default=4, help="number of worker processes of the parallel crawler")
+    parser.add_argument("--extraction", choices=["stream", "tree"], default="stream")
+    parser.add_argument("--similarity", choices=["links", "pages"], default="links",
+                        help="check the similarity of the page of every link, or of every crawled page once")
+    parser.add_argument("--output", help="JSON file the results are written to")
+    parser.add_argument("--compare", help="JSON file of a previous run to compare the results with")
+    args = parser.parse_args()
+
+    results = run(args.corpus_dir, args.crawler, args.workers, args.extraction, args.similarity)
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as file:
+            baseline = json.load(file)
+    print_results(results, baseline)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
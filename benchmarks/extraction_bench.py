@@ -0,0 +1,81 @@
+"""
+Compares the per-page extraction times of the stream and tree extractions of the PageProcessor. The pages are the ones
+of a corpus directory, or synthetic pages if none is given. Run from the repository root:
+
+    python -m benchmarks.extraction_bench [corpus_dir] [--pages 2000]
+"""
+import argparse
+import os
+import random
+
+import cbor
+
+from page_cache import CachedCorpus, PageCache
+from page_processor import PageProcessor
+
+
+def make_page(generator, num_links=60, num_paragraphs=40):
+    """
+    Returns the html of a synthetic page with a head, scripts, styles, links and paragraphs of text
+    """
+    words = ["crawler", "research", "student", "faculty", "course", "project", "the", "and", "of", "ics", "uci"]
+    parts = ["<!DOCTYPE html><html><head><title>Synthetic page</title>",
+             "<style>body { font-family: sans-serif; } .nav a { color: #333; }</style>",
+             "<script>var tracking = {id: 42, pages: [1, 2, 3]}; function f(a) { return a < 2; }</script>",
+             "</head><body><div class='nav'>"]
+    for i in range(num_links):
+        parts.append(f"<a href='/dir{generator.randint(0, 20)}/page{i}.html'>link {i}</a> ")
+    parts.append("</div><div class='content'>")
+    for _ in range(num_paragraphs):
+        parts.append("<p>" + " ".join(generator.choice(words) for _ in range(generator.randint(20, 80))) + "</p>")
+    parts.append("</div><script>document.write('<p>not visible</p>');</script></body></html>")
+    return "".join(parts).encode("utf-8")
+
+
+def load_pages(corpus_dir, num_pages):
+    """
+    Returns the url_data of up to num_pages pages of a corpus directory, or of synthetic pages if corpus_dir is None
+    """
+    pages = []
+    if corpus_dir is None:
+        generator = random.Random(0)
+        for i in range(num_pages):
+            pages.append({"url": f"http://www.ics.uci.edu/page{i}.html", "content": make_page(generator),
+                          "content_type": "text/html", "is_redirected": False, "final_url": None})
+        return pages
+
+    for dir_entry in os.scandir(corpus_dir):
+        if len(pages) == num_pages:
+            break
+        with open(dir_entry.path, "rb") as file:
+            data = cbor.load(file)
+        content = data.get(b"raw_content", {}).get(b"value")
+        if not content:
+            continue
+        # the corpus files do not keep their url, links are resolved against a made up one
+        pages.append({"url": f"http://www.ics.uci.edu/{dir_entry.name}", "content": content, "content_type": None,
+                      "is_redirected": False, "final_url": None})
+    return pages
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compares the per-page times of the stream and tree extractions")
+    parser.add_argument("corpus_dir", nargs="?", help="directory of a corpus, synthetic pages are used if not given")
+    parser.add_argument("--pages", type=int, default=2000, help="maximum number of pages to extract")
+    args = parser.parse_args()
+
+    pages = load_pages(args.corpus_dir, args.pages)
+    print(f"{len(pages)} pages")
+    for extraction in (PageProcessor.TREE, PageProcessor.STREAM):
+        # a cache of one entry keeps the parsed documents of the tree extraction from being reused
+        processor = PageProcessor(CachedCorpus(None, PageCache(max_entries=1)), extraction=extraction)
+        for url_data in pages:
+            processor.process(url_data)
+        summary = processor.extraction_times.summary()
+        print(f"{extraction:<7} total {processor.extraction_times.total:8.3f} s  mean {summary['mean'] * 1000:7.3f} ms  "
+              f"p50 <= {summary['p50'] * 1000:7.3f} ms  p90 <= {summary['p90'] * 1000:7.3f} ms  "
+              f"p99 <= {summary['p99'] * 1000:7.3f} ms  fallbacks {processor.fallbacks}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Compares fetching the records of a corpus directory with a full CBOR decode, with the lazy record of Corpus.fetch_url
+and with a metadata-only fetch, by time and by memory allocated. Run from the repository root:
+
+    python -m benchmarks.fetch_bench corpus_dir [--files 2000]
+"""
+import argparse
+import os
+import time
+import tracemalloc
+
+from cbor import cbor
+
+from corpus import Corpus, CorpusIndex
+
+
+def eager_fetch(corpus, file_name):
+    """
+    The fetch that was used before the lazy record: the whole record is decoded, content included
+    """
+    with open(os.path.join(corpus.corpus_base_dir, file_name), "rb") as corpus_file:
+        data_dict = cbor.loads(corpus_file.read())
+    content_type = None
+    for header in data_dict[b"http_headers"][b"value"] if b"http_headers" in data_dict else ():
+        if header[b"k"][b"value"] == b"Content-Type":
+            content_type = str(header[b"v"][b"value"])
+            break
+    return data_dict[b"raw_content"][b"value"], data_dict[b"http_code"][b"value"], content_type
+
+
+def measure(function, items):
+    """
+    Returns the seconds taken by calling function on every item, and the total and peak memory allocated meanwhile
+    """
+    start = time.perf_counter()
+    for item in items:
+        function(item)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    allocated = 0
+    for item in items:
+        before = tracemalloc.get_traced_memory()[0]
+        result = function(item)
+        allocated += tracemalloc.get_traced_memory()[0] - before
+        del result
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, allocated, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compares eager, lazy and metadata-only fetches of corpus records")
+    parser.add_argument("corpus_dir", help="directory of the corpus")
+    parser.add_argument("--files", type=int, default=2000, help="maximum number of corpus files to fetch")
+    args = parser.parse_args()
+
+    index = CorpusIndex.build(args.corpus_dir)
+    corpus = Corpus(args.corpus_dir, index)
+    file_names = sorted(index.entries)[:args.files]
+
+    # the lazy fetches go through fetch_url, which looks files up by url, so the index maps each file to itself
+    urls = {}
+    for file_name in file_names:
+        urls[file_name] = file_name
+    corpus.get_hashed_link = lambda url: urls[url]
+
+    rows = [
+        ("eager", lambda file_name: eager_fetch(corpus, file_name)),
+        ("lazy", corpus.fetch_url),
+        ("metadata only", corpus.fetch_metadata),
+    ]
+    print(f"{len(file_names)} files")
+    for name, function in rows:
+        elapsed, allocated, peak = measure(function, file_names)
+        print(f"{name:<14} {elapsed * 1000:9.1f} ms {len(file_names) / elapsed:10.0f} files/sec "
+              f"{allocated / len(file_names) / 1024:9.1f} KB retained per file {peak / 1024:9.1f} KB peak")
+
+
+if __name__ == "__main__":
+    main()
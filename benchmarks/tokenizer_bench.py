@@ -0,0 +1,110 @@
+"""
+Measures the tokens per second of the Tokenizer against the character by character tokenizer and the string phrase
+shingles it replaces, alone and followed by the MinHash signature of the shingles. Run from the repository root:
+
+    python -m benchmarks.tokenizer_bench [--words 200000] [--repeat 5]
+"""
+import argparse
+import random
+import time
+
+from near_duplicates import NearDuplicateIndex
+from tokenizer import Tokenizer, load_stop_words
+
+
+def legacy_tokenize(text):
+    """
+    The tokenizer that was used before Tokenizer.tokens: it walks every character
+    """
+    tokens = []
+    token = ""
+    for letter in text:
+        if letter.isalnum() and letter.isascii():
+            token += letter.lower()
+        else:
+            if len(token) != 0:
+                tokens.append(token)
+                token = ""
+    return tokens
+
+
+def legacy_shingles(text, n_length=5):
+    """
+    The shingles that were used before Tokenizer.shingles: every phrase is joined into a string
+    """
+    shingles = {}
+    word_list = []
+    for word in text.split():
+        word_list.append(word.lower())
+        phrase = " ".join(word_list)
+        if phrase not in shingles:
+            shingles[phrase] = 1
+        else:
+            shingles[phrase] += 1
+        if len(word_list) == n_length:
+            word_list.pop(0)
+    return shingles
+
+
+def make_text(num_words, seed=0):
+    """
+    Returns a deterministic text of num_words words drawn from the stop words and a vocabulary of made up words, with
+    some punctuation and digits, similar to the visible text of a page
+    """
+    generator = random.Random(seed)
+    vocabulary = sorted(load_stop_words()) + ["".join(generator.choice("abcdefghijklmnopqrstuvwxyz")
+                                                      for _ in range(generator.randint(3, 10))) for _ in range(5000)]
+    words = []
+    for _ in range(num_words):
+        word = generator.choice(vocabulary)
+        roll = generator.random()
+        if roll < 0.1:
+            word = word.capitalize() + ","
+        elif roll < 0.15:
+            word += "."
+        elif roll < 0.17:
+            word = str(generator.randint(0, 2024))
+        words.append(word)
+    return " ".join(words)
+
+
+def best_time(function, text, repeat):
+    """
+    Returns the result of function(text) and the best of repeat timings of it, in seconds
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(text)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compares the tokenizer and shingles with the ones they replace")
+    parser.add_argument("--words", type=int, default=200000, help="number of words of the benchmark text")
+    parser.add_argument("--repeat", type=int, default=5, help="number of timings, the best one is reported")
+    args = parser.parse_args()
+
+    text = make_text(args.words)
+    tokenizer = Tokenizer(load_stop_words(), 5)
+    index = NearDuplicateIndex()
+    rows = [
+        ("tokens (legacy)", lambda value: legacy_tokenize(value.lower())),
+        ("tokens", lambda value: list(tokenizer.tokens(value))),
+        ("tokens from bytes", lambda value: list(tokenizer.tokens(value.encode("utf-8")))),
+        ("shingles (legacy)", legacy_shingles),
+        ("shingles", tokenizer.shingles),
+        ("signature (legacy)", lambda value: index.signature(legacy_shingles(value))),
+        ("signature", lambda value: index.signature(tokenizer.shingles(value))),
+    ]
+    num_tokens = len(list(tokenizer.tokens(text)))
+    print(f"{args.words} words, {num_tokens} tokens, best of {args.repeat}")
+    for name, function in rows:
+        _, elapsed = best_time(function, text, args.repeat)
+        print(f"{name:<20} {elapsed * 1000:9.1f} ms {num_tokens / elapsed:14,.0f} tokens/sec")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import hashlib
+from functools import lru_cache
+from urllib.parse import urldefrag, urlparse, urlunparse
+
+# Maximum number of urls whose canonical form is remembered
+CACHE_SIZE = 1 << 16
+
+DEFAULT_PORTS = {"http": "80", "https": "443"}
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def canonicalize(url):
+    """
+    Returns the canonical form of a url and the name of its corpus file, parsing the url once. Urls with the same
+    canonical form are the same page to the crawler, so the frontier keeps only one of them. The url is canonicalized
+    by:
+
+    - lowercasing the scheme and the host, and dropping the default port of the scheme
+    - using http for https, since the corpus file names leave the scheme out
+    - dropping the trailing slash of the path, also left out of the corpus file names, and using / for an empty path
+    - dropping the fragment, which names a part of the same page
+    - sorting the parameters of the query
+
+    The corpus file name is the sha224 of the url without its scheme, trailing slash and fragment, see
+    Corpus.get_hashed_link. It is computed from the url as given, not from its canonical form, since the host case,
+    port and query order are part of the names of the corpus files.
+
+    The results of the last CACHE_SIZE urls are memoized, as the same links are found on many pages and every link
+    is looked up by the trap rules, the corpus and the frontier.
+    """
+    parsed = urlparse(url)
+    path = parsed.path[:-1] if parsed.path.endswith("/") else parsed.path
+    return get_canonical_url(parsed, path), get_corpus_hash(parsed.netloc + path + (("?" + parsed.query) if
+                                                                                      parsed.query else ""))
+
+
+def get_canonical_url(parsed, path):
+    """
+    Returns the canonical form of a parsed url, given its path without the trailing slash
+    """
+    scheme = parsed.scheme.lower()
+    netloc = parsed.netloc
+    user_info, at, host = netloc.rpartition("@")
+    host = host.lower()
+    # the port of an ipv6 address follows its closing bracket
+    name, colon, port = host.rpartition(":")
+    if colon and "]" not in port and port == DEFAULT_PORTS.get(scheme):
+        host = name
+    if scheme == "https":
+        scheme = "http"
+    query = "&".join(sorted(parsed.query.split("&"))) if parsed.query else ""
+    return urlunparse((scheme, user_info + at + host, path or "/", parsed.params, query, ""))
+
+
+def get_corpus_hash(key):
+    """
+    Returns the sha224 of a url without its scheme, trailing slash and fragment
+    """
+    try:
+        return hashlib.sha224(key.encode("utf-8")).hexdigest()
+    except UnicodeEncodeError:
+        return str(hash(key))
+
+
+def unique_links(links):
+    """
+    Returns the links that are not the same page as an earlier one, without their fragment, in the order they were
+    found
+    """
+    seen = set()
+    unique = []
+    for link in links:
+        canonical_url = canonicalize(link)[0]
+        if canonical_url not in seen:
+            seen.add(canonical_url)
+            unique.append(urldefrag(link).url if "#" in link else link)
+    return unique
@@ -1,8 +1,109 @@
-import hashlib
+import logging
+import mmap
 import os
-from urllib.parse import urlparse
+import pickle
 
-from cbor import cbor
+from canonical import canonicalize
+from lazy_cbor import LazyRecord
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+fetch_timer = registry.stage("fetch")
+decode_timer = registry.stage("decode")
+
+
+class CorpusIndex:
+    """
+    This class keeps an in-memory index of the corpus directory. It maps the hashed file name of every url in the corpus
+    to the size of that file, so looking up a url does not need a stat call against the (very large) corpus directory.
+
+    The index is built by a single scan of the directory and saved as a snapshot. The snapshot is reused on the next
+    run as long as the corpus directory has not been modified since it was taken.
+
+    Attributes:
+        corpus_base_dir: the corpus directory this index was built from
+        dir_mtime: the modification time of the corpus directory when the index was built
+        entries: a dictionary of hashed file name -> file size in bytes
+        mtimes: a dictionary of hashed file name -> modification time of the file in nanoseconds
+    """
+
+    # File names to be used when loading and saving the index snapshot
+    INDEX_DIR_NAME = "corpus_index"
+    INDEX_FILE_NAME = os.path.join(".", INDEX_DIR_NAME, "index.pkl")
+
+    def __init__(self, corpus_base_dir, dir_mtime=None, entries=None, mtimes=None):
+        self.corpus_base_dir = os.path.join(corpus_base_dir, "")
+        self.dir_mtime = dir_mtime
+        self.entries = entries if entries is not None else {}
+        self.mtimes = mtimes if mtimes is not None else {}
+
+    @classmethod
+    def build(cls, corpus_base_dir):
+        """
+        Scans the corpus directory once and returns an index of all the files in it
+        """
+        dir_mtime = os.stat(corpus_base_dir).st_mtime
+        entries = {}
+        mtimes = {}
+        with os.scandir(corpus_base_dir) as it:
+            for entry in it:
+                if entry.is_file():
+                    stat = entry.stat()
+                    entries[entry.name] = stat.st_size
+                    mtimes[entry.name] = stat.st_mtime_ns
+        logger.info("Indexed %s corpus files", len(entries))
+        return cls(corpus_base_dir, dir_mtime, entries, mtimes)
+
+    @classmethod
+    def load(cls, corpus_base_dir):
+        """
+        Returns the saved snapshot of the index if it belongs to the given corpus directory and is still up to date.
+        Otherwise builds a new index and saves it
+        """
+        corpus_base_dir = os.path.join(corpus_base_dir, "")
+        if os.path.isfile(cls.INDEX_FILE_NAME):
+            try:
+                with open(cls.INDEX_FILE_NAME, "rb") as index_file:
+                    snapshot = pickle.load(index_file)
+                # snapshots taken before the modification times were indexed have no mtimes
+                if snapshot.corpus_base_dir == corpus_base_dir and hasattr(snapshot, "mtimes") and \
+                        snapshot.dir_mtime == os.stat(corpus_base_dir).st_mtime:
+                    logger.info("Loaded corpus index snapshot. Files: %s", len(snapshot))
+                    return snapshot
+                logger.info("Corpus index snapshot is out of date. Rebuilding ...")
+            except (OSError, EOFError, pickle.UnpicklingError, AttributeError) as e:
+                logger.warning("Could not load corpus index snapshot: %s", e)
+        index = cls.build(corpus_base_dir)
+        index.save()
+        return index
+
+    def save(self):
+        """
+        saves the index as a snapshot using pickle
+        """
+        if not os.path.exists(self.INDEX_DIR_NAME):
+            os.makedirs(self.INDEX_DIR_NAME)
+        with open(self.INDEX_FILE_NAME, "wb") as index_file:
+            pickle.dump(self, index_file)
+
+    def get_size(self, hashed_link):
+        """
+        Returns the size of the file with the given hashed name, or None if it is not in the corpus
+        """
+        return self.entries.get(hashed_link)
+
+    def get_mtime(self, hashed_link):
+        """
+        Returns the modification time in nanoseconds of the file with the given hashed name, or None if it is not in the
+        corpus
+        """
+        return self.mtimes.get(hashed_link)
+
+    def __contains__(self, hashed_link):
+        return hashed_link in self.entries
+
+    def __len__(self):
+        return len(self.entries)
 
 
 class Corpus:
@@ -10,83 +111,129 @@ class Corpus:
     This class is responsible for handling corpus related functionalities like mapping a url to its local file name
     """
 
-    def __init__(self, corpus_base_dir):
+    # Size in bytes from which metadata-only fetches memory-map the file instead of reading it
+    MMAP_THRESHOLD = 64 * 1024
+
+    def __init__(self, corpus_base_dir, index=None):
         self.corpus_base_dir = os.path.join(corpus_base_dir, "")
+        self.index = index if index is not None else CorpusIndex.load(corpus_base_dir)
+
+    @staticmethod
+    def get_hashed_link(url):
+        """
+        Returns the name of the corpus file for the given url. It is the sha224 of the url without its scheme, trailing
+        slash and fragment, memoized with the canonical form of the url by canonicalize
+        """
+        return canonicalize(url)[1]
 
     def get_file_name(self, url):
         """
         Given a url, this method looks up for a local file in the corpus and, if existed, returns the file address. Otherwise
         returns None
         """
-
-        pd = urlparse(url)
-        if pd.path:
-            path = pd.path[:-1] if pd.path[-1] == "/" else pd.path
-        else:
-            path = ""
-        url = pd.netloc + path + (("?" + pd.query) if pd.query else "")
-
-        try:
-            hashed_link = hashlib.sha224(url).hexdigest()
-        except (UnicodeEncodeError, TypeError):
-            try:
-                hashed_link = hashlib.sha224(url.encode("utf-8")).hexdigest()
-            except UnicodeEncodeError:
-                hashed_link = str(hash(url))
-
-        if os.path.exists(os.path.join(self.corpus_base_dir, hashed_link)):
+        hashed_link = self.get_hashed_link(url)
+        if hashed_link in self.index:
             return os.path.join(self.corpus_base_dir, hashed_link)
         return None
 
-    def fetch_url(self, url):
+    def get_file_stat(self, url):
+        """
+        Returns the hashed file name, the size and the modification time in nanoseconds of the corpus file of the url,
+        or None if the url is not in the corpus
+        """
+        hashed_link = self.get_hashed_link(url)
+        file_size = self.index.get_size(hashed_link)
+        if file_size is None:
+            return None
+        return hashed_link, file_size, self.index.get_mtime(hashed_link)
+
+    def fetch_url(self, url, metadata_only=False):
         """
         This method, using the given url, should find the corresponding file in the corpus and return a dictionary representing
         the repsonse to the given url. The dictionary contains the following keys:
 
         url: the requested url to be downloaded
-        content: the content of the downloaded url in binary format. None if url does not exist in the corpus
+        content: the content of the downloaded url in binary format, as a memoryview. None if url does not exist in the corpus
+            or if only the metadata was fetched
         size: the size of the downloaded content in bytes. 0 if url does not exist in the corpus
         content_type: Content-Type from the response http headers. None if the url does not exist in the corpus or content-type wasn't provided
         http_code: the response http status code. 404 if the url does not exist in the corpus
         is_redirected: a boolean indicating if redirection has happened to get the final response
         final_url: the final url after all of the redirections. None if there was no redirection.
 
+        The record is decoded lazily: only the fields above are decoded and the content is a view of the file data, it
+        is neither decoded nor copied. With metadata_only, a file of at least MMAP_THRESHOLD bytes is memory-mapped, so
+        the pages holding the content are never read; smaller files are cheaper to read whole.
+
         :param url: the url to be fetched
+        :param metadata_only: whether to fetch only the status, headers and redirect fields and not the content
         :return: a dictionary containing the http response for the given url
         """
 
-        file_name = self.get_file_name(url)
-        if file_name is None:
-            url_data = {
-                "url": url,
-                "content": None,
-                "http_code": 404,
-                "headers": None,
-                "size": 0,
-                "content_type": None,
-                "is_redirected": False,
-                "final_url": None
-            }
-        else:
-            data_dict = cbor.load(open(file_name, "rb"))
-
-            def get_content_type(data):
-                if b'http_headers' not in data: return None
-
-                hlist = data_dict[b"http_headers"][b'value']
-                for header in hlist:
-                    if header[b'k'][b'value'] == b'Content-Type':
-                        return str(header[b'v'][b'value'])
-                return None
-
-            url_data = {
-                "url": url,
-                "content": data_dict[b'raw_content'][b'value'] if b'raw_content' in data_dict and b'value' in data_dict[b'raw_content'] else "",
-                "http_code": int(data_dict[b"http_code"][b'value']),
-                "content_type": get_content_type(data_dict),
-                "size": os.stat(file_name).st_size,
-                "is_redirected": data_dict[b'is_redirected'][b'value'] if b'is_redirected' in data_dict and b'value' in data_dict[b'is_redirected'] else False,
-                "final_url": data_dict[b'final_url'][b'value'] if b'final_url' in data_dict and b'value' in data_dict[b'final_url'] else None
-            }
-
-        return url_data
+        hashed_link = self.get_hashed_link(url)
+        file_size = self.index.get_size(hashed_link)
+        if file_size is None:
+            return self.get_missing_url_data(url)
+
+        file_name = os.path.join(self.corpus_base_dir, hashed_link)
+        if metadata_only and file_size >= self.MMAP_THRESHOLD:
+            with open(file_name, "rb") as corpus_file, \
+                    mmap.mmap(corpus_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped_file:
+                with decode_timer:
+                    return self.get_url_data(url, LazyRecord(mapped_file), file_size, metadata_only=True)
+
+        with fetch_timer:
+            with open(file_name, "rb") as corpus_file:
+                raw_data = corpus_file.read()
+        with decode_timer:
+            return self.get_url_data(url, LazyRecord(raw_data), file_size, metadata_only)
+
+    def fetch_metadata(self, url):
+        """
+        Returns the url_data of the given url without its content, see fetch_url
+        """
+        return self.fetch_url(url, metadata_only=True)
+
+    @staticmethod
+    def get_missing_url_data(url):
+        """
+        Returns the url_data of a url that is not in the corpus
+        """
+        return {
+            "url": url,
+            "content": None,
+            "http_code": 404,
+            "headers": None,
+            "size": 0,
+            "content_type": None,
+            "is_redirected": False,
+            "final_url": None
+        }
+
+    @staticmethod
+    def get_url_data(url, record, size, metadata_only=False):
+        """
+        Returns the url_data of a url given the LazyRecord of its corpus record and the size of the record. Only the
+        fields of the url_data are decoded
+        """
+        content_type = None
+        for header in record.get_value(b'http_headers', ()):
+            if header[b'k'][b'value'] == b'Content-Type':
+                content_type = str(header[b'v'][b'value'])
+                break
+
+        return {
+            "url": url,
+            "content": None if metadata_only else record.get_bytes(b'raw_content', ""),
+            "http_code": int(record.get_value(b'http_code')),
+            "content_type": content_type,
+            "size": size,
+            "is_redirected": record.get_value(b'is_redirected', False),
+            "final_url": record.get_value(b'final_url')
+        }
+
+    def fetch_many(self, urls):
+        """
+        Returns the url_data of each of the given urls, in the same order
+        """
+        return [self.fetch_url(url) for url in urls]
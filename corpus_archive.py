@@ -0,0 +1,241 @@
+import argparse
+import logging
+import mmap
+import os
+import struct
+
+from cbor import cbor
+
+from corpus import Corpus
+from lazy_cbor import LazyRecord
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+fetch_timer = registry.stage("fetch")
+decode_timer = registry.stage("decode")
+
+
+class CorpusArchive:
+    """
+    This class describes the packed form of a corpus directory: one archive file with every record of the corpus and
+    one index file sorted by the hashed file name of the records, so a record is found by a binary search and read
+    from a single memory-mapped file.
+
+    The archive is a header followed by the records. A record is its CBOR metadata (the corpus record without the
+    value of raw_content) followed by the raw content bytes, so the content can be served without decoding or copying
+    it.
+
+    The index is a header followed by one fixed-size entry per record: the 28-byte SHA-224 digest of its hashed file
+    name, the offset of the record in the archive, the length of its metadata, the length of its content
+    (NO_CONTENT if the record has no raw bytes content) and the size of the original corpus file.
+    """
+
+    ARCHIVE_MAGIC = b"CRAWLARC"
+    INDEX_MAGIC = b"CRAWLIDX"
+    # magic, number of records
+    HEADER = struct.Struct("<8sQ")
+    # digest, offset, metadata length, content length, original file size
+    ENTRY = struct.Struct("<28sQIQQ")
+    DIGEST_SIZE = 28
+    NO_CONTENT = 0xFFFFFFFFFFFFFFFF
+
+    @staticmethod
+    def get_index_file_name(archive_file_name):
+        return archive_file_name + ".idx"
+
+    @classmethod
+    def pack(cls, corpus_base_dir, archive_file_name):
+        """
+        Packs every record of the corpus directory into an archive and its index. Returns the number of records packed.
+        Files whose name is not a SHA-224 hex digest are skipped
+        """
+        names = []
+        with os.scandir(corpus_base_dir) as it:
+            for entry in it:
+                if not entry.is_file():
+                    continue
+                try:
+                    digest = bytes.fromhex(entry.name)
+                except ValueError:
+                    digest = b""
+                if len(digest) != cls.DIGEST_SIZE:
+                    logger.warning("Skipping %s, its name is not a SHA-224 digest", entry.name)
+                    continue
+                names.append((digest, entry.name))
+        names.sort()
+
+        entries = []
+        with open(archive_file_name, "wb") as archive_file:
+            archive_file.write(cls.HEADER.pack(cls.ARCHIVE_MAGIC, len(names)))
+            offset = cls.HEADER.size
+            for digest, name in names:
+                file_name = os.path.join(corpus_base_dir, name)
+                with open(file_name, "rb") as corpus_file:
+                    raw_data = corpus_file.read()
+                record = cbor.loads(raw_data)
+                content = b""
+                content_length = cls.NO_CONTENT
+                raw_content = record.get(b"raw_content")
+                if isinstance(raw_content, dict) and isinstance(raw_content.get(b"value"), bytes):
+                    content = raw_content[b"value"]
+                    content_length = len(content)
+                    record[b"raw_content"] = {key: value for key, value in raw_content.items() if key != b"value"}
+                metadata = cbor.dumps(record)
+                archive_file.write(metadata)
+                archive_file.write(content)
+                entries.append(cls.ENTRY.pack(digest, offset, len(metadata), content_length, len(raw_data)))
+                offset += len(metadata) + len(content)
+
+        with open(cls.get_index_file_name(archive_file_name), "wb") as index_file:
+            index_file.write(cls.HEADER.pack(cls.INDEX_MAGIC, len(entries)))
+            index_file.write(b"".join(entries))
+        logger.info("Packed %s corpus files into %s", len(entries), archive_file_name)
+        return len(entries)
+
+
+class ArchiveCorpus:
+    """
+    This class is a corpus backend that serves get_file_name and fetch_url from a corpus archive written by
+    CorpusArchive.pack, instead of one file per url. The archive and its index are memory-mapped, so a lookup is a
+    binary search in the index and a fetch decodes only the small metadata of the record. The content is returned as
+    a memoryview of the archive, without a copy; consumers that need bytes convert it themselves.
+
+    It has the same methods as Corpus, so the crawler can use either.
+    """
+
+    def __init__(self, archive_file_name):
+        self.archive_file_name = archive_file_name
+        self.archive_file = None
+        self.index_file = None
+        self.archive = None
+        self.index = None
+        self.count = 0
+        self.open()
+
+    def open(self):
+        """
+        Memory-maps the archive and its index
+        """
+        self.archive_file = open(self.archive_file_name, "rb")
+        self.index_file = open(CorpusArchive.get_index_file_name(self.archive_file_name), "rb")
+        self.archive = mmap.mmap(self.archive_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.index = mmap.mmap(self.index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        archive_magic, _ = CorpusArchive.HEADER.unpack_from(self.archive)
+        index_magic, self.count = CorpusArchive.HEADER.unpack_from(self.index)
+        if archive_magic != CorpusArchive.ARCHIVE_MAGIC or index_magic != CorpusArchive.INDEX_MAGIC:
+            self.close()
+            raise ValueError(f"{self.archive_file_name} is not a corpus archive")
+        logger.info("Opened corpus archive %s. Files: %s", self.archive_file_name, self.count)
+
+    def close(self):
+        """
+        Unmaps and closes the archive. Memoryviews of contents still in use keep the archive mapped until they are
+        released
+        """
+        for mapped in (self.archive, self.index):
+            if mapped is not None:
+                try:
+                    mapped.close()
+                except BufferError:
+                    pass
+        for file in (self.archive_file, self.index_file):
+            if file is not None:
+                file.close()
+        self.archive = self.index = self.archive_file = self.index_file = None
+
+    def find(self, hashed_link):
+        """
+        Returns the index entry (offset, metadata length, content length, file size) of the record with the given
+        hashed file name, or None if it is not in the archive
+        """
+        try:
+            digest = bytes.fromhex(hashed_link)
+        except ValueError:
+            return None
+        index = self.index
+        entry_size = CorpusArchive.ENTRY.size
+        digest_size = CorpusArchive.DIGEST_SIZE
+        base = CorpusArchive.HEADER.size
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            position = base + middle * entry_size
+            current = index[position:position + digest_size]
+            if current < digest:
+                low = middle + 1
+            elif current > digest:
+                high = middle
+            else:
+                return CorpusArchive.ENTRY.unpack_from(index, position)[1:]
+        return None
+
+    def get_file_name(self, url):
+        """
+        Returns the name of the record of the url inside the archive if it is in the archive, otherwise None
+        """
+        hashed_link = Corpus.get_hashed_link(url)
+        if self.find(hashed_link) is not None:
+            return os.path.join(self.archive_file_name, hashed_link)
+        return None
+
+    def get_file_stat(self, url):
+        """
+        Returns the hashed file name and the size of the original corpus file of the url, with None for its
+        modification time, which the archive does not keep, or None if the url is not in the archive
+        """
+        hashed_link = Corpus.get_hashed_link(url)
+        entry = self.find(hashed_link)
+        if entry is None:
+            return None
+        return hashed_link, entry[3], None
+
+    def fetch_url(self, url, metadata_only=False):
+        """
+        Returns the url_data of the given url, with the same keys as Corpus.fetch_url. The content is a memoryview of
+        the archive, or None with metadata_only
+        """
+        with fetch_timer:
+            entry = self.find(Corpus.get_hashed_link(url))
+        if entry is None:
+            return Corpus.get_missing_url_data(url)
+
+        offset, metadata_length, content_length, file_size = entry
+        with decode_timer:
+            url_data = Corpus.get_url_data(url, LazyRecord(self.archive, offset), file_size, metadata_only)
+        if not metadata_only and content_length != CorpusArchive.NO_CONTENT:
+            start = offset + metadata_length
+            url_data["content"] = memoryview(self.archive)[start:start + content_length]
+        return url_data
+
+    def fetch_metadata(self, url):
+        """
+        Returns the url_data of the given url without its content
+        """
+        return self.fetch_url(url, metadata_only=True)
+
+    def fetch_many(self, urls):
+        """
+        Returns the url_data of each of the given urls, in the same order
+        """
+        return [self.fetch_url(url) for url in urls]
+
+    def __getstate__(self):
+        # the memory maps cannot be pickled, a worker process maps the archive again
+        return self.archive_file_name
+
+    def __setstate__(self, state):
+        self.__init__(state)
+
+    def __len__(self):
+        return self.count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Packs a corpus directory into a corpus archive and its index")
+    parser.add_argument("corpus_dir", help="directory of the corpus to pack")
+    parser.add_argument("archive", help="archive file to write, the index is written next to it with .idx appended")
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(asctime)s (%(name)s) %(levelname)s %(message)s', datefmt='%m/%d/%Y %I:%M:%S %p',
+                        level=logging.INFO)
+    CorpusArchive.pack(args.corpus_dir, args.archive)
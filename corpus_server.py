@@ -0,0 +1,93 @@
+import argparse
+import logging
+import os
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+from corpus import Corpus
+from corpus_archive import ArchiveCorpus
+
+logger = logging.getLogger(__name__)
+
+
+class CorpusRequestHandler(BaseHTTPRequestHandler):
+    """
+    Serves the pages of a corpus over http, as a stand-in for the live web when testing the HttpFetcher. Requests are
+    expected in proxy form, with the absolute url in the request line, but a plain path is also accepted and combined
+    with the Host header.
+
+    A url that was redirected in the corpus is answered with a 302 to its final url, and the final url is then served
+    with the content of the original one. The response is decided from the status and headers of the page, fetched
+    without the content, so the content is only read when it is sent.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        url = self.path if urlsplit(self.path).scheme else "http://" + self.headers.get("Host", "") + self.path
+        corpus = self.server.corpus
+        source = url
+        if corpus.get_file_name(url) is None and url in self.server.redirect_sources:
+            source = self.server.redirect_sources[url]
+
+        if corpus.get_file_name(source) is None:
+            self.send_body(404, b"", None)
+            return
+        url_data = corpus.fetch_metadata(source)
+        if source == url and url_data["is_redirected"] and url_data["final_url"] and url_data["final_url"] != url:
+            self.server.redirect_sources[url_data["final_url"]] = url
+            self.send_response(302)
+            self.send_header("Location", url_data["final_url"])
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        else:
+            self.send_body(url_data["http_code"], corpus.fetch_url(source)["content"], self.get_content_type(url_data))
+
+    def send_body(self, http_code, content, content_type):
+        self.send_response(http_code)
+        if content_type:
+            self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    @staticmethod
+    def get_content_type(url_data):
+        """
+        Corpus returns Content-Type as the str() of the header bytes, e.g. "b'text/html'". This undoes that
+        """
+        content_type = url_data["content_type"]
+        if content_type and content_type.startswith(("b'", 'b"')):
+            return content_type[2:-1]
+        return content_type
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+
+class CorpusServer(ThreadingHTTPServer):
+    """
+    An http server that serves a corpus with CorpusRequestHandler
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, corpus):
+        super().__init__(address, CorpusRequestHandler)
+        self.corpus = corpus
+        self.redirect_sources = {}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serves a corpus directory over http as a stand-in for the web")
+    parser.add_argument("corpus_dir", help="directory of the corpus to serve, or a corpus archive file")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(asctime)s (%(name)s) %(levelname)s %(message)s', datefmt='%m/%d/%Y %I:%M:%S %p',
+                        level=logging.INFO)
+    corpus = ArchiveCorpus(args.corpus_dir) if os.path.isfile(args.corpus_dir) else Corpus(args.corpus_dir)
+    server = CorpusServer((args.host, args.port), corpus)
+    logger.info("Serving %s on %s:%s", args.corpus_dir, args.host, args.port)
+    server.serve_forever()
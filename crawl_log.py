@@ -0,0 +1,136 @@
+import argparse
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Outcomes of the urls of a crawl
+FETCHED = "fetched"
+REJECTED = "rejected"
+DUPLICATE = "duplicate"
+
+
+class CrawlLog:
+    """
+    This class is an append-only log of the outcome of every url of a crawl, written as it happens as JSON Lines: one
+    object per line with the url and its outcome.
+
+    fetched: a crawled page, with its http code, number of links, number of valid links and number of tokens
+    rejected: a url identified as a trap, once, with the reason code of the rule that rejected it
+    duplicate: a crawled page that is an exact copy of the crawled page copy_of
+
+    The lists of the report are generated by streaming over the log, so the crawler does not keep them in memory, and
+    the report can be generated again from the log and the analytics state without crawling again. Lines are written
+    through a buffer of buffer_size bytes.
+
+    The log is valid up to the size saved with the analytics state (start), which it is truncated to when it is
+    opened: the lines written after the last save belong to pages whose analytics were lost, and which are crawled
+    again by the resumed crawl.
+    """
+
+    # File names to be used when writing the log, next to the frontier state
+    LOG_DIR_NAME = "frontier_state"
+    LOG_FILE_NAME = os.path.join(".", LOG_DIR_NAME, "crawl_log.jsonl")
+
+    def __init__(self, buffer_size=1024 * 1024):
+        self.buffer_size = buffer_size
+        self.start = 0
+        self.file = None
+
+    def open(self):
+        """
+        Opens the log for appending, truncated to start bytes
+        """
+        if not os.path.exists(self.LOG_DIR_NAME):
+            os.makedirs(self.LOG_DIR_NAME)
+        self.file = open(self.LOG_FILE_NAME, "a", encoding="utf-8", buffering=self.buffer_size)
+        size = self.file.tell()
+        if size > self.start:
+            self.file.truncate(self.start)
+            self.file.seek(self.start)
+        elif size < self.start:
+            logger.warning("The crawl log %s is shorter than when the analytics were saved, the report misses urls",
+                           self.LOG_FILE_NAME)
+
+    def write(self, entry):
+        """
+        Appends an entry to the log, opening it on the first write
+        """
+        if self.file is None:
+            self.open()
+        self.file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def fetched(self, url, http_code, links_count, valid_links_count, token_count):
+        self.write({"url": url, "outcome": FETCHED, "http_code": http_code, "links": links_count,
+                    "valid_links": valid_links_count, "tokens": token_count})
+
+    def rejected(self, url, reason):
+        self.write({"url": url, "outcome": REJECTED, "reason": reason})
+
+    def duplicate(self, url, copy_of):
+        self.write({"url": url, "outcome": DUPLICATE, "copy_of": copy_of})
+
+    def flush(self):
+        if self.file is not None:
+            self.file.flush()
+
+    def size(self):
+        """
+        Returns the size in bytes of the log written so far
+        """
+        if self.file is None:
+            return self.start
+        self.file.flush()
+        return self.file.tell()
+
+    def close(self):
+        if self.file is not None:
+            self.start = self.size()
+            self.file.close()
+            self.file = None
+
+
+def read_log(file_name, outcome=None):
+    """
+    Yields the entries of the crawl log file_name, or only those of the given outcome, in the order they were written.
+    A missing log has no entries
+    """
+    if not os.path.isfile(file_name):
+        return
+    with open(file_name, encoding="utf-8") as log_file:
+        for line in log_file:
+            # a line cut short by a crash ends the log
+            if not line.endswith("\n"):
+                logger.warning("Ignoring the incomplete last line of the crawl log %s", file_name)
+                return
+            entry = json.loads(line)
+            if outcome is None or entry["outcome"] == outcome:
+                yield entry
+
+
+if __name__ == "__main__":
+    from analytics import Analytics
+    from sharded_crawler import merge_results, read_results, use_state_dir
+    from tokenizer import load_stop_words
+
+    parser = argparse.ArgumentParser(description="Writes the report of a crawl again from its crawl log and its "
+                                                 "analytics state, without crawling again")
+    parser.add_argument("--state-dir", default="frontier_state", help="directory of the state of the crawl")
+    parser.add_argument("--spool-dir", help="spool directory of a sharded crawl, whose merged report is written")
+    parser.add_argument("--shards", type=int, default=1, help="number of shards of the sharded crawl")
+    parser.add_argument("--output", default="analytics.txt", help="file the report is written to")
+    args = parser.parse_args()
+    logging.basicConfig(format='%(asctime)s (%(name)s) %(levelname)s %(message)s', datefmt='%m/%d/%Y %I:%M:%S %p',
+                        level=logging.INFO)
+
+    stop_words = load_stop_words("stopwords.txt")
+    if args.spool_dir:
+        analytics = merge_results(read_results(args.spool_dir, args.shards), stop_words)
+    else:
+        analytics = Analytics(stop_words)
+        use_state_dir(analytics, args.state_dir)
+        use_state_dir(analytics.log, args.state_dir)
+        analytics.load_state()
+    analytics.write_report(args.output)
+    logger.info("Report written to %s", args.output)
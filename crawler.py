@@ -1,10 +1,20 @@
 import logging
-import re
-from urllib.parse import parse_qs, urlparse, urljoin, parse_qsl, urlunparse
-from lxml import html
-from pathlib import Path
-from bs4 import BeautifulSoup
+from urllib.parse import urlparse
+from analytics import Analytics
+from canonical import canonicalize, unique_links
+from duplicates import ExactDuplicateIndex
+from metrics import ProgressLog, registry
+from near_duplicates import NearDuplicateIndex
+from page_cache import CachedCorpus
+from page_processor import PageProcessor
+from seen_store import FingerprintSet, SeenSet
+from tokenizer import load_stop_words
+import url_classifier
+from url_classifier import UrlClassifier
 logger = logging.getLogger(__name__)
+validation_timer = registry.stage("validation")
+similarity_timer = registry.stage("similarity")
+enqueue_timer = registry.stage("enqueue")
 
 class Crawler:
     """
@@ -12,22 +22,29 @@ class Crawler:
     the frontier
     """
 
-    def __init__(self, frontier, corpus):
+    def __init__(self, frontier, corpus, analytics=None):
         self.frontier = frontier
-        self.corpus = corpus
-        self.token_dict = {}
+        # pages are fetched and parsed through a cache, so every url is decoded and parsed at most once while in use
+        self.corpus = corpus if isinstance(corpus, CachedCorpus) else CachedCorpus(corpus)
+        # near-duplicate checks of each directory, and the signatures of the pages that were not near-duplicates
+        self.directory_stats = {}
+        self.near_duplicates = NearDuplicateIndex()
         self.blacklist = set()
-        self.whitelist = set()
+        self.whitelist = FingerprintSet()
         self.similarity_threshold = 0.90
+        # check the content similarity of every crawled page once instead of the page of every link before it is
+        # enqueued, see check_page
+        self.deferred_similarity = False
         self.n_length = 5
-        self.stop_words = []
-        self.page_most_links = {"link": "", "count": 0}
-        self.subdomains = {}
-        self.is_trap = False
-        self.downloaded = set()
-        self.removed = set()
-        self.check_already = set()
+        # exact copies of crawled pages are not parsed and are only reported as copies
+        self.duplicates = ExactDuplicateIndex()
+        self.page_processor = PageProcessor(self.corpus, self.n_length, duplicates=self.duplicates)
+        self.stop_words = frozenset()
+        self.url_classifier = UrlClassifier()
+        self.progress = ProgressLog()
+        self.check_already = SeenSet()
         self.create_stop_words()
+        self.analytics = analytics if analytics is not None else Analytics(self.stop_words)
     
 
     def start_crawling(self):
@@ -37,127 +54,84 @@ class Crawler:
         """
         while self.frontier.has_next_url():
             url = self.frontier.get_next_url()
-            logger.info("Fetching URL %s ... Fetched: %s, Queue size: %s", url, self.frontier.fetched, len(self.frontier))
-            self.whitelist.add(url)
-            url_data = self.corpus.fetch_url(url)
-            # number of links that were able to fetched from the url
-            valid_links_counter = 0
-            self.downloaded.add(url)
-            # Write links downloaded.txt
-            for next_link in set(self.extract_next_links(url_data)):
-                validity = self.is_valid(next_link)
-                if validity:
-                    if self.corpus.get_file_name(next_link) is not None:
-                        self.frontier.add_url(next_link)
-                        valid_links_counter += 1
-                else:
-                    self.removed.add(next_link)
-            # update link with the most valid links out
-            if valid_links_counter > self.page_most_links["count"]:
-                self.page_most_links = {
-                    "link": url,
-                    "count": valid_links_counter
-                }
-
+            logger.debug("Fetching URL %s", url)
+            self.process_page(url, self.page_processor.process_url(url))
+            self.frontier.done(url)
+            self.progress.maybe_log(self.frontier)
+            registry.maybe_write()
 
-    def create_stop_words(self):
+    def process_page(self, url, record):
         """
-        Reads stopwords.txt and adds all of its words in a list
+        Handles a crawled url given its PageRecord. Its links are validated, the valid ones are added to the frontier
+        and the analytics are updated with the page. Links that are the same page as an earlier link of the page, such
+        as links to a fragment of it, are validated once
         """
-        with open("stopwords.txt", "r", encoding='utf-8') as stop_words_file:
-            self.stop_words = stop_words_file.readlines()
-        self.stop_words = [ x.strip().lower() for x in self.stop_words]
-    
+        self.whitelist.add(url)
+        if self.skip_page(url, record):
+            return
+        registry.increment("pages")
+        registry.increment("links_discovered", len(record.links))
+        # number of links that were able to fetched from the url
+        valid_links_counter = self.enqueue_links(self.classify_links(unique_links(record.links)))
+        self.analytics.add_page(url, record, valid_links_counter)
 
-    def run_analytics(self):
+    def skip_page(self, url, record):
         """
-        Run the analytics after seperating all the crawler traps out
+        Returns True if the links and text of a crawled page are left out: the page is an exact copy of a page crawled
+        before or, with deferred similarity, a near-duplicate, which is reported as a trap
         """
-        longest_page = {"link": "", "count": 0}
-        vocabulary = {}
-        counter = 0
-        total_link = len(self.frontier.urls_set)
-        with open("analytics.txt", "a", encoding="utf-8") as file:
-            # Analytics 2: getting most valid out links
-            file.write(f"Link with the most valid out links:\n{self.page_most_links}\n")
-        with open("analytics.txt", "a", encoding="utf-8") as file:
-            # Analytics 3: List of downloaded and list of identified traps
-            file.write("\n\nList of downloaded urls:\n")
-            for i in self.downloaded:
-                file.write(f"URL: {i}\n")
-        with open("analytics.txt", "a", encoding="utf-8") as file:
-            file.write("\n\nList of identified trap urls:\n")
-            for i in self.removed:
-                file.write(f"URL: {i}\n")
-        for link in self.frontier.urls_set:
+        if self.skip_duplicate(url, record):
+            return True
+        if self.deferred_similarity and not self.check_page(url, record):
+            registry.increment("near_duplicate_pages")
+            self.analytics.add_removed(url, url_classifier.NEAR_DUPLICATE_PAGE)
+            return True
+        return False
 
-            # -----------Analytics #1----------
-            # counting urls each subdomains fetched
-            subdomain = urlparse(link).netloc
-            self.subdomains[subdomain] = self.subdomains.get(subdomain, 0) + 1
+    def skip_duplicate(self, url, record):
+        """
+        Adds a crawled page to the index of exact duplicates. Returns True if it is a copy of a page crawled before, in
+        which case it is reported as such and its links and text are left out
+        """
+        canonical_url = self.duplicates.add(url, record.digest, record.final_url)
+        if canonical_url is None:
+            return False
+        registry.increment("duplicates")
+        self.analytics.add_duplicate(url, canonical_url)
+        return True
 
-            # ----------Analytics #4--------
-            url_data = self.corpus.fetch_url(link)
-            if url_data["content_type"] is None:
-                continue
+    def enqueue_links(self, verdicts):
+        """
+        Adds the urls of the accepted verdicts that are in the corpus to the frontier and records the urls of the
+        rejected ones as traps. Returns the number of urls added
+        """
+        valid_links_counter = 0
+        for verdict in verdicts:
+            next_link = verdict.url
+            if verdict.accepted:
+                if self.corpus.get_file_name(next_link) is not None:
+                    with enqueue_timer:
+                        self.frontier.add_url(next_link)
+                    valid_links_counter += 1
             else:
-                url_text_file = self.extract_words_generator(url_data).lower()
-                if len(url_text_file) == 0:
-                    continue
-                url_text = []
-                token = ""
-                for letter in url_text_file:
-                    if letter.isalnum() and letter.isascii():
-                        token += letter.lower()
-                    else:
-                        if len(token) != 0:
-                            # add token to list and reset word
-                            url_text.append(token)
-                            token = ""
-                url_text_length = len(url_text)
-                
-                # finding largest page
-                if url_text_length > longest_page["count"]:
-                    longest_page = {
-                        "link": link,
-                        "count": url_text_length
-                    }
-                
-                # accumulating counts for each word from all webpages and adding it to vocabulary
-                url_text_set = set(url_text)
-                for word in self.stop_words:
-                    url_text_set.discard(word.lower())
-                for word in url_text:
-                    if word in url_text_set:
-                        if word not in vocabulary:
-                            vocabulary[word] = 0
-                        vocabulary[word] += 1
-            print(f'Generating report: {int((counter/total_link)*100)}%     \t--{counter}/{total_link}', end='\r')
-            counter += 1
+                self.analytics.add_removed(next_link, verdict.reason)
+        return valid_links_counter
 
-        with open("analytics.txt", "a", encoding="utf-8") as file:
-            # Analytics 1: writing to file the subdomains and number of links
-            file.write("\n\nSubdomains: Links proccessed\n")
-            for subdomain, count in self.subdomains.items():
-                file.write (f"{subdomain}: {count}\n")
-
-        with open("analytics.txt", "a", encoding="utf-8") as file:
-            # Analytics 4: writing to analytics page the longest page url and its count
-            file.write(f"\n\nLongest Page: \n{longest_page}\n")            
-        
-        with open("analytics.txt", "a", encoding="utf-8") as file:
-            # Analytics 5: writing to analytics the 50 most common words in all webpages and its count
-            sorted_vocab = dict(sorted(vocabulary.items(), key=lambda x: x[1], reverse=True))
-            file.write("\n\n50 most common words:\n")
-            counter = 1
-            for word, count in sorted_vocab.items():
-                if counter == 51:
-                    break
-                file.write(f"{counter}. {word}: {count}\n")
-                counter +=1
 
+    def create_stop_words(self):
+        """
+        Loads the stop words of stopwords.txt, which is read once per process
+        """
+        self.stop_words = load_stop_words("stopwords.txt")
     
 
+    def run_analytics(self):
+        """
+        Writes the report of the analytics accumulated while crawling
+        """
+        self.analytics.write_report("analytics.txt")
+
+
     def extract_next_links(self, url_data):
         """
         The url_data coming from the fetch_url method will be given as a parameter to this method. url_data contains the
@@ -169,173 +143,145 @@ class Crawler:
 
         Suggested library: lxml
         """
-        url = url_data.get('url')
-        if url_data["is_redirected"]:
-            url = url_data.get("final_url")
-        content = url_data.get('content')
-
-        if url is not None and content is not None and content != "" and len(content) != 0:
-            # parses html content
-            try:
-                tree = html.fromstring(content)
-                # gets all relative and absolute links
-                all_links = tree.xpath("//a/@href")
-                # turns every relative link into absolute
-                absolute_urls =[urljoin(url, link) for link in all_links]
-                return absolute_urls
-            except Exception as e:
-                print(e)
-                return []
-        else:
-            return []
-
+        return list(self.page_processor.process(url_data).links)
+    
 
-    def extract_words_generator(self, url_data):
+    def check_page(self, url, record):
         """
-        Function that gets the file content. It grabs the anything in the p, h1, h2, h3, h4, h5, h6, span and div tabs. (Tabs that generally include words)
-        This function returns the list of words in that file.
+        Checks the content of a crawled page in the deferred similarity mode, where links are validated by their url
+        only. Returns False if the page is a near-duplicate of a page crawled before and True otherwise. Pages of
+        whitelisted directories are kept and pages of blacklisted directories dropped without a check, and the check
+        updates the directory lists, so the later links of a directory full of near-duplicates are rejected before
+        they are fetched
         """
+        if not record.has_content:
+            return True
+        directory = self.url_classifier.get_directory(urlparse(url).path)
+        if directory in self.whitelist:
+            return True
+        if directory in self.blacklist:
+            return False
         try:
-            return BeautifulSoup(url_data["content"], "lxml").get_text()
+            with similarity_timer:
+                return self.check_similarity(directory, url, record)
         except Exception as e:
-            print(e)
-            return ""
-    
+            logger.warning("Could not check the similarity of %s: %s", url, e)
+            return True
 
-    def check_similarity(self, parsed, url):
+    def check_similarity(self, parsed, url, record=None):
         """
-        Tokenize the words and htei frequency. Checks if they are in the dictionary,
-        if not then add.
-        
-        If it is found, do a similarity test and update the
-        black and whitelist.
-        """
-        new_token = {
-                "content": {},
-                "blacklist": 0,
-                "count_checks": 1,
-                "link": url
-            }
-        word_list = []
-        phrase = ""
+        Looks for a page crawled or checked before that is nearly the same as the page of the url, anywhere in the
+        crawl, using the MinHash signature of its phrases. Returns False if one is found and True otherwise.
 
+        Every check is counted for the directory (parsed) of the url. A directory with many near-duplicate pages is
+        added to the blacklist, and a directory with enough checks and few near-duplicates to the whitelist.
+        """
         # if there is nothing on the page, return false
-        url_data = self.corpus.fetch_url(url)
-        if url_data["content"] is None:
+        if record is None:
+            record = self.page_processor.process_url(url)
+        if not record.has_content:
             return False
-        
-        # iterate through words and see how many simliar phrases there are
-        # n_length-gram phrase check, where n_length = 5
-        for word in self.extract_words_generator(url_data).split():
-            word_list.append(word.lower())
-            phrase = " ".join(word_list)
-            if phrase not in new_token["content"]:
-                new_token["content"][phrase] = 1
-            else:
-                new_token["content"][phrase] += 1
-            
-            # if the phrase is longer than five words, remove the first word
-            if len(word_list) == self.n_length:
-                word_list.pop(0)
-        
-        # if path is a duplicate
-        if parsed in self.token_dict:
-            phrase_similarity_count = 0
-            # ------check if content of url has similar content to another similar url----
-            for new_key, new_value in new_token["content"].items():
-                # if phrase in url data already in token dict and its similar, increase phrase similarity counter
-                if new_key in self.token_dict[parsed]["content"]:
-                    if self.token_dict[parsed]["content"][new_key] == new_value:
-                        phrase_similarity_count += 1
-            
-            # if the content isnt similar or the url doesnt have content
-            if phrase_similarity_count == 0 or max([len(self.token_dict[parsed]["content"]), len(new_token["content"])]) == 0:
-                self.token_dict[parsed]["count_checks"] += 1
-                if self.token_dict[parsed]["count_checks"] >= 6 and self.token_dict[parsed]["blacklist"] <= 2:
-                    self.whitelist.add(parsed)
-                self.token_dict[parsed]["count_checks"] += 1
-                return True
-            
-            similarity = phrase_similarity_count / max([len(self.token_dict[parsed]["content"]), len(new_token["content"])])
-            # test if just duplicate file, if so return false
-            if similarity == 1:
-                for item in ["index", "index.php", "php"]:
-                    if item in url.split("/")[-1] or item in self.token_dict[parsed]["link"]:
-                        return True
-            # if very similar, remove
-            if similarity > self.similarity_threshold:
-                self.token_dict[parsed]["blacklist"] += 1
-                self.token_dict[parsed]["count_checks"] += 1
-                if self.token_dict[parsed]["blacklist"] >= 6:
-                    self.blacklist.add(parsed)
-                return False
-            else:
-                # if not that similar
-                self.token_dict[parsed]["count_checks"] += 1
-                if self.token_dict[parsed]["count_checks"] >= 6 and self.token_dict[parsed]["blacklist"] <= 2:
-                    self.whitelist.add(parsed)
-                    
+
+        # the index of near-duplicates knows every page by its canonical url, like the frontier
+        canonical_url = canonicalize(url)[0]
+        # the pages crawled so far decide whether the page is an exact copy, not the ones crawled when it was processed
+        duplicate_of = self.duplicates.find(url, record.digest, record.final_url) if record.digest is not None else None
+        if duplicate_of is not None:
+            # an exact copy of a crawled page is as similar as a page can be, without computing its signature
+            signature = None
+            similar_url, similarity = duplicate_of, 1.0
         else:
-            self.token_dict[parsed] = new_token
-        return True
+            # n_length-gram phrases of the page, where n_length = 5
+            if record.signature is None:
+                record.signature = self.near_duplicates.signature(record.shingles)
+            signature = record.signature
+            similar_url, similarity = self.near_duplicates.find_most_similar(signature, exclude=canonical_url)
 
-    def is_link_trap(self, url):
-        """
-        Checks for traps
-        return False if its not a trap
-        return True if it is a trap
-        """
-        self.is_trap = True
-        parsed = urlparse(url)
-        query_params = parse_qs(parsed.query)
-        frag = parsed.fragment
-        for word in ["action", "download", "upname", "session", "session_id", "sessionid", "do", "ucinetid", "format", "task", "sort", "name", "search"]:
-            if word in query_params.keys():
+        stats = self.directory_stats.get(parsed)
+        if stats is None:
+            self.directory_stats[parsed] = stats = {"blacklist": 0, "count_checks": 1}
+            if similar_url is None:
+                # first page seen in this directory and nothing like it elsewhere
+                self.near_duplicates.add(canonical_url, signature)
                 return True
-        if url in self.check_already:
-            self.is_trap = False
-            return True
-        
-        # all fragments do is lead to part of a page -> duplicate content
-        if frag != "":
-            return True
-            
-        url_path = "/".join(parsed.path.split("/")[:-1]) 
 
-        if url_path in self.whitelist:
-            return False
-        
-        if url_path in self.blacklist:
-            return True
-        
-        # not a url
-        if " " in url:
-            return True
-        
-        # reducing links based on len of the links ~79 avg len of all links
-        if len(url) > 80:
-            return True
-        
-        # reducing links through parameters
-        if len(query_params) > 3:
+        # if the content isnt similar or the url doesnt have content
+        if similar_url is None or similarity == 0:
+            stats["count_checks"] += 1
+            if stats["count_checks"] >= 6 and stats["blacklist"] <= 2:
+                self.whitelist.add(parsed)
+            stats["count_checks"] += 1
+            self.near_duplicates.add(canonical_url, signature)
             return True
 
-        # check for repeating directories
-        subdirectories = parsed.path.lower().split("/")
-        all_subdir = [i for i in subdirectories if i != ""]
-        count_sub  = [all_subdir.count(i) for i in all_subdir]
-        for x in count_sub:
-            if x > 1:
-                return True
-        try:
-            if self.check_similarity("/".join(parsed.path.split("/")[:-1]), url) == False:
-                self.check_already.add(url)
-                return False
-        except Exception as e:
-            print(e)
+        # test if just duplicate file, if so return false
+        if similarity == 1:
+            for item in ["index", "index.php", "php"]:
+                if item in url.split("/")[-1] or item in similar_url:
+                    return True
+        # if very similar, remove
+        if similarity > self.similarity_threshold:
+            stats["blacklist"] += 1
+            stats["count_checks"] += 1
+            if stats["blacklist"] >= 6:
+                self.blacklist.add(parsed)
             return False
+        else:
+            # if not that similar
+            stats["count_checks"] += 1
+            if stats["count_checks"] >= 6 and stats["blacklist"] <= 2:
+                self.whitelist.add(parsed)
+            self.near_duplicates.add(canonical_url, signature)
         return True
-    
+
+    def classify_links(self, urls):
+        """
+        Returns the UrlVerdict of each of the given urls, in the same order. The url-only rules are applied to all of
+        them at once by the UrlClassifier. The rules that depend on the crawl state (already checked urls, the
+        directory black and white lists and content similarity) are then applied one url at a time, since a
+        similarity check can change that state for the next url
+        """
+        with validation_timer:
+            verdicts = self.url_classifier.classify_batch(urls)
+        return [self.finish_verdict(verdict) for verdict in verdicts]
+
+    def finish_verdict(self, verdict):
+        """
+        Decides a verdict of the UrlClassifier against the crawl state, in the order of the trap rules
+        """
+        if verdict.accepted is not None:
+            return self.url_classifier.count(verdict)
+
+        if verdict.early_reason is not None:
+            verdict.decide(False, verdict.early_reason)
+        elif canonicalize(verdict.url)[0] in self.check_already:
+            verdict.decide(False, url_classifier.ALREADY_CHECKED)
+        elif verdict.fragment:
+            verdict.decide(False, url_classifier.FRAGMENT)
+        elif verdict.directory in self.whitelist:
+            verdict.decide(True, url_classifier.WHITELISTED_DIRECTORY)
+        elif verdict.directory in self.blacklist:
+            verdict.decide(False, url_classifier.BLACKLISTED_DIRECTORY)
+        elif verdict.late_reason is not None:
+            verdict.decide(False, verdict.late_reason)
+        elif self.deferred_similarity:
+            # the content of the page is checked once, when it is crawled
+            verdict.decide(True, url_classifier.DEFERRED_SIMILARITY)
+        else:
+            # a url whose content is similar to a page checked before is accepted once and remembered in
+            # check_already, while a url with unique content is rejected
+            try:
+                with similarity_timer:
+                    similar = self.check_similarity(verdict.directory, verdict.url) == False
+                if similar:
+                    self.check_already.add(canonicalize(verdict.url)[0])
+                    verdict.decide(True, url_classifier.SIMILAR_CONTENT)
+                else:
+                    verdict.decide(False, url_classifier.UNIQUE_CONTENT)
+            except Exception as e:
+                logger.warning("Could not check the similarity of %s: %s", verdict.url, e)
+                verdict.decide(True, url_classifier.SIMILARITY_ERROR)
+        return self.url_classifier.count(verdict)
 
     def is_valid(self, url):
         """
@@ -343,26 +289,11 @@ class Crawler:
         filter out crawler traps. Duplicated urls will be taken care of by frontier. You don't need to check for duplication
         in this method
         """
-        parsed = urlparse(url)
-        self.is_trap = False
-        if parsed.scheme not in set(["http", "https"]):
-            return False
-        try:
-            if ( ".ics.uci.edu" in parsed.hostname \
-                    and not re.match(".*\.(css|js|bmp|gif|jpe?g|ico" + "|png|tiff?|mid|mp2|mp3|mp4" \
-                                    + "|wav|avi|mov|mpeg|ram|m4v|mkv|ogg|ogv|pdf" \
-                                    + "|ps|eps|tex|ppt|pptx|doc|docx|xls|xlsx|names|data|dat|exe|bz2|tar|msi|bin|7z|psd|dmg|iso|epub|dll|cnf|tgz|sha1" \
-                                    + "|thmx|mso|arff|rtf|jar|csv" \
-                                    + "|rm|smil|wmv|swf|wma|zip|rar|gz|pdf|j_peg.php)$", parsed.path.lower())):
-                pass
-            else:
-                return False
-        except TypeError:
-            #print("TypeError for ", parsed)
-            return False
-        
-        # 
-        return self.is_link_trap(url) is not True
-
-        
+        return self.classify_links([url])[0].accepted
 
+    def is_crawlable(self, parsed):
+        """
+        Returns True if the parsed url is an http(s) url of an ics.uci.edu subdomain that does not point to a non-html
+        file, based on its extension. These rules depend only on the url, not on the state of the crawl
+        """
+        return self.url_classifier.crawlable_reason(parsed) is None
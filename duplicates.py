@@ -0,0 +1,57 @@
+import hashlib
+
+
+class ExactDuplicateIndex:
+    """
+    This class finds the crawled pages that are exact copies of a page crawled before: pages with byte-identical
+    content, such as mirrors and index.php variants, and pages redirected to the same final url. Contents are
+    identified by a 64-bit blake2b digest, computed right after the page is fetched, so a copy can be recognized
+    before it is parsed.
+
+    Only crawled pages are added, so the canonical url of a copy is always a url that was crawled. With 64-bit
+    digests, two different contents are confused with a probability of about n^2 / 2^65 for n pages, as for the
+    fingerprints of the frontier.
+
+    Attributes:
+        digests: a dictionary of content digest -> url of the first crawled page with that content
+        final_urls: a dictionary of url -> url of the first crawled page that is or was redirected to that url
+    """
+
+    def __init__(self):
+        self.digests = {}
+        self.final_urls = {}
+
+    @staticmethod
+    def digest(content):
+        """
+        Returns the 64-bit digest of the given content (bytes or a memoryview)
+        """
+        return int.from_bytes(hashlib.blake2b(content, digest_size=8).digest(), "little")
+
+    def find(self, url, digest, final_url=None):
+        """
+        Returns the url of the crawled page that the page of the given url, content digest and final url (None if the
+        page was not redirected) is a copy of, or None if it is not a copy of another crawled page
+        """
+        canonical_url = self.final_urls.get(final_url or url)
+        if canonical_url is None and digest is not None:
+            canonical_url = self.digests.get(digest)
+        return canonical_url if canonical_url != url else None
+
+    def add(self, url, digest, final_url=None):
+        """
+        Adds a crawled page. Returns the url of the crawled page it is a copy of, in which case it is not added, or
+        None
+        """
+        canonical_url = self.find(url, digest, final_url)
+        if canonical_url is not None:
+            return canonical_url
+        if digest is not None:
+            self.digests.setdefault(digest, url)
+        self.final_urls.setdefault(url, url)
+        if final_url:
+            self.final_urls.setdefault(final_url, url)
+        return None
+
+    def __len__(self):
+        return len(self.digests)
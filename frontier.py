@@ -3,6 +3,9 @@ import os
 from collections import deque
 import pickle
 
+from canonical import canonicalize
+from seen_store import FingerprintSet
+
 logger = logging.getLogger(__name__)
 
 class Frontier:
@@ -13,7 +16,7 @@ class Frontier:
 
     Attributes:
         urls_queue: A queue of urls to be download by crawlers
-        urls_set: A set of urls to avoid duplicated urls
+        urls_set: A set of the fingerprints of the canonical forms of the urls to avoid duplicated urls
         fetched: the number of fetched urls so far
     """
 
@@ -26,7 +29,7 @@ class Frontier:
 
     def __init__(self):
         self.urls_queue = deque()
-        self.urls_set = set()
+        self.urls_set = FingerprintSet()
         self.fetched = 0
 
     def add_url(self, url):
@@ -34,12 +37,12 @@ class Frontier:
         Adds a url to the urls queue
         :param url: the url to be added
         """
-        if not self.is_duplicate(url):
+        # a url that is the same page as a url added before is a duplicate, see canonicalize
+        if self.urls_set.add(canonicalize(url)[0]):
             self.urls_queue.append(url)
-            self.urls_set.add(url)
 
     def is_duplicate(self, url):
-        return url in self.urls_set
+        return canonicalize(url)[0] in self.urls_set
 
     def get_next_url(self):
         """
@@ -49,6 +52,11 @@ class Frontier:
             self.fetched += 1
             return self.urls_queue.popleft()
 
+    def done(self, url):
+        """
+        Marks a url returned by get_next_url as crawled. The queue is saved as a whole, so there is nothing to do
+        """
+
     def has_next_url(self):
         """
         Returns true if there are more urls in the queue, otherwise false
@@ -62,12 +70,12 @@ class Frontier:
         if not os.path.exists(self.FRONTIER_DIR_NAME):
             os.makedirs(self.FRONTIER_DIR_NAME)
 
-        url_queue_file = open(self.URL_QUEUE_FILE_NAME, "wb")
-        url_set_file = open(self.URL_SET_FILE_NAME, "wb")
-        fetched_file = open(self.FETCHED_FILE_NAME, "wb")
-        pickle.dump(self.urls_queue, url_queue_file)
-        pickle.dump(self.urls_set, url_set_file)
-        pickle.dump(self.fetched, fetched_file)
+        with open(self.URL_QUEUE_FILE_NAME, "wb") as url_queue_file:
+            pickle.dump(self.urls_queue, url_queue_file)
+        with open(self.URL_SET_FILE_NAME, "wb") as url_set_file:
+            pickle.dump(self.urls_set, url_set_file)
+        with open(self.FETCHED_FILE_NAME, "wb") as fetched_file:
+            pickle.dump(self.fetched, fetched_file)
 
     def load_frontier(self):
         """
@@ -76,13 +84,17 @@ class Frontier:
         if os.path.isfile(self.URL_QUEUE_FILE_NAME) and os.path.isfile(self.URL_SET_FILE_NAME) and\
                 os.path.isfile(self.FETCHED_FILE_NAME):
             try:
-                self.urls_queue = pickle.load(open(self.URL_QUEUE_FILE_NAME, "rb"))
-                self.urls_set = pickle.load(open(self.URL_SET_FILE_NAME, "rb"))
-                self.fetched = pickle.load(open(self.FETCHED_FILE_NAME, "rb"))
+                with open(self.URL_QUEUE_FILE_NAME, "rb") as url_queue_file:
+                    self.urls_queue = pickle.load(url_queue_file)
+                with open(self.URL_SET_FILE_NAME, "rb") as url_set_file:
+                    self.urls_set = pickle.load(url_set_file)
+                with open(self.FETCHED_FILE_NAME, "rb") as fetched_file:
+                    self.fetched = pickle.load(fetched_file)
                 logger.info("Loaded previous frontier state into memory. Fetched: %s, Queue size: %s", self.fetched,
                             len(self.urls_queue))
-            except:
-                pass
+            except (OSError, EOFError, pickle.UnpicklingError) as e:
+                logger.error("Could not load previous frontier state: %s", e)
+                raise
         else:
             logger.info("No previous frontier state found. Starting from the seed URL ...")
             self.add_url("http://www.ics.uci.edu/")
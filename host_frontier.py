@@ -0,0 +1,192 @@
+import heapq
+import logging
+import os
+import pickle
+from collections import deque
+from urllib.parse import parse_qs, urlparse
+
+from canonical import canonicalize
+from seen_store import FingerprintSet
+
+logger = logging.getLogger(__name__)
+
+
+def get_host(url):
+    """
+    Returns the host (subdomain) a url is scheduled under
+    """
+    return urlparse(url).netloc.lower()
+
+
+def fifo_priority(url):
+    """
+    Every url has the same priority, so the urls of a host are crawled in the order they were found
+    """
+    return 0
+
+
+def depth_priority(url):
+    """
+    Urls closer to the root of their host come first: the number of directories in the path plus the number of query
+    parameters
+    """
+    parsed = urlparse(url)
+    return len([part for part in parsed.path.split("/") if part]) + len(parse_qs(parsed.query))
+
+
+class TrapScorePriority:
+    """
+    Urls that look less like a trap come first. The score uses the url-only rules of the UrlClassifier and the
+    directory black and white lists of the crawler, so it never fetches a page
+    """
+
+    def __init__(self, crawler):
+        self.crawler = crawler
+
+    def __call__(self, url):
+        parsed = urlparse(url)
+        directory = "/".join(parsed.path.split("/")[:-1])
+        if directory in self.crawler.blacklist:
+            return 10
+        if directory in self.crawler.whitelist:
+            return 0
+        subdirectories = [part for part in parsed.path.lower().split("/") if part]
+        score = len(parse_qs(parsed.query)) + len(url) / 80
+        if len(set(subdirectories)) != len(subdirectories):
+            score += 5
+        return score
+
+
+class HostFrontier:
+    """
+    This class is a frontier that schedules urls per host. Every host (subdomain) has its own priority queue, and the
+    hosts take turns: each turn serves up to the weight of the host (1 by default) urls from it before moving on to
+    the next host, so one huge subdomain cannot crowd out the others. Within a host, the url with the lowest priority
+    value comes first, and urls with the same priority come in the order they were added.
+
+    The priority is given by a callable that takes a url, such as fifo_priority, depth_priority or a
+    TrapScorePriority. With a budget, a host is not served more than budget urls and urls beyond it are not queued.
+
+    It has the same methods as Frontier, so the crawler can use either.
+
+    Attributes:
+        fetched: the number of fetched urls so far
+        priority: the callable giving the priority of a url
+        budget: the maximum number of urls served per host, None for no limit
+        weights: a dictionary of host -> number of urls served per turn, for the hosts that do not use 1
+    """
+
+    # File names to be used when loading and saving the frontier state
+    FRONTIER_DIR_NAME = "frontier_state"
+    STATE_FILE_NAME = os.path.join(".", FRONTIER_DIR_NAME, "host_frontier.pkl")
+
+    def __init__(self, priority=fifo_priority, budget=None, weights=None):
+        self.priority = priority
+        self.budget = budget
+        self.weights = weights if weights is not None else {}
+        self.queues = {}
+        self.active_hosts = deque()
+        self.served_in_turn = 0
+        self.host_fetched = {}
+        self.urls_set = FingerprintSet()
+        self.sequence = 0
+        self.queue_size = 0
+        self.over_budget = 0
+        self.fetched = 0
+
+    def add_url(self, url):
+        """
+        Adds a url to the queue of its host
+        :param url: the url to be added
+        """
+        if not self.urls_set.add(canonicalize(url)[0]):
+            return
+        host = get_host(url)
+        queue = self.queues.get(host)
+        if self.budget is not None and self.host_fetched.get(host, 0) + (len(queue) if queue else 0) >= self.budget:
+            self.over_budget += 1
+            return
+        if queue is None:
+            queue = self.queues[host] = []
+            self.active_hosts.append(host)
+        heapq.heappush(queue, (self.priority(url), self.sequence, url))
+        self.sequence += 1
+        self.queue_size += 1
+
+    def is_duplicate(self, url):
+        return canonicalize(url)[0] in self.urls_set
+
+    def get_next_url(self):
+        """
+        Returns the next url to be fetched, taking the hosts in turns
+        """
+        if not self.has_next_url():
+            return None
+        host = self.active_hosts[0]
+        queue = self.queues[host]
+        _, _, url = heapq.heappop(queue)
+        self.host_fetched[host] = self.host_fetched.get(host, 0) + 1
+        self.served_in_turn += 1
+        if not queue:
+            del self.queues[host]
+            self.active_hosts.popleft()
+            self.served_in_turn = 0
+        elif self.served_in_turn >= self.weights.get(host, 1):
+            self.active_hosts.rotate(-1)
+            self.served_in_turn = 0
+        self.fetched += 1
+        self.queue_size -= 1
+        return url
+
+    def done(self, url):
+        """
+        Marks a url returned by get_next_url as crawled. The queue is saved as a whole, so there is nothing to do
+        """
+
+    def has_next_url(self):
+        """
+        Returns true if there are more urls in the queue, otherwise false
+        """
+        return self.queue_size != 0
+
+    def get_state(self):
+        return {
+            "queues": self.queues,
+            "active_hosts": self.active_hosts,
+            "served_in_turn": self.served_in_turn,
+            "host_fetched": self.host_fetched,
+            "urls_set": self.urls_set,
+            "sequence": self.sequence,
+            "queue_size": self.queue_size,
+            "over_budget": self.over_budget,
+            "fetched": self.fetched
+        }
+
+    def save_frontier(self):
+        """
+        saves the current state of the frontier using pickle. The priority callable is not saved
+        """
+        if not os.path.exists(self.FRONTIER_DIR_NAME):
+            os.makedirs(self.FRONTIER_DIR_NAME)
+        with open(self.STATE_FILE_NAME, "wb") as state_file:
+            pickle.dump(self.get_state(), state_file)
+
+    def load_frontier(self):
+        """
+        loads the previous state of the frontier into memory, if exists
+        """
+        if os.path.isfile(self.STATE_FILE_NAME):
+            try:
+                with open(self.STATE_FILE_NAME, "rb") as state_file:
+                    self.__dict__.update(pickle.load(state_file))
+                logger.info("Loaded previous frontier state into memory. Fetched: %s, Queue size: %s, Hosts: %s",
+                            self.fetched, len(self), len(self.queues))
+            except (OSError, EOFError, pickle.UnpicklingError) as e:
+                logger.error("Could not load previous frontier state: %s", e)
+                raise
+        else:
+            logger.info("No previous frontier state found. Starting from the seed URL ...")
+            self.add_url("http://www.ics.uci.edu/")
+
+    def __len__(self):
+        return self.queue_size
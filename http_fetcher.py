@@ -0,0 +1,269 @@
+import asyncio
+import logging
+import ssl
+import time
+from urllib.parse import urljoin, urlsplit
+
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+fetch_timer = registry.stage("fetch")
+
+
+class _Connection:
+    """
+    An open HTTP/1.1 connection that can be reused for several requests
+    """
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    def close(self):
+        self.writer.close()
+
+
+class HttpFetcher:
+    """
+    This class fetches urls from live web servers. It can be used by the crawler in place of Corpus: fetch_url returns
+    the same url_data dictionary, built from the http response instead of a corpus file.
+
+    Requests are sent with asyncio over pooled keep-alive connections. The number of requests in flight is limited
+    globally and per host, and requests to the same host are spaced by at least per_host_delay seconds. Redirects are
+    followed and the last url is returned as final_url.
+
+    When a proxy (host, port) is given, every request is sent to it with the absolute url in the request line, as to
+    an http proxy. This is how the crawler is pointed at a local stand-in server such as corpus_server.py. https urls
+    are sent to the proxy the same way, without tunnelling.
+
+    Attributes:
+        max_connections: the maximum number of requests in flight at once
+        per_host_connections: the maximum number of requests in flight at once to the same host
+        per_host_delay: the minimum number of seconds between the start of two requests to the same host
+        timeout: the number of seconds after which a request is abandoned, not counting the time it waits for a free
+            slot or for the politeness delay of its host
+        max_redirects: the maximum number of redirects followed for one url
+    """
+
+    USER_AGENT = "IR UCI crawler"
+    REDIRECT_CODES = {301, 302, 303, 307, 308}
+    # http_code of the url_data when the url could not be fetched at all
+    NETWORK_ERROR_CODE = 599
+
+    def __init__(self, max_connections=32, per_host_connections=2, per_host_delay=0.5, timeout=10.0, max_redirects=5,
+                 proxy=None):
+        self.max_connections = max_connections
+        self.per_host_connections = per_host_connections
+        self.per_host_delay = per_host_delay
+        self.timeout = timeout
+        self.max_redirects = max_redirects
+        self.proxy = proxy
+        self.loop = asyncio.new_event_loop()
+        self.idle_connections = {}
+        self.global_semaphore = None
+        self.host_semaphores = {}
+        self.host_next_request = {}
+
+    def get_file_name(self, url):
+        """
+        There is no local file for a live url. Every http(s) url may exist, so the url itself is returned
+        """
+        if urlsplit(url).scheme in ("http", "https"):
+            return url
+        return None
+
+    def fetch_url(self, url):
+        """
+        Fetches the given url and returns its url_data, with the same keys as Corpus.fetch_url
+        """
+        return self.loop.run_until_complete(self.fetch(url))
+
+    def fetch_many(self, urls):
+        """
+        Fetches the given urls concurrently and returns their url_data, in the same order
+        """
+        if not urls:
+            return []
+        return self.loop.run_until_complete(self.fetch_all(urls))
+
+    def close(self):
+        """
+        Closes the pooled connections and the event loop
+        """
+        for connections in self.idle_connections.values():
+            for connection in connections:
+                connection.close()
+        self.idle_connections = {}
+        self.loop.close()
+
+    async def fetch_all(self, urls):
+        """
+        Fetches the given urls concurrently and returns their url_data, in the same order
+        """
+        return await asyncio.gather(*(self.fetch(url) for url in urls))
+
+    async def fetch(self, url):
+        """
+        Fetches the given url, following redirects, and returns its url_data
+        """
+        if self.global_semaphore is None:
+            self.global_semaphore = asyncio.Semaphore(self.max_connections)
+        # requests overlap, so their times are observed directly instead of through the StageTimer
+        fetch_started = time.perf_counter()
+        current_url = url
+        redirects = 0
+        try:
+            while True:
+                http_code, headers, content = await self.request(current_url)
+                location = headers.get("location")
+                if http_code not in self.REDIRECT_CODES or location is None or redirects == self.max_redirects:
+                    break
+                current_url = urljoin(current_url, location)
+                redirects += 1
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as e:
+            logger.warning("Could not fetch %s: %s", current_url, e)
+            fetch_timer.histogram.observe(time.perf_counter() - fetch_started)
+            return {
+                "url": url,
+                "content": None,
+                "http_code": self.NETWORK_ERROR_CODE,
+                "headers": None,
+                "size": 0,
+                "content_type": None,
+                "is_redirected": redirects > 0,
+                "final_url": current_url if redirects > 0 else None
+            }
+
+        fetch_timer.histogram.observe(time.perf_counter() - fetch_started)
+        return {
+            "url": url,
+            "content": content,
+            "http_code": http_code,
+            "headers": headers,
+            "size": len(content),
+            "content_type": headers.get("content-type"),
+            "is_redirected": redirects > 0,
+            "final_url": current_url if redirects > 0 else None
+        }
+
+    async def request(self, url):
+        """
+        Sends one GET request, without following redirects, and returns its status code, headers and body. The
+        request waits for a free global slot, a free slot of its host and the politeness delay of its host, and only
+        then is timed out after timeout seconds
+        """
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(f"not an http url: {url}")
+        host = parts.hostname.lower()
+        host_semaphore = self.host_semaphores.get(host)
+        if host_semaphore is None:
+            host_semaphore = self.host_semaphores[host] = asyncio.Semaphore(self.per_host_connections)
+
+        async with self.global_semaphore, host_semaphore:
+            # wait until the politeness delay since the last request to this host has passed
+            now = time.monotonic()
+            start = max(now, self.host_next_request.get(host, now))
+            self.host_next_request[host] = start + self.per_host_delay
+            if start > now:
+                await asyncio.sleep(start - now)
+
+            if self.proxy is not None:
+                address = (self.proxy[0], self.proxy[1], False)
+                target = url.split("#", 1)[0]
+            else:
+                default_port = 443 if parts.scheme == "https" else 80
+                address = (host, parts.port or default_port, parts.scheme == "https")
+                target = (parts.path or "/") + (("?" + parts.query) if parts.query else "")
+            host_header = parts.netloc.rsplit("@", 1)[-1]
+            return await asyncio.wait_for(self.exchange(address, target, host_header), self.timeout)
+
+    async def exchange(self, address, target, host_header):
+        """
+        Sends a GET request over a pooled connection to the address, or a new one, and returns the status code, headers
+        and body of the response. The connection is put back in the pool if it can be reused
+        """
+        connection, reused = await self.acquire(address)
+        try:
+            http_code, headers, content, keep_alive = await self.send(connection, target, host_header)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            connection.close()
+            if not reused:
+                raise
+            # the server closed the pooled connection while it was idle, retry once on a new one
+            connection, _ = await self.acquire(address, reuse=False)
+            try:
+                http_code, headers, content, keep_alive = await self.send(connection, target, host_header)
+            except BaseException:
+                connection.close()
+                raise
+        except BaseException:
+            connection.close()
+            raise
+        if keep_alive:
+            self.idle_connections.setdefault(address, []).append(connection)
+        else:
+            connection.close()
+        return http_code, headers, content
+
+    async def acquire(self, address, reuse=True):
+        """
+        Returns an idle pooled connection to the address, or opens a new one, and whether it was reused
+        """
+        connections = self.idle_connections.get(address) if reuse else None
+        while connections:
+            connection = connections.pop()
+            if not connection.reader.at_eof():
+                return connection, True
+            connection.close()
+        host, port, use_ssl = address
+        reader, writer = await asyncio.open_connection(host, port, ssl=ssl.create_default_context() if use_ssl else None)
+        return _Connection(reader, writer), False
+
+    async def send(self, connection, target, host_header):
+        """
+        Writes a GET request on the connection and reads the response. Returns the status code, the headers (with
+        lowercase names), the body and whether the connection can be reused
+        """
+        request = (f"GET {target} HTTP/1.1\r\n"
+                   f"Host: {host_header}\r\n"
+                   f"User-Agent: {self.USER_AGENT}\r\n"
+                   "Accept-Encoding: identity\r\n"
+                   "Connection: keep-alive\r\n\r\n")
+        connection.writer.write(request.encode("latin-1"))
+        await connection.writer.drain()
+
+        reader = connection.reader
+        status_line = await reader.readline()
+        if not status_line:
+            raise asyncio.IncompleteReadError(status_line, None)
+        version, http_code = status_line.decode("latin-1").split(None, 2)[:2]
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+        if int(http_code) in (204, 304):
+            content = b""
+        elif headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b";", 1)[0], 16)
+                if size == 0:
+                    # skip the trailers
+                    while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                        pass
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            content = b"".join(chunks)
+        elif "content-length" in headers:
+            content = await reader.readexactly(int(headers["content-length"]))
+        else:
+            content = await reader.read()
+            keep_alive = False
+        return int(http_code), headers, content, keep_alive
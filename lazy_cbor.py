@@ -0,0 +1,175 @@
+from collections.abc import Mapping
+
+import cbor
+
+# CBOR major types
+_UNSIGNED = 0
+_NEGATIVE = 1
+_BYTES = 2
+_TEXT = 3
+_ARRAY = 4
+_MAP = 5
+_TAG = 6
+_SIMPLE = 7
+# simple values false, true and null
+_SIMPLE_VALUES = {20: False, 21: True, 22: None}
+# the byte ending an item of indefinite length
+_BREAK = 0xff
+
+
+def read_head(data, position):
+    """
+    Returns the major type and argument of the CBOR item starting at position, and the position right after its head.
+    The argument is None for an item of indefinite length
+    """
+    initial = data[position]
+    major = initial >> 5
+    info = initial & 0x1f
+    position += 1
+    if info < 24:
+        return major, info, position
+    if info == 31:
+        return major, None, position
+    if info > 27:
+        raise ValueError(f"invalid CBOR item head at {position - 1}")
+    size = 1 << (info - 24)
+    return major, int.from_bytes(data[position:position + size], "big"), position + size
+
+
+def skip(data, position):
+    """
+    Returns the position right after the CBOR item starting at position, without decoding it
+    """
+    major, argument, position = read_head(data, position)
+    if argument is None:
+        # chunks of a string, items of an array or keys and values of a map, up to a break
+        while data[position] != _BREAK:
+            position = skip(data, position)
+        return position + 1
+    if major == _BYTES or major == _TEXT:
+        return position + argument
+    if major == _ARRAY:
+        for _ in range(argument):
+            position = skip(data, position)
+    elif major == _MAP:
+        for _ in range(2 * argument):
+            position = skip(data, position)
+    elif major == _TAG:
+        position = skip(data, position)
+    # integers and simple values have no payload beyond their head
+    return position
+
+
+def decode(data, start, end):
+    """
+    Decodes the CBOR item between start and end. Integers, strings of definite length, booleans and null are decoded
+    here, anything else by the cbor package
+    """
+    major, argument, position = read_head(data, start)
+    if argument is not None:
+        if major == _BYTES:
+            return bytes(data[position:end])
+        if major == _TEXT:
+            return bytes(data[position:end]).decode("utf-8")
+        if major == _UNSIGNED:
+            return argument
+        if major == _NEGATIVE:
+            return -1 - argument
+        if major == _SIMPLE and position == start + 1 and argument in _SIMPLE_VALUES:
+            return _SIMPLE_VALUES[argument]
+    return cbor.loads(bytes(data[start:end]))
+
+
+def map_spans(data, position):
+    """
+    Returns a dictionary of key -> (start, end) of the value of every entry of the CBOR map starting at position. Only
+    the keys are decoded
+    """
+    major, argument, position = read_head(data, position)
+    if major != _MAP:
+        raise ValueError(f"expected a CBOR map at {position}")
+    spans = {}
+    count = 0
+    while (data[position] != _BREAK) if argument is None else (count < argument):
+        key_end = skip(data, position)
+        key_major, key_length, key_start = read_head(data, position)
+        if (key_major == _BYTES or key_major == _TEXT) and key_length is not None:
+            key = bytes(data[key_start:key_end])
+            if key_major == _TEXT:
+                key = key.decode("utf-8")
+        else:
+            key = decode(data, position, key_end)
+        value_end = skip(data, key_end)
+        spans[key] = (key_end, value_end)
+        position = value_end
+        count += 1
+    return spans
+
+
+class LazyRecord(Mapping):
+    """
+    This class is a read-only mapping over an encoded CBOR map, such as a corpus record. Building it only finds where
+    every value is; a value is decoded when it is accessed, and only that value. The fields of a corpus record are
+    wrapped as {b'value': ...}: get_value decodes the wrapped value alone and get_bytes returns a wrapped byte string
+    as a memoryview of the encoded data, without decoding or copying it.
+
+    data can be bytes, a memoryview or an mmap. get_bytes keeps a view of it, the other methods copy what they decode.
+    """
+
+    def __init__(self, data, position=0):
+        self.data = data
+        self.spans = map_spans(data, position)
+        self.decoded = {}
+
+    def __getitem__(self, key):
+        if key not in self.decoded:
+            start, end = self.spans[key]
+            self.decoded[key] = decode(self.data, start, end)
+        return self.decoded[key]
+
+    def __iter__(self):
+        return iter(self.spans)
+
+    def __len__(self):
+        return len(self.spans)
+
+    def __contains__(self, key):
+        return key in self.spans
+
+    def value_span(self, key):
+        """
+        Returns the (start, end) of the value wrapped in the field key, or None if the field or its value is missing
+        """
+        span = self.spans.get(key)
+        if span is None:
+            return None
+        start, _ = span
+        if self.data[start] >> 5 != _MAP:
+            return None
+        return map_spans(self.data, start).get(b"value")
+
+    def get_value(self, key, default=None):
+        """
+        Returns the decoded value wrapped in the field key, or default if the field or its value is missing
+        """
+        if key in self.decoded:
+            wrapper = self.decoded[key]
+            return wrapper[b"value"] if isinstance(wrapper, dict) and b"value" in wrapper else default
+        span = self.value_span(key)
+        if span is None:
+            return default
+        return decode(self.data, *span)
+
+    def get_bytes(self, key, default=None):
+        """
+        Returns the value wrapped in the field key, as a memoryview of the data if it is a byte string of definite
+        length and decoded otherwise, or default if the field or its value is missing
+        """
+        span = self.value_span(key)
+        if span is None:
+            return default
+        start, end = span
+        major, length, content_start = read_head(self.data, start)
+        if major == _BYTES and length is not None:
+            return memoryview(self.data)[content_start:end]
+        return decode(self.data, start, end)
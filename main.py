@@ -1,29 +1,194 @@
+import argparse
 import atexit
 import logging
+import os
 
-import sys
-
-from corpus import Corpus
+from corpus import Corpus, CorpusIndex
+from corpus_archive import ArchiveCorpus
 from crawler import Crawler
 from frontier import Frontier
+from host_frontier import HostFrontier, TrapScorePriority, depth_priority, fifo_priority
+from http_fetcher import HttpFetcher
+from manifest import PageManifest
+from metrics import registry
+from page_cache import CachedCorpus, PageCache
+from parallel_crawler import ParallelCrawler, PrefetchingCrawler
+from sharded_crawler import ShardedCrawler, use_state_dir
+from sqlite_frontier import SqliteFrontier
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Crawls the urls of a corpus starting from the seed url")
+    parser.add_argument("corpus_dir", nargs="?",
+                        help="directory of the corpus to crawl, required by the corpus fetcher, or the corpus archive "
+                             "file, required by the archive fetcher")
+    parser.add_argument("--fetcher", choices=["corpus", "archive", "http"], default="corpus",
+                        help="read pages from the corpus directory, from a corpus archive written by corpus_archive.py "
+                             "or fetch them from live web servers")
+    parser.add_argument("--proxy", help="host:port to send all http requests to, e.g. a local corpus_server.py")
+    parser.add_argument("--max-connections", type=int, default=32,
+                        help="maximum number of http requests in flight at once")
+    parser.add_argument("--per-host-connections", type=int, default=2,
+                        help="maximum number of http requests in flight at once to the same host")
+    parser.add_argument("--per-host-delay", type=float, default=0.5,
+                        help="minimum number of seconds between two http requests to the same host")
+    parser.add_argument("--frontier", choices=["memory", "sqlite", "host"], default="memory",
+                        help="keep the frontier in memory and save it on exit, in a database written as it changes, "
+                             "or in memory with one queue per host served in turns")
+    parser.add_argument("--priority", choices=["fifo", "depth", "trap"], default="fifo",
+                        help="order of the urls of a host in the host frontier: as found, shallowest first or least "
+                             "trap-like first")
+    parser.add_argument("--host-budget", type=int, help="maximum number of urls crawled per host by the host frontier")
+    parser.add_argument("--cache-entries", type=int, default=10000,
+                        help="maximum number of decoded pages and parsed documents kept in memory")
+    parser.add_argument("--cache-mb", type=int, default=256,
+                        help="maximum estimated size in MB of the decoded pages and parsed documents kept in memory")
+    parser.add_argument("--extraction", choices=["stream", "tree"], default="stream",
+                        help="extract the links and text of a page with the event-driven parser, falling back to the "
+                             "full parser on failure, or always with the full parser")
+    parser.add_argument("--similarity", choices=["links", "pages"], default="links",
+                        help="check the content similarity of the page of every link before the link is enqueued, or "
+                             "validate links by their url only and check every crawled page once, dropping "
+                             "near-duplicates")
+    parser.add_argument("--incremental", action="store_true",
+                        help="crawl again from the seed, reusing the pages of the previous incremental crawls whose "
+                             "corpus files did not change instead of processing them again")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of worker processes that fetch and parse pages, 1 crawls in this process only")
+    parser.add_argument("--metrics-file",
+                        help="file the crawl metrics are periodically written to, as Prometheus text if it ends with "
+                             ".prom and as JSON otherwise")
+    parser.add_argument("--metrics-interval", type=float, default=10.0,
+                        help="minimum number of seconds between two writes of the metrics file and of the progress log")
+    parser.add_argument("--profile-stages",
+                        help="comma separated stages to profile with cProfile, e.g. parse,similarity; the profiles are "
+                             "written to the profiles directory at the end of the crawl")
+    parser.add_argument("--shards", type=int, default=1,
+                        help="number of crawler processes the hosts are split among, see sharded_crawler.py to start "
+                             "them all at once")
+    parser.add_argument("--shard", type=int, default=0, help="shard crawled by this process, from 0 to --shards - 1")
+    parser.add_argument("--spool-dir", default="spool", help="directory the shards exchange urls through")
+    args = parser.parse_args()
+    if args.fetcher in ("corpus", "archive") and args.corpus_dir is None:
+        parser.error(f"corpus_dir is required by the {args.fetcher} fetcher")
+    if args.fetcher == "http" and args.workers > 1:
+        parser.error("the http fetcher fetches concurrently by itself and cannot be used with --workers")
+    if args.shards > 1 and (args.fetcher == "http" or args.workers > 1):
+        parser.error("--shards cannot be used with the http fetcher or with --workers")
+    if args.shards > 1 and args.similarity != "pages":
+        # the links of a directory are mostly validated by other shards, so no shard would whitelist the directory
+        parser.error("--shards requires --similarity pages")
+    if args.incremental and (args.fetcher == "http" or args.workers > 1 or args.frontier == "sqlite"):
+        parser.error("--incremental cannot be used with the http fetcher, with --workers or with the sqlite frontier")
+    if not 0 <= args.shard < args.shards:
+        parser.error("--shard must be between 0 and --shards - 1")
+    sharded = args.shards > 1
+    # every shard keeps its state in its own directory, so the shards can run from the same working directory
+    state_dir = os.path.join("frontier_state", f"shard-{args.shard}") if sharded else None
+
     # Configures basic logging
-    logging.basicConfig(format='%(asctime)s (%(name)s) %(levelname)s %(message)s', datefmt='%m/%d/%Y %I:%M:%S %p',
-                        level=logging.INFO)
+    log_format = f'%(asctime)s [shard {args.shard}] (%(name)s) %(levelname)s %(message)s' if sharded else \
+        '%(asctime)s (%(name)s) %(levelname)s %(message)s'
+    logging.basicConfig(format=log_format, datefmt='%m/%d/%Y %I:%M:%S %p', level=logging.INFO)
 
-    # Instantiates frontier and loads the last state if exists
-    frontier = Frontier()
-    frontier.load_frontier()
+    # Instantiates frontier, which is loaded once the crawler exists
+    if args.frontier == "sqlite":
+        frontier = SqliteFrontier(os.path.join(state_dir, "frontier.sqlite3") if sharded else None)
+    elif args.frontier == "host":
+        frontier = HostFrontier(depth_priority if args.priority == "depth" else fifo_priority, args.host_budget)
+    else:
+        frontier = Frontier()
+    if sharded and args.frontier != "sqlite":
+        use_state_dir(frontier, state_dir)
 
-    # Instantiates corpus object with the given cmd arg
-    corpus = Corpus(sys.argv[1])
+    # Instantiates corpus object with the given cmd arg, or a live http fetcher, behind a cache of decoded and parsed
+    # pages
+    if args.fetcher == "http":
+        proxy = None
+        if args.proxy:
+            proxy_host, proxy_port = args.proxy.rsplit(":", 1)
+            proxy = (proxy_host, int(proxy_port))
+        fetcher = HttpFetcher(max_connections=args.max_connections, per_host_connections=args.per_host_connections,
+                              per_host_delay=args.per_host_delay, proxy=proxy)
+        atexit.register(fetcher.close)
+    elif args.fetcher == "archive":
+        fetcher = ArchiveCorpus(args.corpus_dir)
+    elif args.incremental:
+        # the saved snapshot of the index does not see files modified in place, so the corpus is scanned again
+        index = CorpusIndex.build(args.corpus_dir)
+        index.save()
+        fetcher = Corpus(args.corpus_dir, index)
+    else:
+        fetcher = Corpus(args.corpus_dir)
+    page_cache = PageCache(max_entries=args.cache_entries, max_bytes=args.cache_mb * 1024 * 1024)
+    corpus = CachedCorpus(fetcher, page_cache)
 
+    # Instantiates a crawler object, with the analytics of the previous run if exists, and starts crawling
+    if args.fetcher == "http":
+        crawler = PrefetchingCrawler(frontier, corpus, batch_size=args.max_connections)
+    elif sharded:
+        crawler = ShardedCrawler(frontier, corpus, args.shard, args.shards, args.spool_dir)
+    elif args.workers > 1:
+        crawler = ParallelCrawler(frontier, corpus, workers=args.workers)
+    else:
+        crawler = Crawler(frontier, corpus)
+    crawler.page_processor.extraction = args.extraction
+    if args.incremental:
+        manifest = PageManifest()
+        if sharded:
+            use_state_dir(manifest, state_dir)
+        manifest.open()
+        if args.fetcher == "corpus":
+            logging.info("Corpus files since the last incremental crawl: %s", manifest.compare(fetcher.index))
+        crawler.page_processor.manifest = manifest
+        atexit.register(manifest.close)
+    crawler.deferred_similarity = args.similarity == "pages"
+    crawler.progress.interval = args.metrics_interval
+    if args.metrics_file:
+        metrics_file_name = args.metrics_file
+        if sharded:
+            root, extension = os.path.splitext(metrics_file_name)
+            metrics_file_name = f"{root}-shard-{args.shard}{extension}"
+        registry.configure(metrics_file_name, args.metrics_interval)
+        atexit.register(registry.write)
+    if args.profile_stages:
+        registry.enable_profiling(stage.strip() for stage in args.profile_stages.split(","))
+        atexit.register(registry.write_profiles, os.path.join("profiles", f"shard-{args.shard}") if sharded else
+                        "profiles")
+    registry.add_collector(lambda: [("frontier_size", {}, len(frontier)), ("fetched_total", {}, frontier.fetched)])
+    registry.add_collector(lambda: [(f"page_cache_{name}" if name in ("entries", "bytes") else f"page_cache_{name}_total",
+                                     {}, value) for name, value in page_cache.stats().items()])
+    registry.add_collector(lambda: [("link_verdicts_total", {"reason": reason}, count)
+                                    for reason, count in crawler.url_classifier.reason_counts.items()])
+    if args.frontier == "host" and args.priority == "trap":
+        # the trap score uses the directory lists of the crawler, so it can only be set once the crawler exists
+        frontier.priority = TrapScorePriority(crawler)
+    # The frontier is seeded or loaded once its priority is final, so the seed is scored like every other url. An
+    # incremental crawl starts again from the seed, the work it saves is in the page manifest
+    if args.incremental:
+        frontier.add_url("http://www.ics.uci.edu/")
+    else:
+        frontier.load_frontier()
     # Registers a shutdown hook to save frontier state upon unexpected shutdown
     atexit.register(frontier.save_frontier)
-    
-    # Instantiates a crawler object and starts crawling
-    crawler = Crawler(frontier, corpus)
+    if sharded:
+        use_state_dir(crawler.analytics, state_dir)
+        use_state_dir(crawler.analytics.log, state_dir)
+    checkpoint_state = None
+    if args.frontier == "sqlite":
+        # the analytics are saved with every checkpoint of the queue, so they always cover the pages deleted from it
+        frontier.get_checkpoint_state = crawler.analytics.get_state
+        checkpoint_state = frontier.load_checkpoint_state()
+    if checkpoint_state is not None:
+        crawler.analytics.restore_state(checkpoint_state)
+    elif not args.incremental:
+        crawler.analytics.load_state()
+    # the log is closed after the analytics state, which holds its size, is saved
+    atexit.register(crawler.analytics.log.close)
+    atexit.register(crawler.analytics.save_state)
+    # The report is written once, by the shutdown hook, whether the crawl finishes or is interrupted
     atexit.register(crawler.run_analytics)
     crawler.start_crawling()
-    crawler.run_analytics()
+    logging.info("Page cache: %s", page_cache.stats())
+    logging.info("Extraction times in seconds (%s, %s fallbacks): %s", args.extraction,
+                 crawler.page_processor.fallbacks, crawler.page_processor.extraction_times.summary())
+    logging.info("Url verdicts by reason: %s", dict(crawler.url_classifier.reason_counts.most_common()))
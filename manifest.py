@@ -0,0 +1,147 @@
+import logging
+import os
+import pickle
+import sqlite3
+import zlib
+
+logger = logging.getLogger(__name__)
+
+
+class PageManifest:
+    """
+    This class keeps the PageRecord of every url processed by the crawler in a SQLite database, with the size,
+    modification time and content digest of the corpus file it was made from. An incremental re-crawl takes the record
+    of a url from the manifest instead of fetching and parsing its page again when its corpus file did not change: it
+    has the same size and modification time, or, when those changed or are unknown (as in a corpus archive), the same
+    content digest. Only new and changed pages are processed again, and the crawl graph and the report are rebuilt
+    from the records.
+
+    A record holds the links, tokens and shingles of the page, and the MinHash signature of the page if it was
+    computed before the record was written. Records are pickled and compressed, and written in batches of flush_every.
+    A crash loses at most the last batch, whose pages are processed again on the next run.
+
+    Attributes:
+        hits: the number of records reused because the size and modification time of their file did not change
+        digest_hits: the number of records reused because the content of their file did not change
+        misses: the number of urls that had to be processed
+    """
+
+    # File names to be used when loading and saving the manifest, next to the frontier state
+    MANIFEST_DIR_NAME = "frontier_state"
+    MANIFEST_FILE_NAME = os.path.join(".", MANIFEST_DIR_NAME, "manifest.sqlite3")
+
+    def __init__(self, flush_every=200):
+        self.flush_every = flush_every
+        self.connection = None
+        # url -> (file name, size, modification time, digest, record) of the records not written yet
+        self.pending = {}
+        self.hits = 0
+        self.digest_hits = 0
+        self.misses = 0
+
+    def open(self):
+        """
+        Opens the manifest, creating it if it does not exist
+        """
+        if not os.path.exists(self.MANIFEST_DIR_NAME):
+            os.makedirs(self.MANIFEST_DIR_NAME)
+        self.connection = sqlite3.connect(self.MANIFEST_FILE_NAME)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS pages (url TEXT PRIMARY KEY, file_name TEXT NOT NULL, "
+                                "size INTEGER NOT NULL, mtime INTEGER, digest INTEGER, record BLOB NOT NULL)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS pages_file_name ON pages (file_name)")
+        self.connection.commit()
+        logger.info("Opened the page manifest %s. Pages: %s", self.MANIFEST_FILE_NAME, len(self))
+
+    def compare(self, index):
+        """
+        Compares the files of the manifest with a CorpusIndex of the corpus and forgets the records of the files that
+        were deleted. Returns the number of corpus files that are new, changed, deleted and unchanged since the
+        manifest was written
+        """
+        self.flush()
+        files = {}
+        for file_name, size, mtime in self.connection.execute("SELECT file_name, size, mtime FROM pages"):
+            files[file_name] = (size, mtime)
+        counts = {"new": 0, "changed": 0, "deleted": 0, "unchanged": 0}
+        deleted = []
+        for file_name, (size, mtime) in files.items():
+            if file_name not in index:
+                deleted.append(file_name)
+            elif index.get_size(file_name) == size and index.get_mtime(file_name) == mtime:
+                counts["unchanged"] += 1
+            else:
+                counts["changed"] += 1
+        counts["deleted"] = len(deleted)
+        counts["new"] = len(index) - counts["unchanged"] - counts["changed"]
+        with self.connection:
+            self.connection.executemany("DELETE FROM pages WHERE file_name = ?", ((name,) for name in deleted))
+        return counts
+
+    def get(self, url, size=None, mtime=None, digest=None):
+        """
+        Returns the record of the url if its file still has the given size and modification time, or the given content
+        digest. Otherwise returns None
+        """
+        row = self.pending.get(url)
+        if row is None:
+            row = self.connection.execute("SELECT file_name, size, mtime, digest, record FROM pages WHERE url = ?",
+                                          (url,)).fetchone()
+        if row is None:
+            return None
+        _, row_size, row_mtime, row_digest, record = row
+        if mtime is not None and (row_size, row_mtime) == (size, mtime):
+            self.hits += 1
+        elif digest is not None and row_digest == self.to_signed(digest):
+            self.digest_hits += 1
+        else:
+            return None
+        return record if not isinstance(record, bytes) else pickle.loads(zlib.decompress(record))
+
+    def put(self, url, file_name, size, mtime, record):
+        """
+        Adds or replaces the record of the url, made from the corpus file with the given name, size and modification
+        time
+        """
+        self.pending[url] = (file_name, size, mtime, self.to_signed(record.digest), record)
+        if len(self.pending) >= self.flush_every:
+            self.flush()
+
+    @staticmethod
+    def to_signed(value):
+        """
+        Returns a 64-bit digest as a signed 64-bit integer, which is what SQLite stores
+        """
+        if value is None:
+            return None
+        return value - (1 << 64) if value >= 1 << 63 else value
+
+    def flush(self):
+        """
+        Writes the pending records to the database in one transaction
+        """
+        if not self.pending:
+            return
+        rows = [(url, file_name, size, mtime, digest,
+                 zlib.compress(pickle.dumps(record, pickle.HIGHEST_PROTOCOL), 1))
+                for url, (file_name, size, mtime, digest, record) in self.pending.items()]
+        with self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO pages (url, file_name, size, mtime, digest, record) "
+                                        "VALUES (?, ?, ?, ?, ?, ?)", rows)
+        self.pending = {}
+
+    def close(self):
+        """
+        Writes the pending records and closes the database
+        """
+        if self.connection is not None:
+            self.flush()
+            self.connection.close()
+            self.connection = None
+            logger.info("Page manifest: %s unchanged, %s with the same content, %s processed", self.hits,
+                        self.digest_hits, self.misses)
+
+    def __len__(self):
+        self.flush()
+        return self.connection.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
@@ -0,0 +1,292 @@
+import bisect
+import cProfile
+import json
+import logging
+import os
+import time
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+
+class Histogram:
+    """
+    This class is a histogram of durations in seconds with exponential buckets, from 10 microseconds doubling up to
+    about 10 seconds, plus one bucket for anything longer. Observing a value costs one binary search, so it can be
+    used on every page.
+
+    Attributes:
+        bounds: the upper bound of each bucket but the last one, in seconds
+        counts: the number of values observed in each bucket
+        count: the number of values observed
+        total: the sum of the values observed
+    """
+
+    BOUNDS = tuple(0.00001 * 2 ** i for i in range(21))
+
+    def __init__(self, bounds=BOUNDS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        """
+        Adds a value to the histogram
+        """
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def quantile(self, q):
+        """
+        Returns the upper bound of the bucket holding the q quantile of the values observed, an estimate of the
+        quantile that is at most twice too big. Values beyond the last bound are reported as the last bound
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, bucket_count in zip(self.bounds, self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return bound
+        return self.bounds[-1]
+
+    def summary(self):
+        """
+        Returns the number of values, their mean and the estimated median, 90th and 99th percentiles, as a dictionary
+        """
+        return {
+            "count": self.count,
+            "mean": self.mean(),
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99)
+        }
+
+
+class StageTimer:
+    """
+    This class is a context manager that times one stage of the crawl into a Histogram. Timers are created once per
+    stage by Metrics.stage and entered around every run of the stage, so timing a stage costs two clock reads and one
+    histogram update. A stage can be profiled with cProfile as well, see Metrics.enable_profiling.
+    """
+
+    __slots__ = ("name", "histogram", "starts", "metrics", "profiler")
+
+    def __init__(self, name, metrics):
+        self.name = name
+        self.histogram = Histogram()
+        self.starts = []
+        self.metrics = metrics
+        self.profiler = None
+
+    def __enter__(self):
+        # only one profiler can be active at a time, so a profiled stage run inside another profiled stage is
+        # included in the profile of the outer one
+        if self.profiler is not None and self.metrics.active_profiler is None:
+            self.metrics.active_profiler = self.profiler
+            self.profiler.enable()
+        self.starts.append(time.perf_counter())
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.histogram.observe(time.perf_counter() - self.starts.pop())
+        if self.profiler is not None and self.metrics.active_profiler is self.profiler and not self.starts:
+            self.profiler.disable()
+            self.metrics.active_profiler = None
+        return False
+
+
+class Metrics:
+    """
+    This class collects the metrics of a crawl: the timings of its stages (fetch, decode, parse, validation,
+    similarity, enqueue, ...), counters incremented while crawling and values read from the crawl state (such as
+    the frontier size or the page cache hits) by collectors only when the metrics are written.
+
+    With a file name, the metrics are rewritten to that file at most every interval seconds by maybe_write, as
+    Prometheus text if the file name ends with .prom and as JSON otherwise. The file is replaced atomically, so it can
+    be read at any time.
+
+    Every process has one instance, registry. Worker processes keep their own metrics, which are not written.
+    """
+
+    PREFIX = "crawler_"
+
+    def __init__(self):
+        self.stages = {}
+        self.counters = Counter()
+        self.collectors = []
+        self.active_profiler = None
+        self.file_name = None
+        self.interval = 10.0
+        self.last_write = 0.0
+        self.started = time.time()
+
+    def stage(self, name):
+        """
+        Returns the StageTimer of the stage with the given name
+        """
+        timer = self.stages.get(name)
+        if timer is None:
+            timer = self.stages[name] = StageTimer(name, self)
+        return timer
+
+    def increment(self, name, value=1):
+        self.counters[name] += value
+
+    def reset(self):
+        """
+        Clears the timings of the stages and the counters, keeping the timers, which are created once per stage
+        """
+        for timer in self.stages.values():
+            timer.histogram = Histogram()
+        self.counters.clear()
+
+    def add_collector(self, collector):
+        """
+        Adds a callable that returns a list of (name, labels, value) for metrics that are read when the metrics are
+        written. labels is a dictionary, empty for a metric without labels. Metrics whose name ends with _total are
+        counters, the others are gauges
+        """
+        self.collectors.append(collector)
+
+    def enable_profiling(self, stages):
+        """
+        Profiles the given stages with cProfile. The profiles are written by write_profiles
+        """
+        for name in stages:
+            self.stage(name).profiler = cProfile.Profile()
+
+    def configure(self, file_name, interval=10.0):
+        """
+        Sets the file the metrics are written to by maybe_write, and the minimum number of seconds between writes
+        """
+        self.file_name = file_name
+        self.interval = interval
+
+    def collect(self):
+        """
+        Returns the (name, labels, value) of the metrics of the collectors
+        """
+        collected = []
+        for collector in self.collectors:
+            try:
+                collected.extend(collector())
+            except Exception as e:
+                logger.warning("Could not collect metrics: %s", e)
+        return collected
+
+    def snapshot(self):
+        """
+        Returns all the metrics as a dictionary that can be written as JSON
+        """
+        stages = {}
+        for name, timer in self.stages.items():
+            stages[name] = dict(timer.histogram.summary(), total=timer.histogram.total)
+        return {
+            "uptime_seconds": time.time() - self.started,
+            "counters": dict(self.counters),
+            "stages": stages,
+            "collected": [{"name": name, "labels": labels, "value": value} for name, labels, value in self.collect()]
+        }
+
+    def to_prometheus(self):
+        """
+        Returns all the metrics in the Prometheus text format
+        """
+        prefix = self.PREFIX
+        lines = [f"# TYPE {prefix}uptime_seconds gauge", f"{prefix}uptime_seconds {time.time() - self.started}"]
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"# TYPE {prefix}{name}_total counter")
+            lines.append(f"{prefix}{name}_total {value}")
+
+        lines.append(f"# TYPE {prefix}stage_seconds histogram")
+        for name, timer in sorted(self.stages.items()):
+            histogram = timer.histogram
+            cumulative = 0
+            for bound, bucket_count in zip(histogram.bounds, histogram.counts):
+                cumulative += bucket_count
+                lines.append(f'{prefix}stage_seconds_bucket{{stage="{name}",le="{bound:g}"}} {cumulative}')
+            lines.append(f'{prefix}stage_seconds_bucket{{stage="{name}",le="+Inf"}} {histogram.count}')
+            lines.append(f'{prefix}stage_seconds_sum{{stage="{name}"}} {histogram.total}')
+            lines.append(f'{prefix}stage_seconds_count{{stage="{name}"}} {histogram.count}')
+
+        typed = set()
+        for name, labels, value in self.collect():
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {prefix}{name} {'counter' if name.endswith('_total') else 'gauge'}")
+            label_text = ",".join(f'{key}="{label}"' for key, label in sorted(labels.items()))
+            lines.append(f"{prefix}{name}{{{label_text}}} {value}" if label_text else f"{prefix}{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def maybe_write(self):
+        """
+        Writes the metrics file if one is configured and it was not written in the last interval seconds
+        """
+        if self.file_name is not None and time.monotonic() - self.last_write >= self.interval:
+            self.write()
+
+    def write(self):
+        """
+        Replaces the metrics file with the current metrics
+        """
+        self.last_write = time.monotonic()
+        if self.file_name.endswith(".prom"):
+            text = self.to_prometheus()
+        else:
+            text = json.dumps(self.snapshot(), indent=2)
+        directory = os.path.dirname(self.file_name)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        temporary_file_name = self.file_name + ".tmp"
+        try:
+            with open(temporary_file_name, "w", encoding="utf-8") as metrics_file:
+                metrics_file.write(text)
+            os.replace(temporary_file_name, self.file_name)
+        except OSError as e:
+            logger.warning("Could not write the metrics file %s: %s", self.file_name, e)
+
+    def write_profiles(self, directory):
+        """
+        Writes the cProfile stats of every profiled stage to directory/<stage>.prof
+        """
+        for name, timer in self.stages.items():
+            if timer.profiler is None:
+                continue
+            if not os.path.exists(directory):
+                os.makedirs(directory)
+            timer.profiler.dump_stats(os.path.join(directory, f"{name}.prof"))
+
+
+class ProgressLog:
+    """
+    This class logs a summary of the progress of the crawl at most every interval seconds, instead of one line per url
+    """
+
+    def __init__(self, interval=10.0):
+        self.interval = interval
+        self.started = time.monotonic()
+        self.last_log = self.started
+        self.last_fetched = None
+
+    def maybe_log(self, frontier):
+        now = time.monotonic()
+        if now - self.last_log < self.interval:
+            return
+        fetched = frontier.fetched
+        if self.last_fetched is not None:
+            rate = (fetched - self.last_fetched) / (now - self.last_log)
+            logger.info("Fetched: %s, Queue size: %s, %.1f pages/sec", fetched, len(frontier), rate)
+        else:
+            logger.info("Fetched: %s, Queue size: %s", fetched, len(frontier))
+        self.last_log = now
+        self.last_fetched = fetched
+
+
+registry = Metrics()
@@ -0,0 +1,125 @@
+import hashlib
+from array import array
+
+
+class NearDuplicateIndex:
+    """
+    This class finds near-duplicate pages among all the pages added to it so far. Each page is summarized by a MinHash
+    signature of its set of shingles, a fixed number of 64-bit values whose agreement estimates the Jaccard similarity
+    of two pages. The signatures are split into bands and indexed by band (locality sensitive hashing), so a lookup
+    only compares the pages that share at least one whole band instead of every page of the crawl.
+
+    Signatures are computed with one-permutation hashing: every shingle is hashed once, the hash selects one of
+    num_hashes buckets and each bucket keeps its smallest value. Empty buckets borrow the value of the next non-empty
+    bucket. The memory used per page is constant: one signature plus one entry per band.
+
+    With the default 64 hashes in 16 bands of 4 rows, two pages with a Jaccard similarity of 0.9 share a band with
+    probability above 0.999, while pages with a similarity of 0.3 do so with probability 0.12.
+
+    Attributes:
+        num_hashes: the number of values in a signature
+        bands: the number of bands the signature is split into for the LSH index
+        max_candidates: the maximum number of candidate pages compared for one lookup
+    """
+
+    HASH_BITS = 64
+
+    def __init__(self, num_hashes=64, bands=16, max_candidates=64):
+        if num_hashes % bands != 0 or num_hashes & (num_hashes - 1) != 0:
+            raise ValueError("num_hashes must be a power of two and a multiple of bands")
+        self.num_hashes = num_hashes
+        self.bands = bands
+        self.rows = num_hashes // bands
+        self.max_candidates = max_candidates
+        self.bucket_shift = self.HASH_BITS - (num_hashes.bit_length() - 1)
+        self.value_mask = (1 << self.bucket_shift) - 1
+        self.urls = []
+        self.signatures = []
+        self.url_ids = {}
+        self.band_buckets = [{} for _ in range(bands)]
+
+    def hash_shingle(self, shingle):
+        """
+        Returns a 64-bit hash of a shingle. Integer shingles are assumed to be hashes already
+        """
+        if isinstance(shingle, int):
+            return shingle & 0xFFFFFFFFFFFFFFFF
+        return int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "little")
+
+    def signature(self, shingles):
+        """
+        Returns the MinHash signature of an iterable of shingles, or None if there are no shingles
+        """
+        empty = self.value_mask + 1
+        mins = [empty] * self.num_hashes
+        shift = self.bucket_shift
+        mask = self.value_mask
+        for shingle in shingles:
+            hashed = self.hash_shingle(shingle)
+            bucket = hashed >> shift
+            value = hashed & mask
+            if value < mins[bucket]:
+                mins[bucket] = value
+        if all(value == empty for value in mins):
+            return None
+
+        # fills the empty buckets with the value of the next non-empty bucket
+        for i in range(self.num_hashes):
+            j = i
+            while mins[j % self.num_hashes] == empty:
+                j += 1
+            if j != i:
+                mins[i] = mins[j % self.num_hashes]
+        return array("Q", mins)
+
+    def similarity(self, signature, other):
+        """
+        Returns the estimated Jaccard similarity of two signatures
+        """
+        return sum(1 for a, b in zip(signature, other) if a == b) / self.num_hashes
+
+    def band_keys(self, signature):
+        rows = self.rows
+        return [hash(tuple(signature[band * rows:(band + 1) * rows])) for band in range(self.bands)]
+
+    def find_most_similar(self, signature, exclude=None):
+        """
+        Returns the url of the indexed page most similar to the signature and their estimated similarity, or
+        (None, 0) if no indexed page shares a band with it. The page with the url exclude is skipped
+        """
+        if signature is None:
+            return None, 0
+        excluded_id = self.url_ids.get(exclude)
+        candidates = set()
+        for band, key in enumerate(self.band_keys(signature)):
+            for page_id in self.band_buckets[band].get(key, ()):
+                if page_id != excluded_id:
+                    candidates.add(page_id)
+            if len(candidates) >= self.max_candidates:
+                break
+
+        best_url, best_similarity = None, 0
+        for page_id in candidates:
+            similarity = self.similarity(signature, self.signatures[page_id])
+            if similarity > best_similarity:
+                best_url, best_similarity = self.urls[page_id], similarity
+        return best_url, best_similarity
+
+    def add(self, url, signature):
+        """
+        Indexes the signature of a page. Pages without a signature and pages already indexed are ignored
+        """
+        if signature is None or url in self.url_ids:
+            return
+        page_id = len(self.urls)
+        self.urls.append(url)
+        self.signatures.append(signature)
+        self.url_ids[url] = page_id
+        for band, key in enumerate(self.band_keys(signature)):
+            self.band_buckets[band].setdefault(key, []).append(page_id)
+
+    def __contains__(self, url):
+        return url in self.url_ids
+
+    def __len__(self):
+        return len(self.urls)
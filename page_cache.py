@@ -0,0 +1,141 @@
+from collections import OrderedDict
+
+from lxml import html
+
+
+class PageCache:
+    """
+    This class is a bounded, size-aware LRU cache. Every entry is stored together with an estimate of its size in bytes,
+    and the least recently used entries are evicted as soon as either the number of entries or their total size goes
+    over its limit.
+
+    Attributes:
+        max_entries: the maximum number of entries held at once
+        max_bytes: the maximum total estimated size of the entries held at once
+        current_bytes: the total estimated size of the entries currently held
+        hits: the number of lookups that found their entry
+        misses: the number of lookups that did not find their entry
+        evictions: the number of entries evicted to make room for new ones
+    """
+
+    def __init__(self, max_entries=10000, max_bytes=256 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """
+        Returns the value stored under the given key and marks it as recently used, or None if it is not cached
+        """
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key, value, size):
+        """
+        Stores a value under the given key and evicts the least recently used entries until the cache fits its limits.
+        Values bigger than the whole cache are not stored
+        """
+        if key in self.entries:
+            self.current_bytes -= self.entries.pop(key)[1]
+        if size > self.max_bytes:
+            return
+        self.entries[key] = (value, size)
+        self.current_bytes += size
+        while len(self.entries) > self.max_entries or self.current_bytes > self.max_bytes:
+            _, (_, evicted_size) = self.entries.popitem(last=False)
+            self.current_bytes -= evicted_size
+            self.evictions += 1
+
+    def stats(self):
+        """
+        Returns the counters of the cache as a dictionary
+        """
+        return {
+            "entries": len(self.entries),
+            "bytes": self.current_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class CachedCorpus:
+    """
+    This class sits between a corpus and the crawler. It serves fetch_url from a PageCache, so each url is decoded from
+    the corpus at most once while it is still in use, and keeps the parsed lxml document of each page in the same cache.
+    """
+
+    # Rough overhead of a url_data dictionary, and how much bigger a parsed lxml tree is than its html source
+    URL_DATA_OVERHEAD = 1024
+    DOCUMENT_SIZE_FACTOR = 4
+
+    def __init__(self, corpus, cache=None):
+        self.corpus = corpus
+        self.cache = cache if cache is not None else PageCache()
+
+    def get_file_name(self, url):
+        return self.corpus.get_file_name(url)
+
+    def get_file_stat(self, url):
+        """
+        Returns the hashed file name, size and modification time of the corpus file of the url if the corpus keeps
+        them, otherwise None
+        """
+        get_file_stat = getattr(self.corpus, "get_file_stat", None)
+        return get_file_stat(url) if get_file_stat is not None else None
+
+    def fetch_url(self, url):
+        """
+        Returns the url_data of the given url, decoding it from the corpus only if it is not cached
+        """
+        url_data = self.cache.get(("data", url))
+        if url_data is None:
+            url_data = self.corpus.fetch_url(url)
+            self.cache_url_data(url, url_data)
+        return url_data
+
+    def prefetch(self, urls):
+        """
+        Fetches together the given urls that are not cached yet and caches their url_data
+        """
+        missing = [url for url in urls if ("data", url) not in self.cache]
+        for url, url_data in zip(missing, self.corpus.fetch_many(missing)):
+            self.cache_url_data(url, url_data)
+
+    def cache_url_data(self, url, url_data):
+        """
+        Puts the url_data of a url in the cache
+        """
+        content = url_data["content"]
+        self.cache.put(("data", url), url_data, self.URL_DATA_OVERHEAD + (len(content) if content else 0))
+
+    def get_document(self, url_data):
+        """
+        Returns the parsed lxml document of the given url_data, parsing it only if it is not cached. Parser errors are
+        raised to the caller and nothing is cached for them
+        """
+        key = ("document", url_data["url"])
+        document = self.cache.get(key)
+        if document is None:
+            content = url_data["content"]
+            if isinstance(content, memoryview):
+                # contents are views of the corpus data, lxml.html parses bytes only
+                content = content.tobytes()
+            document = html.fromstring(content)
+            self.cache.put(key, document, self.DOCUMENT_SIZE_FACTOR * len(url_data["content"]))
+        return document
@@ -0,0 +1,271 @@
+import logging
+import time
+from urllib.parse import urljoin
+
+from lxml import etree
+
+from canonical import canonicalize
+from duplicates import ExactDuplicateIndex
+from metrics import Histogram, registry
+from tokenizer import Tokenizer
+
+logger = logging.getLogger(__name__)
+parse_timer = registry.stage("parse")
+
+
+class PageRecord:
+    """
+    This class is the compact result of processing one page. It holds everything the crawler needs from a page so the
+    page does not have to be fetched or parsed again.
+
+    Attributes:
+        url: the url of the page
+        content_type: Content-Type of the page, None if it was not provided
+        http_code: the http status code of the response for the page
+        has_content: whether the corpus has any content for the page
+        links: the links of the page in their absolute form, in document order
+        tokens: the lowercase alphanumeric tokens of the visible text of the page
+        token_count: the number of tokens of the page
+        shingles: a dictionary of the hashes of the (up to n_length words) phrases of the page -> the number of times they
+            appear
+        signature: the MinHash signature of the shingles of the page, None until it is needed
+        digest: the 64-bit digest of the content of the page, None if it has no content
+        final_url: the url the page was redirected to, None if it was not redirected
+        duplicate_of: the url of the crawled page this page was an exact copy of when it was processed, None if it was
+            not one. Nothing is extracted from a copy. A page can become a copy after it is processed, so the crawler
+            looks copies up in its ExactDuplicateIndex instead
+    """
+
+    __slots__ = ("url", "content_type", "http_code", "has_content", "links", "tokens", "token_count", "shingles",
+                 "signature", "digest", "final_url", "duplicate_of")
+
+    def __init__(self, url, content_type=None, has_content=False, links=(), tokens=None, shingles=None):
+        self.url = url
+        self.content_type = content_type
+        self.http_code = None
+        self.has_content = has_content
+        self.links = links
+        self.tokens = tokens if tokens is not None else []
+        self.token_count = len(self.tokens)
+        self.shingles = shingles if shingles is not None else {}
+        self.signature = None
+        self.digest = None
+        self.final_url = None
+        self.duplicate_of = None
+
+    def __setstate__(self, state):
+        # records saved to a manifest before a slot was added have no value for it, it keeps its default
+        self.__init__(None)
+        for name, value in state[1].items():
+            setattr(self, name, value)
+
+    def estimated_size(self):
+        """
+        Returns a rough estimate of the memory used by the record in bytes
+        """
+        return 256 + 96 * len(self.links) + 64 * len(self.tokens) + 128 * len(self.shingles)
+
+
+class ExtractionTarget:
+    """
+    This class is a parser target for the event-driven interface of the lxml HTMLParser. It gets the start and end tags
+    and the text of a page as they are parsed, and keeps only what the crawler needs: the href of every a element, the
+    href of the first base element and the visible text, leaving out the text inside script, style and template
+    elements. No tree is built.
+    """
+
+    SKIPPED_TAGS = frozenset(["script", "style", "template"])
+
+    def __init__(self):
+        self.hrefs = []
+        self.base_href = None
+        self.text = []
+        self.skip_depth = 0
+
+    def start(self, tag, attrib):
+        if tag == "a":
+            href = attrib.get("href")
+            if href is not None:
+                self.hrefs.append(href)
+        elif tag == "base":
+            if self.base_href is None:
+                self.base_href = attrib.get("href")
+        elif tag in self.SKIPPED_TAGS:
+            self.skip_depth += 1
+
+    def end(self, tag):
+        if tag in self.SKIPPED_TAGS and self.skip_depth:
+            self.skip_depth -= 1
+
+    def data(self, data):
+        if not self.skip_depth:
+            self.text.append(data)
+
+    def close(self):
+        return self.hrefs, self.base_href, "".join(self.text)
+
+
+class PageProcessor:
+    """
+    This class parses a page once and derives from that single parse the absolute links, the tokens and the phrase
+    shingles of the page. Records are kept in the page cache of the corpus, so a page that is needed again (for
+    example when it is checked for similarity before it is crawled) is not processed twice while it is cached.
+
+    With the stream extraction, the default, a page is parsed by the event-driven lxml parser with an
+    ExtractionTarget, without building a tree. Pages the stream parser fails on, and every page with the tree
+    extraction, are parsed into a full lxml document instead. The time spent extracting each page is recorded in
+    extraction_times.
+
+    The content of every page is digested before it is parsed. With an ExactDuplicateIndex of the crawled pages, a
+    page that is an exact copy of a crawled page is not parsed at all.
+
+    Attributes:
+        extraction: STREAM or TREE
+        extraction_times: a Histogram of the seconds spent extracting the links and text of each page
+        fallbacks: the number of pages the stream extraction failed on
+        duplicates: the ExactDuplicateIndex of the crawled pages, None to parse every page
+        manifest: the PageManifest the records are taken from and saved to in an incremental crawl, None otherwise
+    """
+
+    STREAM = "stream"
+    TREE = "tree"
+
+    # Visible text of a page: every text node that is not inside a script, style or template element
+    TEXT_XPATH = "//text()[not(ancestor::script) and not(ancestor::style) and not(ancestor::template)]"
+
+    def __init__(self, corpus, n_length=5, extraction=STREAM, duplicates=None, manifest=None):
+        self.corpus = corpus
+        self.n_length = n_length
+        self.extraction = extraction
+        self.duplicates = duplicates
+        self.manifest = manifest
+        self.tokenizer = Tokenizer(n_length=n_length)
+        self.extraction_times = Histogram()
+        self.fallbacks = 0
+
+    def process_url(self, url):
+        """
+        Returns the record of the given url, fetching and processing the page only if its record is not cached
+        """
+        key = self.get_record_key(url)
+        record = self.corpus.cache.get(key)
+        if record is None:
+            record = self.load_record(url) if self.manifest is not None else None
+            if record is None:
+                url_data = self.corpus.fetch_url(url)
+                with parse_timer:
+                    record = self.process(url_data)
+            self.corpus.cache.put(key, record, record.estimated_size())
+        return record
+
+    @staticmethod
+    def get_record_key(url):
+        """
+        Returns the page cache key of the record of a url. Urls with the same canonical form share their record
+        """
+        return "record", canonicalize(url)[0]
+
+    def load_record(self, url):
+        """
+        Returns the record of the url from the manifest if its corpus file did not change since the record was saved.
+        Otherwise processes the page and saves its record to the manifest. Returns None for urls that are not in the
+        corpus
+        """
+        stat = self.corpus.get_file_stat(url)
+        if stat is None:
+            return None
+        file_name, size, mtime = stat
+        record = self.manifest.get(url, size, mtime)
+        if record is None:
+            url_data = self.corpus.fetch_url(url)
+            content = url_data["content"]
+            digest = ExactDuplicateIndex.digest(content) if content else None
+            record = self.manifest.get(url, digest=digest)
+            if record is None or record.content_type != url_data["content_type"]:
+                self.manifest.misses += 1
+                with parse_timer:
+                    record = self.process(url_data)
+                # a copy has nothing of its own to save
+                if record.duplicate_of is not None:
+                    return record
+            self.manifest.put(url, file_name, size, mtime, record)
+        if self.duplicates is not None and record.digest is not None:
+            record.duplicate_of = self.duplicates.find(url, record.digest, record.final_url)
+        return record
+
+    def process(self, url_data):
+        """
+        Parses the content of the given url_data once and returns its PageRecord
+        """
+        content = url_data.get("content")
+        record = PageRecord(url_data.get("url"), url_data.get("content_type"), content is not None)
+        record.http_code = url_data.get("http_code")
+        if content is None or content == "" or len(content) == 0:
+            return record
+
+        record.digest = ExactDuplicateIndex.digest(content)
+        if url_data.get("is_redirected"):
+            record.final_url = url_data.get("final_url")
+        if self.duplicates is not None:
+            record.duplicate_of = self.duplicates.find(record.url, record.digest, record.final_url)
+            if record.duplicate_of is not None:
+                return record
+
+        start = time.perf_counter()
+        extracted = None
+        if self.extraction == self.STREAM:
+            try:
+                extracted = self.stream_extract(content)
+            except Exception as e:
+                self.fallbacks += 1
+                logger.debug("Falling back to the full parser for %s: %s", record.url, e)
+        if extracted is None:
+            try:
+                extracted = self.tree_extract(self.corpus.get_document(url_data))
+            except Exception as e:
+                logger.warning("Could not parse %s: %s", record.url, e)
+                return record
+        hrefs, base_href, text = extracted
+        record.links = self.extract_links(url_data, hrefs, base_href)
+        self.extraction_times.observe(time.perf_counter() - start)
+
+        text = text.lower()
+        record.tokens = list(self.tokenizer.tokens(text))
+        record.token_count = len(record.tokens)
+        record.shingles = self.tokenizer.shingles(text)
+        return record
+
+    def stream_extract(self, content):
+        """
+        Returns the hrefs of the a elements, the href of the base element (None if there is none) and the visible text
+        of the page, in one pass of the event-driven parser
+        """
+        return etree.fromstring(content, etree.HTMLParser(target=ExtractionTarget()))
+
+    def tree_extract(self, document):
+        """
+        Returns the hrefs of the a elements, the href of the base element (None if there is none) and the visible text
+        of a parsed lxml document
+        """
+        base_hrefs = document.xpath("//base/@href")
+        text = "".join(document.getroottree().xpath(self.TEXT_XPATH))
+        return document.xpath("//a/@href"), base_hrefs[0] if base_hrefs else None, text
+
+    def extract_links(self, url_data, hrefs, base_href=None):
+        """
+        Returns the given hrefs in their absolute form. Relative links are resolved against the base href of the page
+        if it has one, and otherwise against the final url if the page was redirected
+        """
+        url = url_data.get("url")
+        if url_data["is_redirected"]:
+            url = url_data.get("final_url")
+        if url is None:
+            return ()
+        try:
+            if base_href:
+                url = urljoin(url, base_href.strip())
+            # gets all relative and absolute links and turns every relative link into absolute
+            return tuple(urljoin(url, link) for link in hrefs)
+        except Exception as e:
+            logger.warning("Could not extract the links of %s: %s", url_data.get("url"), e)
+            return ()
@@ -0,0 +1,159 @@
+import logging
+import multiprocessing
+from urllib.parse import urlparse
+
+from canonical import canonicalize, unique_links
+from crawler import Crawler
+from metrics import registry
+from page_cache import CachedCorpus, PageCache
+from page_processor import PageProcessor
+
+logger = logging.getLogger(__name__)
+load_timer = registry.stage("batch_load")
+
+# Page processor of a worker process, created once per worker by _init_worker
+_worker_processor = None
+
+
+def _init_worker(corpus, n_length, extraction, cache_entries, cache_bytes):
+    """
+    Sets up the page processor of a worker process over its own page cache
+    """
+    global _worker_processor
+    _worker_processor = PageProcessor(CachedCorpus(corpus, PageCache(cache_entries, cache_bytes)), n_length, extraction)
+
+
+def _process_url(url):
+    """
+    Fetches, parses and extracts the links of a url in a worker process and returns its url and PageRecord
+    """
+    return url, _worker_processor.process_url(url)
+
+
+class BatchCrawler(Crawler):
+    """
+    This class crawls like Crawler but loads the pages of several urls at once. It takes the urls at the head of the
+    frontier as one batch and loads their records together. Before the links of the batch are validated, the pages
+    those links point to are loaded the same way so check_similarity finds their records in the page cache. The
+    results are then handled in frontier order, so the pages are crawled in the same order and with the same results
+    as by the serial crawler.
+
+    Subclasses decide how a list of urls is turned into records by overriding load_records. By default the records
+    are loaded one url at a time in this process, as by the serial crawler.
+    """
+
+    def __init__(self, frontier, corpus, batch_size=64, analytics=None):
+        super().__init__(frontier, corpus, analytics)
+        self.batch_size = batch_size
+
+    def start_crawling(self):
+        """
+        This method starts the crawling process, one batch of urls at a time
+        """
+        while self.frontier.has_next_url():
+            batch = []
+            while self.frontier.has_next_url() and len(batch) < self.batch_size:
+                batch.append(self.frontier.get_next_url())
+            logger.debug("Fetching %s URLs", len(batch))
+
+            with load_timer:
+                results = self.load_records(batch)
+            self.cache_records(results)
+            candidates = self.get_similarity_candidates(record for _, record in results)
+            with load_timer:
+                self.cache_records(self.load_records(candidates))
+
+            for url, record in results:
+                self.process_page(url, record)
+                self.frontier.done(url)
+            self.progress.maybe_log(self.frontier)
+            registry.maybe_write()
+
+    def load_records(self, urls):
+        """
+        Returns a list of (url, PageRecord) for the given urls, in the same order
+        """
+        return [(url, self.page_processor.process_url(url)) for url in urls]
+
+    def cache_records(self, results):
+        """
+        Puts the loaded records in the page cache of the crawler
+        """
+        cache = self.corpus.cache
+        for url, record in results:
+            cache.put(PageProcessor.get_record_key(url), record, record.estimated_size())
+
+    def get_similarity_candidates(self, records):
+        """
+        Returns the links of the given records whose page may be needed by check_similarity and is not cached yet.
+        This is a superset of the links that reach check_similarity: only the rules that do not depend on the crawl
+        state are applied here, the rest is decided later by is_valid
+        """
+        if self.deferred_similarity:
+            # links are validated by their url only, the pages they point to are not needed before they are crawled
+            return []
+        cache = self.corpus.cache
+        candidates = []
+        seen = set()
+        for record in records:
+            for link in unique_links(record.links):
+                canonical_url = canonicalize(link)[0]
+                if canonical_url in seen or canonical_url in self.check_already or \
+                        PageProcessor.get_record_key(link) in cache:
+                    continue
+                seen.add(canonical_url)
+                if not self.is_crawlable(urlparse(link)):
+                    continue
+                if self.corpus.get_file_name(link) is not None:
+                    candidates.append(link)
+        return candidates
+
+
+class ParallelCrawler(BatchCrawler):
+    """
+    This class is a BatchCrawler that fetches, decodes and parses the pages of a batch in a pool of worker processes.
+    The parent process keeps the frontier, the trap and similarity state and the analytics.
+    """
+
+    def __init__(self, frontier, corpus, workers=4, batch_size=64, worker_cache_entries=2000,
+                 worker_cache_bytes=64 * 1024 * 1024, analytics=None):
+        super().__init__(frontier, corpus, batch_size, analytics)
+        self.workers = workers
+        self.worker_cache_entries = worker_cache_entries
+        self.worker_cache_bytes = worker_cache_bytes
+        self.pool = None
+
+    def start_crawling(self):
+        """
+        This method starts the crawling process with a pool of worker processes
+        """
+        initargs = (self.corpus.corpus, self.n_length, self.page_processor.extraction, self.worker_cache_entries,
+                    self.worker_cache_bytes)
+        with multiprocessing.Pool(self.workers, initializer=_init_worker, initargs=initargs) as pool:
+            self.pool = pool
+            try:
+                super().start_crawling()
+            finally:
+                self.pool = None
+
+    def load_records(self, urls):
+        """
+        Processes the urls in the worker processes
+        """
+        # every worker gets a few chunks of the urls
+        chunksize = max(1, len(urls) // (self.workers * 4))
+        return self.pool.map(_process_url, urls, chunksize=chunksize)
+
+
+class PrefetchingCrawler(BatchCrawler):
+    """
+    This class is a BatchCrawler for corpora that can fetch many urls concurrently, such as the HttpFetcher. The pages
+    of a batch are fetched together through fetch_many and then parsed in this process.
+    """
+
+    def load_records(self, urls):
+        """
+        Fetches the urls together and processes them one by one
+        """
+        self.corpus.prefetch([url for url in urls if PageProcessor.get_record_key(url) not in self.corpus.cache])
+        return super().load_records(urls)
@@ -0,0 +1,212 @@
+import hashlib
+import math
+import struct
+from array import array
+
+
+def fingerprint(url):
+    """
+    Returns the 64-bit fingerprint of a url, never 0
+    """
+    value = int.from_bytes(hashlib.blake2b(url.encode("utf-8", "surrogatepass"), digest_size=8).digest(), "little")
+    return value or 1
+
+
+class FingerprintSet:
+    """
+    This class is a set of urls that keeps only a 64-bit fingerprint of each url, in an open-addressing hash table
+    backed by an array. It uses 16 to 32 bytes per url instead of the ~100 bytes or more of a str in a set.
+
+    Two different urls are confused only if their fingerprints collide. For n urls the probability that any two
+    collide is about n^2 / 2^65: 3e-8 for a million urls and 3e-6 for ten million. A collision makes a new url look
+    already seen, it never makes a seen url look new.
+
+    The table is serialized as its raw bytes, so saving and loading it costs one copy.
+    """
+
+    HEADER = struct.Struct("<QQ")
+    MIN_CAPACITY = 1024
+
+    def __init__(self, capacity=MIN_CAPACITY):
+        capacity = max(self.MIN_CAPACITY, 1 << (capacity - 1).bit_length())
+        self.table = array("Q", bytes(8 * capacity))
+        self.mask = capacity - 1
+        self.count = 0
+
+    def add(self, url):
+        """
+        Adds a url to the set. Returns True if it was not in the set before
+        """
+        return self.add_fingerprint(fingerprint(url))
+
+    def add_fingerprint(self, value):
+        table = self.table
+        mask = self.mask
+        index = value & mask
+        while True:
+            slot = table[index]
+            if slot == 0:
+                break
+            if slot == value:
+                return False
+            index = (index + 1) & mask
+        table[index] = value
+        self.count += 1
+        # keeps the table at most half full so probe sequences stay short
+        if 2 * self.count > len(table):
+            self.grow()
+        return True
+
+    def contains_fingerprint(self, value):
+        table = self.table
+        mask = self.mask
+        index = value & mask
+        while True:
+            slot = table[index]
+            if slot == value:
+                return True
+            if slot == 0:
+                return False
+            index = (index + 1) & mask
+
+    def grow(self):
+        old_table = self.table
+        self.table = array("Q", bytes(16 * len(old_table)))
+        self.mask = len(self.table) - 1
+        self.count = 0
+        for value in old_table:
+            if value:
+                self.add_fingerprint(value)
+
+    def to_bytes(self):
+        """
+        Returns the set serialized as bytes
+        """
+        return self.HEADER.pack(len(self.table), self.count) + self.table.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        Returns the set serialized in data by to_bytes
+        """
+        capacity, count = cls.HEADER.unpack_from(data)
+        fingerprints = cls.__new__(cls)
+        fingerprints.table = array("Q")
+        fingerprints.table.frombytes(data[cls.HEADER.size:cls.HEADER.size + 8 * capacity])
+        fingerprints.mask = capacity - 1
+        fingerprints.count = count
+        return fingerprints
+
+    def __getstate__(self):
+        return self.to_bytes()
+
+    def __setstate__(self, state):
+        other = self.from_bytes(state)
+        self.table, self.mask, self.count = other.table, other.mask, other.count
+
+    def __contains__(self, url):
+        return self.contains_fingerprint(fingerprint(url))
+
+    def __len__(self):
+        return self.count
+
+
+class BloomFilter:
+    """
+    This class is a Bloom filter: a bit array that answers whether a url may have been added (with a small chance of
+    a false positive) or was certainly not added. Its size is chosen for the expected number of urls (capacity) and
+    the accepted false positive rate: m = -n ln(p) / ln(2)^2 bits and k = m/n ln(2) hash functions. Beyond capacity
+    the false positive rate grows as (1 - e^(-kn/m))^k.
+    """
+
+    HEADER = struct.Struct("<QQQ")
+
+    def __init__(self, capacity=1000000, error_rate=0.01):
+        self.num_bits = max(64, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def positions(self, value):
+        # double hashing on the two 32-bit halves of the fingerprint: the k positions are h1 + i * h2
+        h1 = value & 0xFFFFFFFF
+        h2 = (value >> 32) | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, url):
+        self.add_fingerprint(fingerprint(url))
+
+    def add_fingerprint(self, value):
+        bits = self.bits
+        for position in self.positions(value):
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def contains_fingerprint(self, value):
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self.positions(value))
+
+    def __contains__(self, url):
+        return self.contains_fingerprint(fingerprint(url))
+
+    def false_positive_rate(self):
+        """
+        Returns the expected false positive rate for the number of urls added so far
+        """
+        return (1 - math.exp(-self.num_hashes * self.count / self.num_bits)) ** self.num_hashes
+
+    def to_bytes(self):
+        """
+        Returns the filter serialized as bytes
+        """
+        return self.HEADER.pack(self.num_bits, self.num_hashes, self.count) + bytes(self.bits)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        Returns the filter serialized in data by to_bytes
+        """
+        bloom = cls.__new__(cls)
+        bloom.num_bits, bloom.num_hashes, bloom.count = cls.HEADER.unpack_from(data)
+        bloom.bits = bytearray(data[cls.HEADER.size:])
+        return bloom
+
+    def __getstate__(self):
+        return self.to_bytes()
+
+    def __setstate__(self, state):
+        other = self.from_bytes(state)
+        self.num_bits, self.num_hashes = other.num_bits, other.num_hashes
+        self.count, self.bits = other.count, other.bits
+
+
+class SeenSet(FingerprintSet):
+    """
+    This class is a FingerprintSet with a Bloom filter in front of it. Most lookups in the "removed" and "already
+    checked" sets are for urls that are not in them, and the Bloom filter, a much smaller bit array, answers most of
+    those without probing the table. Both are keyed on the same fingerprint, which is computed once per lookup. The
+    answers are the same as those of the FingerprintSet alone.
+    """
+
+    def __init__(self, capacity=FingerprintSet.MIN_CAPACITY, bloom_capacity=1000000, bloom_error_rate=0.01):
+        super().__init__(capacity)
+        self.bloom = BloomFilter(bloom_capacity, bloom_error_rate)
+
+    def add(self, url):
+        value = fingerprint(url)
+        if self.add_fingerprint(value):
+            self.bloom.add_fingerprint(value)
+            return True
+        return False
+
+    def __contains__(self, url):
+        value = fingerprint(url)
+        return self.bloom.contains_fingerprint(value) and self.contains_fingerprint(value)
+
+    def __getstate__(self):
+        return super().__getstate__(), self.bloom.to_bytes()
+
+    def __setstate__(self, state):
+        table_state, bloom_state = state
+        super().__setstate__(table_state)
+        self.bloom = BloomFilter.from_bytes(bloom_state)
@@ -0,0 +1,432 @@
+import argparse
+import hashlib
+import logging
+import os
+import pickle
+import shutil
+import subprocess
+import sys
+import time
+from functools import lru_cache
+from urllib.parse import urlparse
+
+from analytics import Analytics
+from canonical import unique_links
+from corpus import CorpusIndex
+from crawler import Crawler, validation_timer
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+exchange_timer = registry.stage("exchange")
+
+# Kinds of the urls sent between shards: a link found on a page, to be validated by its shard, and a url taken from
+# the frontier of another shard, to be crawled as is
+LINK = "link"
+FRONTIER_URL = "frontier_url"
+
+
+@lru_cache(maxsize=65536)
+def shard_of_host(host, shards):
+    """
+    Returns the shard that owns the host. The hash does not depend on the process, so every shard agrees on it
+    """
+    digest = hashlib.blake2b(host.encode("utf-8", "surrogatepass"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") % shards
+
+
+def shard_of(url, shards):
+    """
+    Returns the shard that owns the url, by the hash of its host. Urls that cannot be parsed belong to the shard of
+    the empty host
+    """
+    try:
+        host = urlparse(url).hostname or ""
+    except ValueError:
+        host = ""
+    return shard_of_host(host, shards)
+
+
+def use_state_dir(state_owner, directory):
+    """
+    Moves the state files of a Frontier, a HostFrontier, an Analytics, a CrawlLog or a PageManifest to directory, so
+    several shards can run from the same working directory. The files are named by the *_DIR_NAME and *_FILE_NAME
+    attributes of their class
+    """
+    for name in dir(type(state_owner)):
+        if name.endswith("_DIR_NAME"):
+            setattr(state_owner, name, directory)
+        elif name.endswith("_FILE_NAME"):
+            setattr(state_owner, name, os.path.join(directory, os.path.basename(getattr(state_owner, name))))
+
+
+class SpoolTransport:
+    """
+    This class exchanges urls between the shards of a crawl through a spool directory shared by all of them, so the
+    shards can be separate processes on one machine (or on machines sharing a file system). It also publishes the
+    status of the shard for termination detection and collects the analytics of every shard at the end.
+
+    The spool directory has one inbox directory per shard, holding the batches of urls sent to that shard as pickle
+    files. A batch is written under a temporary name and renamed, so a receiver never reads a partial batch. The status
+    directory holds one file per shard saying whether the shard is idle, with an epoch that changes every time it
+    becomes active. The results directory holds the analytics state and a copy of the crawl log of every shard once it
+    is done.
+
+    A shard publishes that it is active before it takes any batch out of its inbox and that it is idle only once its
+    frontier is empty and its batches are sent. The crawl is over when every shard is idle, with the same epochs,
+    before and after a check that all the inboxes are empty: all the shards were then idle at the same time with no
+    url left to exchange, and an idle shard only becomes active by receiving urls.
+    """
+
+    INBOX_DIR_NAME = "inbox-{}"
+    STATUS_DIR_NAME = "status"
+    RESULTS_DIR_NAME = "results"
+
+    def __init__(self, spool_dir, shard, shards):
+        self.spool_dir = spool_dir
+        self.shard = shard
+        self.shards = shards
+        self.outgoing = {}
+        self.sequence = 0
+        self.epoch = 0
+        self.started = time.time_ns()
+        for directory in [self.get_inbox_dir(other) for other in range(shards)] + \
+                [os.path.join(spool_dir, self.STATUS_DIR_NAME), os.path.join(spool_dir, self.RESULTS_DIR_NAME)]:
+            os.makedirs(directory, exist_ok=True)
+        # the results of a previous run of this shard are out of date as soon as it starts again
+        result_file_name = self.get_result_file_name(shard)
+        for file_name in (result_file_name, get_result_log_file_name(result_file_name)):
+            if os.path.isfile(file_name):
+                os.remove(file_name)
+
+    def get_inbox_dir(self, shard):
+        return os.path.join(self.spool_dir, self.INBOX_DIR_NAME.format(shard))
+
+    def get_status_file_name(self, shard):
+        return os.path.join(self.spool_dir, self.STATUS_DIR_NAME, f"shard-{shard}.pkl")
+
+    def get_result_file_name(self, shard):
+        return os.path.join(self.spool_dir, self.RESULTS_DIR_NAME, f"shard-{shard}.pkl")
+
+    @staticmethod
+    def write_file(file_name, value):
+        """
+        Pickles value to file_name through a temporary file, so readers see either the old file or the new one
+        """
+        directory, name = os.path.split(file_name)
+        temporary_file_name = os.path.join(directory, f".{name}.tmp")
+        with open(temporary_file_name, "wb") as file:
+            pickle.dump(value, file)
+        os.replace(temporary_file_name, file_name)
+
+    def send(self, shard, kind, url):
+        """
+        Buffers a url of the given kind to be sent to shard by the next flush
+        """
+        self.outgoing.setdefault(shard, []).append((kind, url))
+
+    def flush(self):
+        """
+        Writes the buffered urls of every shard to its inbox as one batch. Returns the number of urls sent
+        """
+        sent = 0
+        for shard, batch in self.outgoing.items():
+            self.sequence += 1
+            name = f"{time.time_ns():020d}-{self.shard:04d}-{self.sequence:010d}.pkl"
+            self.write_file(os.path.join(self.get_inbox_dir(shard), name), batch)
+            sent += len(batch)
+        self.outgoing = {}
+        return sent
+
+    def list_batches(self, shard):
+        """
+        Returns the file names of the batches in the inbox of shard, oldest first
+        """
+        inbox_dir = self.get_inbox_dir(shard)
+        return [os.path.join(inbox_dir, name) for name in sorted(os.listdir(inbox_dir)) if not name.startswith(".")]
+
+    def has_batches(self):
+        return len(self.list_batches(self.shard)) != 0
+
+    def receive(self):
+        """
+        Takes the batches out of the inbox of this shard and returns their (kind, url), oldest batch first. The shard
+        must be published as active before
+        """
+        received = []
+        for file_name in self.list_batches(self.shard):
+            try:
+                with open(file_name, "rb") as file:
+                    received.extend(pickle.load(file))
+            except (OSError, EOFError, pickle.UnpicklingError) as e:
+                logger.error("Could not read the batch %s: %s", file_name, e)
+                continue
+            os.remove(file_name)
+        return received
+
+    def publish_status(self, idle):
+        """
+        Publishes whether this shard is idle. Becoming active starts a new epoch
+        """
+        if not idle:
+            self.epoch += 1
+        self.write_file(self.get_status_file_name(self.shard), (idle, f"{self.started}-{self.epoch}"))
+
+    def read_statuses(self):
+        """
+        Returns the (idle, epoch) of every shard, or None if a shard has not published its status yet
+        """
+        statuses = []
+        for shard in range(self.shards):
+            try:
+                with open(self.get_status_file_name(shard), "rb") as file:
+                    statuses.append(pickle.load(file))
+            except (OSError, EOFError, pickle.UnpicklingError):
+                return None
+        return statuses
+
+    def is_terminated(self):
+        """
+        Returns True if every shard is idle and no url is left to exchange, see the class documentation
+        """
+        before = self.read_statuses()
+        if before is None or not all(idle for idle, _ in before):
+            return False
+        if any(self.list_batches(shard) for shard in range(self.shards)):
+            return False
+        return self.read_statuses() == before
+
+    def write_result(self, state, log_file_name):
+        """
+        Saves the analytics state and a copy of the crawl log of this shard for the merge. The log is copied first, so
+        the log of a shard with a result is complete
+        """
+        result_file_name = self.get_result_file_name(self.shard)
+        directory, name = os.path.split(get_result_log_file_name(result_file_name))
+        temporary_file_name = os.path.join(directory, f".{name}.tmp")
+        if os.path.isfile(log_file_name):
+            shutil.copyfile(log_file_name, temporary_file_name)
+        else:
+            open(temporary_file_name, "wb").close()
+        os.replace(temporary_file_name, os.path.join(directory, name))
+        self.write_file(result_file_name, state)
+
+    def read_results(self, timeout=300.0, poll_interval=0.5):
+        """
+        Waits up to timeout seconds for the analytics state of every shard and returns the states found, by shard
+        """
+        deadline = time.monotonic() + timeout
+        missing = list(range(self.shards))
+        while missing and time.monotonic() < deadline:
+            missing = [shard for shard in missing if not os.path.isfile(self.get_result_file_name(shard))]
+            if missing:
+                time.sleep(poll_interval)
+        if missing:
+            logger.warning("No analytics from shards %s, the report does not include them", missing)
+        return read_results(self.spool_dir, self.shards)
+
+
+def get_result_log_file_name(result_file_name):
+    """
+    Returns the file name of the copy of the crawl log of the shard with the given result file
+    """
+    return os.path.splitext(result_file_name)[0] + ".jsonl"
+
+
+def read_results(spool_dir, shards):
+    """
+    Returns the analytics states written to the spool directory by the shards of a crawl, by shard, each pointing to
+    the copy of the crawl log of its shard
+    """
+    states = []
+    for shard in range(shards):
+        file_name = os.path.join(spool_dir, SpoolTransport.RESULTS_DIR_NAME, f"shard-{shard}.pkl")
+        if not os.path.isfile(file_name):
+            continue
+        try:
+            with open(file_name, "rb") as file:
+                state = pickle.load(file)
+        except (OSError, EOFError, pickle.UnpicklingError) as e:
+            logger.error("Could not read the analytics of shard %s: %s", shard, e)
+            continue
+        state["log_files"] = [get_result_log_file_name(file_name)]
+        states.append(state)
+    return states
+
+
+def merge_results(states, stop_words=()):
+    """
+    Returns the Analytics of a whole crawl from the analytics states of its shards
+    """
+    merged = Analytics(stop_words)
+    # the report of the merged analytics is made of the logs of the shards only
+    merged.log_files = []
+    for state in states:
+        shard_analytics = Analytics(stop_words)
+        shard_analytics.set_state(state)
+        merged.merge(shard_analytics)
+    return merged
+
+
+class ShardedCrawler(Crawler):
+    """
+    This class crawls one shard of a crawl split among several crawler processes by host. Each shard owns the hosts
+    whose hash falls in its partition (see shard_of) and keeps its own frontier, trap and similarity state and
+    analytics. The links of a page that belong to another shard are sent to it through a SpoolTransport and validated
+    there, against the state of the shard that will crawl them; links rejected by the url-only rules are decided
+    where they are found. A shard that runs out of urls waits for urls from the others until the whole crawl is over.
+
+    Compared with a single crawler, the directory black and white lists and the near-duplicate index are kept per
+    shard, and the valid out links of a page count only its links owned by its own shard, since the links sent to
+    other shards are decided there. A shard would never whitelist a directory by the similarity checks of its links,
+    as most of the links found in a directory belong to other shards, so shards check the similarity of crawled pages
+    (deferred similarity) only.
+
+    At the end every shard saves its analytics to the spool directory and shard 0 writes the merged report.
+    """
+
+    def __init__(self, frontier, corpus, shard, shards, spool_dir, analytics=None, exchange_every=64,
+                 max_poll_interval=1.0):
+        super().__init__(frontier, corpus, analytics)
+        self.shard = shard
+        self.shards = shards
+        self.transport = SpoolTransport(spool_dir, shard, shards)
+        self.exchange_every = exchange_every
+        self.max_poll_interval = max_poll_interval
+
+    def owns(self, url):
+        return shard_of(url, self.shards) == self.shard
+
+    def start_crawling(self):
+        """
+        This method crawls the urls of this shard until every shard is out of urls
+        """
+        self.transport.publish_status(idle=False)
+        while True:
+            self.crawl_frontier()
+            self.send_links()
+            if self.receive_links() or self.wait_for_links():
+                continue
+            logger.info("Every shard is done. Fetched: %s", self.frontier.fetched)
+            return
+
+    def crawl_frontier(self):
+        """
+        Crawls the urls of the frontier, exchanging urls with the other shards every exchange_every pages. Urls of the
+        frontier that belong to another shard, such as the seed url, are sent to it
+        """
+        pages = 0
+        while self.frontier.has_next_url():
+            url = self.frontier.get_next_url()
+            if not self.owns(url):
+                self.transport.send(shard_of(url, self.shards), FRONTIER_URL, url)
+                self.frontier.done(url)
+                continue
+            logger.debug("Fetching URL %s", url)
+            self.process_page(url, self.page_processor.process_url(url))
+            self.frontier.done(url)
+            self.progress.maybe_log(self.frontier)
+            registry.maybe_write()
+            pages += 1
+            if pages % self.exchange_every == 0:
+                self.send_links()
+                self.receive_links()
+
+    def process_page(self, url, record):
+        """
+        Handles a crawled url given its PageRecord like Crawler.process_page, sending the links of other shards to them
+        """
+        self.whitelist.add(url)
+        if self.skip_page(url, record):
+            return
+        registry.increment("pages")
+        registry.increment("links_discovered", len(record.links))
+        with validation_timer:
+            verdicts = self.url_classifier.classify_batch(unique_links(record.links))
+        local_verdicts = []
+        for verdict in verdicts:
+            # a url rejected by the url-only rules is decided here, wherever it belongs
+            owner = self.shard if verdict.accepted is not None else shard_of(verdict.url, self.shards)
+            if owner == self.shard:
+                local_verdicts.append(self.finish_verdict(verdict))
+                continue
+            self.transport.send(owner, LINK, verdict.url)
+            registry.increment("links_forwarded")
+        valid_links_counter = self.enqueue_links(local_verdicts)
+        self.analytics.add_page(url, record, valid_links_counter)
+
+    def send_links(self):
+        with exchange_timer:
+            self.transport.flush()
+
+    def receive_links(self):
+        """
+        Validates the links and enqueues the frontier urls sent by the other shards. Returns True if any was received
+        """
+        with exchange_timer:
+            received = self.transport.receive()
+        links = []
+        for kind, url in received:
+            if kind == FRONTIER_URL:
+                self.frontier.add_url(url)
+            else:
+                links.append(url)
+        registry.increment("links_received", len(links))
+        self.enqueue_links(self.classify_links(links))
+        return len(received) != 0
+
+    def wait_for_links(self):
+        """
+        Publishes this shard as idle and waits until urls arrive, returning True, or the crawl is over, returning False
+        """
+        self.transport.publish_status(idle=True)
+        poll_interval = 0.01
+        while True:
+            if self.transport.has_batches():
+                self.transport.publish_status(idle=False)
+                return True
+            if self.transport.is_terminated():
+                return False
+            time.sleep(poll_interval)
+            poll_interval = min(2 * poll_interval, self.max_poll_interval)
+
+    def run_analytics(self):
+        """
+        Saves the analytics of this shard to the spool directory. Shard 0 then writes the report of the whole crawl
+        """
+        self.transport.write_result(self.analytics.get_state(), self.analytics.log.LOG_FILE_NAME)
+        if self.shard == 0:
+            merge_results(self.transport.read_results(), self.stop_words).write_report("analytics.txt")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Crawls a corpus with several shard processes of main.py on this machine and writes the merged "
+                    "report. The shards check the similarity of crawled pages (--similarity pages). Options that are "
+                    "not listed here are passed to every shard",
+        epilog="Example: python sharded_crawler.py corpus_dir --shards 4 --frontier sqlite")
+    parser.add_argument("corpus_dir", help="directory of the corpus to crawl, or a corpus archive file")
+    parser.add_argument("--shards", type=int, default=4, help="number of shard processes")
+    parser.add_argument("--spool-dir", default="spool", help="directory the shards exchange urls through")
+    args, shard_args = parser.parse_known_args()
+
+    logging.basicConfig(format='%(asctime)s (%(name)s) %(levelname)s %(message)s', datefmt='%m/%d/%Y %I:%M:%S %p',
+                        level=logging.INFO)
+    if os.path.isdir(args.corpus_dir):
+        # the index snapshot is saved once here instead of by every shard at the same time
+        CorpusIndex.load(args.corpus_dir)
+    # statuses and results of a previous crawl would be taken for those of this one; urls still in the inboxes are
+    # kept for the shards resuming from their saved frontiers
+    for name in (SpoolTransport.STATUS_DIR_NAME, SpoolTransport.RESULTS_DIR_NAME):
+        shutil.rmtree(os.path.join(args.spool_dir, name), ignore_errors=True)
+
+    main_file_name = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+    processes = [subprocess.Popen([sys.executable, main_file_name, args.corpus_dir, "--shards", str(args.shards),
+                                   "--shard", str(shard), "--spool-dir", args.spool_dir, "--similarity", "pages"] +
+                                  shard_args)
+                 for shard in range(args.shards)]
+    exit_codes = [process.wait() for process in processes]
+    failed = [shard for shard, exit_code in enumerate(exit_codes) if exit_code != 0]
+    if failed:
+        logger.error("Shards %s failed", failed)
+        sys.exit(1)
+    logger.info("Crawled with %s shards, report written to analytics.txt", args.shards)
@@ -0,0 +1,211 @@
+import logging
+import os
+import pickle
+import sqlite3
+from collections import deque
+
+from canonical import canonicalize
+from seen_store import fingerprint
+
+logger = logging.getLogger(__name__)
+
+
+class SqliteFrontier:
+    """
+    This class is a frontier kept in a SQLite database on disk instead of in memory. It has the same methods as
+    Frontier, so the crawler can use either. The queue and the fingerprints of the seen urls live in the database, so
+    the queue can grow bigger than memory and resuming a crawl only opens the database.
+
+    Urls added are buffered and committed every flush_every urls. A url taken from the queue stays in the database
+    until the crawler calls done with it, once its page is handled, and is only deleted by the next checkpoint, every
+    checkpoint_every pages done. A checkpoint also saves the state returned by get_checkpoint_state, such as the
+    analytics of the crawl, in the same transaction, so the saved state always covers exactly the pages deleted from
+    the queue. After a crash, the urls taken since the last checkpoint are crawled again on resume, and the state of
+    the last checkpoint is resumed with them.
+
+    Attributes:
+        fetched: the number of fetched urls so far
+        flush_every: the number of buffered urls after which they are committed
+        checkpoint_every: the number of pages done after which the queue and the checkpoint state are committed
+        read_ahead: the number of queued urls read from the database at once
+        get_checkpoint_state: a function returning the picklable state saved with every checkpoint, or None
+    """
+
+    # File names to be used when loading and saving the frontier state
+    FRONTIER_DIR_NAME = "frontier_state"
+    DATABASE_FILE_NAME = os.path.join(".", FRONTIER_DIR_NAME, "frontier.sqlite3")
+
+    def __init__(self, database_file_name=None, flush_every=100, checkpoint_every=1000, read_ahead=1000):
+        self.database_file_name = database_file_name or self.DATABASE_FILE_NAME
+        self.flush_every = flush_every
+        self.checkpoint_every = checkpoint_every
+        self.read_ahead = read_ahead
+        self.get_checkpoint_state = None
+        self.connection = None
+        self.fetched = 0
+        self.queue_size = 0
+        # urls added but not written to the database yet, in order, and their fingerprints for duplicate checks
+        self.pending_urls = []
+        self.pending_fingerprints = set()
+        # urls read from the database and not handed out yet, the ids of the urls handed out and not done yet, and the
+        # ids of the urls done since the last checkpoint
+        self.next_urls = deque()
+        self.last_read_id = 0
+        self.taken_ids = {}
+        self.done_ids = []
+
+    def open(self):
+        """
+        Opens the database, creating it if it does not exist
+        """
+        directory = os.path.dirname(self.database_file_name)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.connection = sqlite3.connect(self.database_file_name)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS seen (fingerprint INTEGER PRIMARY KEY)")
+        # ids must not be reused after the last queued url is deleted, or the read ahead would skip urls
+        self.connection.execute("CREATE TABLE IF NOT EXISTS queue "
+                                "(id INTEGER PRIMARY KEY AUTOINCREMENT, url TEXT NOT NULL)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value BLOB NOT NULL)")
+        self.connection.commit()
+
+        row = self.connection.execute("SELECT value FROM meta WHERE key = 'fetched'").fetchone()
+        self.fetched = row[0] if row else 0
+        self.queue_size = self.connection.execute("SELECT COUNT(*) FROM queue").fetchone()[0]
+
+    def add_url(self, url):
+        """
+        Adds a url to the urls queue
+        :param url: the url to be added
+        """
+        if not self.is_duplicate(url):
+            self.pending_urls.append(url)
+            self.pending_fingerprints.add(self.get_fingerprint(url))
+            self.queue_size += 1
+            self.maybe_flush()
+
+    def is_duplicate(self, url):
+        value = self.get_fingerprint(url)
+        if value in self.pending_fingerprints:
+            return True
+        return self.connection.execute("SELECT 1 FROM seen WHERE fingerprint = ?", (value,)).fetchone() is not None
+
+    @staticmethod
+    def get_fingerprint(url):
+        """
+        Returns the fingerprint of the canonical form of the url as a signed 64-bit integer, which is what SQLite stores
+        """
+        value = fingerprint(canonicalize(url)[0])
+        return value - (1 << 64) if value >= 1 << 63 else value
+
+    def get_next_url(self):
+        """
+        Returns the next url to be fetched
+        """
+        if not self.has_next_url():
+            return None
+        if not self.next_urls:
+            # the pending urls are behind the ones in the database, so they are written before reading ahead
+            self.flush()
+            self.next_urls.extend(self.connection.execute(
+                "SELECT id, url FROM queue WHERE id > ? ORDER BY id LIMIT ?", (self.last_read_id, self.read_ahead)))
+            self.last_read_id = self.next_urls[-1][0]
+        url_id, url = self.next_urls.popleft()
+        self.taken_ids[url] = url_id
+        self.fetched += 1
+        self.queue_size -= 1
+        return url
+
+    def done(self, url):
+        """
+        Marks a url returned by get_next_url as crawled, so the next checkpoint deletes it from the queue
+        """
+        url_id = self.taken_ids.pop(url, None)
+        if url_id is None:
+            return
+        self.done_ids.append(url_id)
+        if len(self.done_ids) >= self.checkpoint_every:
+            self.checkpoint()
+
+    def has_next_url(self):
+        """
+        Returns true if there are more urls in the queue, otherwise false
+        """
+        return self.queue_size != 0
+
+    def maybe_flush(self):
+        if len(self.pending_urls) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the buffered urls to the database in one transaction
+        """
+        if not self.pending_urls:
+            return
+        with self.connection:
+            self.write_pending_urls()
+
+    def write_pending_urls(self):
+        self.connection.executemany("INSERT OR IGNORE INTO seen (fingerprint) VALUES (?)",
+                                    ((value,) for value in self.pending_fingerprints))
+        self.connection.executemany("INSERT INTO queue (url) VALUES (?)", ((url,) for url in self.pending_urls))
+        self.pending_urls = []
+        self.pending_fingerprints = set()
+
+    def checkpoint(self):
+        """
+        Writes the buffered urls, deletes the urls done from the queue and saves the checkpoint state, in one
+        transaction
+        """
+        state = self.get_checkpoint_state() if self.get_checkpoint_state is not None else None
+        with self.connection:
+            self.write_pending_urls()
+            self.connection.executemany("DELETE FROM queue WHERE id = ?", ((url_id,) for url_id in self.done_ids))
+            # the urls taken and not done are fetched again on resume, and counted again then
+            self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('fetched', ?)",
+                                    (self.fetched - len(self.taken_ids),))
+            if state is not None:
+                self.connection.execute("INSERT OR REPLACE INTO state (key, value) VALUES ('checkpoint', ?)",
+                                        (pickle.dumps(state, pickle.HIGHEST_PROTOCOL),))
+        self.done_ids = []
+
+    def load_checkpoint_state(self):
+        """
+        Returns the state saved by the last checkpoint, or None if there is none
+        """
+        row = self.connection.execute("SELECT value FROM state WHERE key = 'checkpoint'").fetchone()
+        return pickle.loads(row[0]) if row is not None else None
+
+    def save_frontier(self):
+        """
+        Writes the buffered changes of the frontier and the checkpoint state to the database
+        """
+        if self.connection is not None:
+            self.checkpoint()
+
+    def load_frontier(self):
+        """
+        Opens the frontier database of a previous run, if exists, or starts a new one from the seed url
+        """
+        self.open()
+        if self.connection.execute("SELECT 1 FROM seen LIMIT 1").fetchone() is not None:
+            logger.info("Loaded previous frontier state. Fetched: %s, Queue size: %s", self.fetched, len(self))
+        else:
+            logger.info("No previous frontier state found. Starting from the seed URL ...")
+            self.add_url("http://www.ics.uci.edu/")
+
+    def close(self):
+        """
+        Writes the buffered changes and closes the database
+        """
+        if self.connection is not None:
+            self.checkpoint()
+            self.connection.close()
+            self.connection = None
+
+    def __len__(self):
+        return self.queue_size
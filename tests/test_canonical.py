@@ -0,0 +1,84 @@
+import hashlib
+import os
+from urllib.parse import urlparse
+
+import pytest
+
+from canonical import canonicalize, unique_links
+from corpus import Corpus, CorpusIndex
+from crawler import Crawler
+from frontier import Frontier
+from page_processor import PageProcessor
+import url_classifier
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def baseline_hashed_link(url):
+    """
+    The corpus file name as Corpus.get_file_name computed it before canonicalize
+    """
+    parsed = urlparse(url)
+    path = parsed.path[:-1] if parsed.path.endswith("/") else parsed.path
+    return hashlib.sha224((parsed.netloc + path + (("?" + parsed.query) if parsed.query else "")).encode("utf-8")) \
+        .hexdigest()
+
+
+@pytest.mark.parametrize("url", [
+    "http://WWW.ICS.UCI.EDU:80/a/b.html",
+    "https://www.ics.uci.edu/a/b.html",
+    "http://www.ics.uci.edu/a/b.html/",
+    "http://www.ics.uci.edu/a/b.html#part",
+])
+def test_forms_of_a_page_have_one_canonical_url(url):
+    assert canonicalize(url)[0] == "http://www.ics.uci.edu/a/b.html"
+
+
+def test_canonical_url_sorts_the_query_and_keeps_other_ports():
+    assert canonicalize("http://www.ics.uci.edu/?b=2&a=1")[0] == "http://www.ics.uci.edu/?a=1&b=2"
+    assert canonicalize("http://www.ics.uci.edu:8080/")[0] == "http://www.ics.uci.edu:8080/"
+
+
+@pytest.mark.parametrize("url", [
+    "http://www.ics.uci.edu/",
+    "http://WWW.ics.uci.edu/a/",
+    "https://www.ics.uci.edu/a?y=1&x=2",
+    "http://www.ics.uci.edu/a#part",
+])
+def test_corpus_hash_of_the_url_as_given(url):
+    assert canonicalize(url)[1] == baseline_hashed_link(url) == Corpus.get_hashed_link(url)
+
+
+def test_unique_links_keep_the_first_form_without_fragment():
+    links = ["http://www.ics.uci.edu/a#top", "http://www.ics.uci.edu/b", "https://www.ics.uci.edu/a/",
+             "http://WWW.ics.uci.edu/b"]
+    assert unique_links(links) == ["http://www.ics.uci.edu/a", "http://www.ics.uci.edu/b"]
+
+
+def test_frontier_keeps_one_form_of_a_page():
+    frontier = Frontier()
+    for url in ["http://www.ics.uci.edu/a/", "https://WWW.ics.uci.edu/a", "http://www.ics.uci.edu/a#x"]:
+        frontier.add_url(url)
+    assert list(frontier.urls_queue) == ["http://www.ics.uci.edu/a/"]
+    assert frontier.is_duplicate("http://www.ics.uci.edu:80/a")
+
+
+@pytest.fixture
+def crawler(tmp_path, monkeypatch):
+    # the stop words are read from the working directory
+    monkeypatch.chdir(ROOT_DIR)
+    return Crawler(Frontier(), Corpus(str(tmp_path), CorpusIndex.build(str(tmp_path))))
+
+
+def test_already_checked_urls_are_keyed_on_their_canonical_url(crawler):
+    crawler.check_already.add(canonicalize("http://www.ics.uci.edu/a/b.html")[0])
+    verdict = crawler.classify_links(["https://WWW.ics.uci.edu:443/a/b.html/"])[0]
+    assert (verdict.accepted, verdict.reason) == (False, url_classifier.ALREADY_CHECKED)
+
+
+def test_records_are_cached_under_the_canonical_url(crawler):
+    processor = crawler.page_processor
+    assert PageProcessor.get_record_key("http://www.ics.uci.edu/a/") == \
+        PageProcessor.get_record_key("https://WWW.ics.uci.edu/a")
+    record = processor.process_url("http://www.ics.uci.edu/a/")
+    assert processor.process_url("https://WWW.ics.uci.edu/a") is record
@@ -0,0 +1,64 @@
+import os
+
+import pytest
+from cbor import cbor
+
+from corpus import Corpus, CorpusIndex
+from corpus_archive import ArchiveCorpus, CorpusArchive
+
+URLS = ["http://www.ics.uci.edu/", "http://www.ics.uci.edu/a/page.html", "http://www.ics.uci.edu/old/page.html",
+        "http://www.ics.uci.edu/empty.html"]
+MISSING_URL = "http://www.ics.uci.edu/missing.html"
+
+
+def write_record(corpus_dir, url, content, final_url=None):
+    record = {
+        b"raw_content": {b"value": content},
+        b"http_code": {b"value": 200},
+        b"http_headers": {b"value": [{b"k": {b"value": b"Content-Type"}, b"v": {b"value": b"text/html"}}]},
+        b"is_redirected": {b"value": final_url is not None},
+        b"final_url": {b"value": final_url}
+    }
+    with open(os.path.join(corpus_dir, Corpus.get_hashed_link(url)), "wb") as file:
+        cbor.dump(record, file)
+
+
+@pytest.fixture(scope="module")
+def corpora(tmp_path_factory):
+    tmp_path = tmp_path_factory.mktemp("archive")
+    corpus_dir = str(tmp_path / "corpus")
+    os.makedirs(corpus_dir)
+    write_record(corpus_dir, URLS[0], b"<html><body><a href='/a/page.html'>a</a></body></html>")
+    write_record(corpus_dir, URLS[1], b"<html><body>" + b"text " * 20000 + b"</body></html>")
+    write_record(corpus_dir, URLS[2], b"<html><body>moved</body></html>", final_url="http://www.ics.uci.edu/new")
+    write_record(corpus_dir, URLS[3], b"")
+    archive_file_name = str(tmp_path / "corpus.arc")
+    assert CorpusArchive.pack(corpus_dir, archive_file_name) == len(URLS)
+    archive = ArchiveCorpus(archive_file_name)
+    yield Corpus(corpus_dir, CorpusIndex.build(corpus_dir)), archive
+    archive.close()
+
+
+@pytest.mark.parametrize("url", URLS + [MISSING_URL])
+def test_archive_round_trip(corpora, url):
+    corpus, archive = corpora
+    expected = corpus.fetch_url(url)
+    url_data = archive.fetch_url(url)
+    for key in ("url", "http_code", "content_type", "size", "is_redirected", "final_url"):
+        assert url_data[key] == expected[key]
+    if expected["content"] is None:
+        assert url_data["content"] is None
+    else:
+        assert bytes(url_data["content"]) == bytes(expected["content"])
+    assert (archive.get_file_name(url) is None) == (corpus.get_file_name(url) is None)
+
+
+@pytest.mark.parametrize("url", URLS)
+def test_metadata_only_fetch(corpora, url):
+    corpus, archive = corpora
+    expected = corpus.fetch_url(url)
+    for source in (corpus, archive):
+        url_data = source.fetch_metadata(url)
+        assert url_data["content"] is None
+        assert (url_data["http_code"], url_data["content_type"], url_data["final_url"]) == \
+            (expected["http_code"], expected["content_type"], expected["final_url"])
@@ -0,0 +1,82 @@
+import os
+import threading
+
+import pytest
+from cbor import cbor
+
+from corpus import Corpus, CorpusIndex
+from corpus_server import CorpusRequestHandler, CorpusServer
+from http_fetcher import HttpFetcher
+
+PAGE_URL = "http://www.ics.uci.edu/a/page.html"
+REDIRECTED_URL = "http://www.ics.uci.edu/old/page.html"
+FINAL_URL = "http://www.ics.uci.edu/new/page.html"
+MISSING_URL = "http://www.ics.uci.edu/missing.html"
+
+
+def write_record(corpus_dir, url, content, final_url=None):
+    record = {
+        b"raw_content": {b"value": content},
+        b"http_code": {b"value": 200},
+        b"http_headers": {b"value": [{b"k": {b"value": b"Content-Type"},
+                                      b"v": {b"value": b"text/html; charset=utf-8"}}]},
+        b"is_redirected": {b"value": final_url is not None},
+        b"final_url": {b"value": final_url}
+    }
+    with open(os.path.join(corpus_dir, Corpus.get_hashed_link(url)), "wb") as file:
+        cbor.dump(record, file)
+
+
+@pytest.fixture(scope="module")
+def corpus(tmp_path_factory):
+    corpus_dir = str(tmp_path_factory.mktemp("corpus"))
+    write_record(corpus_dir, PAGE_URL, b"<html><body><a href='/b.html'>b</a></body></html>")
+    write_record(corpus_dir, REDIRECTED_URL, b"<html><body>moved</body></html>", final_url=FINAL_URL)
+    return Corpus(corpus_dir, CorpusIndex.build(corpus_dir))
+
+
+@pytest.fixture(scope="module")
+def server_address(corpus):
+    server = CorpusServer(("127.0.0.1", 0), corpus)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server.server_address
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(scope="module")
+def fetcher(server_address):
+    fetcher = HttpFetcher(per_host_delay=0.0, timeout=5.0, proxy=server_address)
+    yield fetcher
+    fetcher.close()
+
+
+@pytest.mark.parametrize("url", [PAGE_URL, REDIRECTED_URL, MISSING_URL])
+def test_fetch_url_matches_corpus(corpus, fetcher, url):
+    expected = corpus.fetch_url(url)
+    url_data = fetcher.fetch_url(url)
+
+    assert url_data["url"] == url
+    assert url_data["http_code"] == expected["http_code"]
+    assert url_data["is_redirected"] == expected["is_redirected"]
+    assert url_data["final_url"] == expected["final_url"]
+    # the corpus keeps the Content-Type as the str() of the header bytes, which the server sends as the header value
+    assert url_data["content_type"] == CorpusRequestHandler.get_content_type(expected)
+    if expected["content"] is not None:
+        assert bytes(url_data["content"]) == bytes(expected["content"])
+
+
+def test_fetch_many_keeps_order(corpus, fetcher):
+    urls = [MISSING_URL, PAGE_URL, REDIRECTED_URL]
+    assert [url_data["http_code"] for url_data in fetcher.fetch_many(urls)] == [404, 200, 200]
+
+
+def test_politeness_delay_is_not_timed_out(server_address):
+    # the last requests to the host wait for the politeness delay far longer than the timeout
+    fetcher = HttpFetcher(per_host_delay=0.1, timeout=0.5, proxy=server_address)
+    try:
+        urls = [PAGE_URL, MISSING_URL] * 8
+        assert [url_data["http_code"] for url_data in fetcher.fetch_many(urls)] == [200, 404] * 8
+    finally:
+        fetcher.close()
@@ -0,0 +1,36 @@
+from cbor import cbor
+
+from lazy_cbor import LazyRecord
+
+RECORD = {
+    b"raw_content": {b"value": b"<html><body>page</body></html>"},
+    b"http_code": {b"value": 200},
+    b"http_headers": {b"value": [{b"k": {b"value": b"Content-Type"}, b"v": {b"value": b"text/html"}}]},
+    b"is_redirected": {b"value": True},
+    b"final_url": {b"value": "http://www.ics.uci.edu/new"},
+    b"empty": {}
+}
+
+
+def test_decodes_like_cbor():
+    data = cbor.dumps(RECORD)
+    record = LazyRecord(data)
+    assert set(record) == set(RECORD)
+    for key, value in RECORD.items():
+        assert record[key] == value
+
+
+def test_wrapped_values():
+    record = LazyRecord(cbor.dumps(RECORD))
+    assert record.get_value(b"http_code") == 200
+    assert record.get_value(b"final_url") == "http://www.ics.uci.edu/new"
+    assert record.get_value(b"empty", "default") == "default"
+    assert record.get_value(b"missing") is None
+    content = record.get_bytes(b"raw_content")
+    assert isinstance(content, memoryview)
+    assert bytes(content) == b"<html><body>page</body></html>"
+
+
+def test_record_at_an_offset():
+    data = b"header" + cbor.dumps(RECORD)
+    assert LazyRecord(data, len(b"header")).get_value(b"http_code") == 200
@@ -0,0 +1,48 @@
+import pickle
+
+from manifest import PageManifest
+from page_processor import PageRecord
+
+
+def make_record():
+    record = PageRecord("http://www.ics.uci.edu/", "b'text/html'", True, ["http://www.ics.uci.edu/a"], ["ics", "uci"],
+                        {1: 1})
+    record.http_code = 200
+    record.digest = 42
+    return record
+
+
+def make_old_record():
+    """
+    Returns a record as saved before the http_code slot was added: a slot that is not set is left out of the pickle
+    """
+    record = make_record()
+    del record.http_code
+    return record
+
+
+def test_record_round_trip():
+    record = pickle.loads(pickle.dumps(make_record(), pickle.HIGHEST_PROTOCOL))
+    assert (record.url, record.http_code, record.links, record.tokens, record.token_count, record.digest) == \
+        ("http://www.ics.uci.edu/", 200, ["http://www.ics.uci.edu/a"], ["ics", "uci"], 2, 42)
+
+
+def test_old_record_takes_the_defaults_of_the_missing_slots():
+    record = pickle.loads(pickle.dumps(make_old_record(), pickle.HIGHEST_PROTOCOL))
+    assert record.http_code is None
+    assert (record.url, record.links, record.token_count, record.digest) == \
+        ("http://www.ics.uci.edu/", ["http://www.ics.uci.edu/a"], 2, 42)
+
+
+def test_old_record_from_the_manifest(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    manifest = PageManifest()
+    manifest.open()
+    manifest.put("http://www.ics.uci.edu/", "file", 100, 5, make_old_record())
+    manifest.close()
+
+    manifest.open()
+    record = manifest.get("http://www.ics.uci.edu/", 100, 5)
+    manifest.close()
+    assert record.http_code is None
+    assert record.links == ["http://www.ics.uci.edu/a"]
@@ -0,0 +1,43 @@
+import os
+import shutil
+
+import pytest
+
+from benchmarks.corpus_generator import CorpusGenerator
+from corpus import Corpus, CorpusIndex
+from crawler import Crawler
+from frontier import Frontier
+from parallel_crawler import ParallelCrawler
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def corpus_dir(tmp_path, monkeypatch):
+    # the crawl state and the report are written to the working directory, next to the stop words
+    shutil.copy(os.path.join(ROOT_DIR, "stopwords.txt"), tmp_path)
+    monkeypatch.chdir(tmp_path)
+    corpus_dir = str(tmp_path / "corpus")
+    # a fifth of the pages are byte for byte copies of another page
+    stats = CorpusGenerator(corpus_dir, pages=120, hosts=2, links_per_page=8, duplicate_rate=0.2, trap_rate=0.0,
+                            seed=0).generate()
+    assert stats["exact_duplicates"] > 0
+    return corpus_dir
+
+
+def crawl(crawler_class, corpus_dir, report_file_name, **kwargs):
+    shutil.rmtree("frontier_state", ignore_errors=True)
+    frontier = Frontier()
+    frontier.add_url("http://www.ics.uci.edu/")
+    crawler = crawler_class(frontier, Corpus(corpus_dir, CorpusIndex.build(corpus_dir)), **kwargs)
+    crawler.start_crawling()
+    crawler.analytics.write_report(report_file_name)
+    crawler.analytics.log.close()
+    with open(report_file_name, "r", encoding="utf-8") as report_file:
+        return report_file.read()
+
+
+def test_parallel_report_matches_serial_with_exact_duplicates(corpus_dir):
+    serial_report = crawl(Crawler, corpus_dir, "serial.txt")
+    parallel_report = crawl(ParallelCrawler, corpus_dir, "parallel.txt", workers=2, batch_size=8)
+    assert parallel_report == serial_report
@@ -0,0 +1,29 @@
+import pickle
+
+import pytest
+
+from seen_store import FingerprintSet, SeenSet
+
+URLS = [f"http://www.ics.uci.edu/page{i}.html" for i in range(3000)]
+
+
+@pytest.mark.parametrize("set_class", [FingerprintSet, SeenSet])
+def test_answers_like_a_set_while_growing(set_class):
+    seen = set_class()
+    assert all(seen.add(url) for url in URLS)
+    assert not any(seen.add(url) for url in URLS[::7])
+    assert len(seen) == len(URLS)
+    assert all(url in seen for url in URLS)
+    assert not any(f"http://www.ics.uci.edu/other{i}.html" in seen for i in range(3000))
+
+
+@pytest.mark.parametrize("set_class", [FingerprintSet, SeenSet])
+def test_pickle_round_trip(set_class):
+    seen = set_class()
+    for url in URLS[:100]:
+        seen.add(url)
+    loaded = pickle.loads(pickle.dumps(seen))
+    assert len(loaded) == 100
+    assert all(url in loaded for url in URLS[:100])
+    assert URLS[100] not in loaded
+    assert loaded.add(URLS[100])
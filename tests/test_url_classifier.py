@@ -0,0 +1,97 @@
+import re
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+import url_classifier
+from url_classifier import UrlClassifier
+
+# The file extension pattern of the crawler before the rules moved to UrlClassifier
+BASELINE_EXTENSIONS = re.compile(
+    ".*\\.(css|js|bmp|gif|jpe?g|ico|png|tiff?|mid|mp2|mp3|mp4|wav|avi|mov|mpeg|ram|m4v|mkv|ogg|ogv|pdf"
+    "|ps|eps|tex|ppt|pptx|doc|docx|xls|xlsx|names|data|dat|exe|bz2|tar|msi|bin|7z|psd|dmg|iso|epub|dll|cnf|tgz|sha1"
+    "|thmx|mso|arff|rtf|jar|csv|rm|smil|wmv|swf|wma|zip|rar|gz|pdf|j_peg.php)$")
+BASELINE_QUERY_KEYS = ["action", "download", "upname", "session", "session_id", "sessionid", "do", "ucinetid", "format",
+                       "task", "sort", "name", "search"]
+
+URLS = [
+    "http://www.ics.uci.edu/",
+    "https://www.ics.uci.edu/about/index.php",
+    "ftp://www.ics.uci.edu/file.txt",
+    "mailto:webmaster@ics.uci.edu",
+    "http://www.example.com/page.html",
+    "http://www.ics.uci.edu/files/report.PDF",
+    "http://www.ics.uci.edu/img/photo.jpeg",
+    "http://www.ics.uci.edu/img/photo.tif",
+    "http://www.ics.uci.edu/archive.tar.gz",
+    "http://www.ics.uci.edu/gallery/pic.j_peg.php",
+    "http://www.ics.uci.edu/gallery/picj_peg.php",
+    "http://www.ics.uci.edu/gallery/j_peg.php",
+    "http://www.ics.uci.edu/a.css/page.html",
+    "http://www.ics.uci.edu/page.html?sort=asc",
+    "http://www.ics.uci.edu/page.html?sorted=asc",
+    "http://www.ics.uci.edu/page.html#section",
+    "http://www.ics.uci.edu/a b.html",
+    "http://www.ics.uci.edu/" + "long/" * 20,
+    "http://www.ics.uci.edu/p?a=1&b=2&c=3&d=4",
+    "http://www.ics.uci.edu/p?a=1&b=2&c=3",
+    "http://www.ics.uci.edu/files/files/page.html",
+    "http://www.ics.uci.edu/Files/files/page.html",
+    "http://www.ics.uci.edu/a/b/a",
+    "http://vision.ics.uci.edu/projects/",
+]
+
+
+def baseline_crawlable(url):
+    """
+    The url-only part of is_valid before UrlClassifier: an http(s) url of the domain that is not a file
+    """
+    parsed = urlparse(url)
+    if parsed.scheme not in ("http", "https"):
+        return False
+    try:
+        return ".ics.uci.edu" in parsed.hostname and not BASELINE_EXTENSIONS.match(parsed.path.lower())
+    except TypeError:
+        return False
+
+
+def baseline_rules(url):
+    """
+    The url-only rules of is_link_trap before UrlClassifier: whether the url has a trap query key, has a fragment and
+    breaks one of the rules checked after the directory lists, and its directory
+    """
+    parsed = urlparse(url)
+    query_params = parse_qs(parsed.query)
+    trap_key = any(word in query_params for word in BASELINE_QUERY_KEYS)
+    subdirectories = [part for part in parsed.path.lower().split("/") if part != ""]
+    late = " " in url or len(url) > 80 or len(query_params) > 3 or \
+        any(subdirectories.count(part) > 1 for part in subdirectories)
+    return trap_key, parsed.fragment != "", late, "/".join(parsed.path.split("/")[:-1])
+
+
+@pytest.mark.parametrize("url", URLS)
+def test_verdicts_match_the_baseline_rules(url):
+    verdict = UrlClassifier().classify(url)
+    if not baseline_crawlable(url):
+        assert verdict.accepted is False
+        assert verdict.reason in (url_classifier.NOT_HTTP, url_classifier.OUT_OF_DOMAIN, url_classifier.FILE_EXTENSION)
+        return
+    trap_key, fragment, late, directory = baseline_rules(url)
+    assert verdict.accepted is None
+    assert (verdict.early_reason is not None, verdict.fragment, verdict.late_reason is not None, verdict.directory) == \
+        (trap_key, fragment, late, directory)
+
+
+@pytest.mark.parametrize("url, reason", [
+    ("ftp://www.ics.uci.edu/file.txt", url_classifier.NOT_HTTP),
+    ("http://www.example.com/page.html", url_classifier.OUT_OF_DOMAIN),
+    ("http://www.ics.uci.edu/files/report.PDF", url_classifier.FILE_EXTENSION),
+    ("http://www.ics.uci.edu/page.html?sort=asc", url_classifier.TRAP_QUERY_KEY),
+    ("http://www.ics.uci.edu/a b.html", url_classifier.SPACE),
+    ("http://www.ics.uci.edu/" + "long/" * 20, url_classifier.TOO_LONG),
+    ("http://www.ics.uci.edu/p?a=1&b=2&c=3&d=4", url_classifier.TOO_MANY_PARAMS),
+    ("http://www.ics.uci.edu/files/files/page.html", url_classifier.REPEATED_DIRECTORY),
+])
+def test_reason_codes(url, reason):
+    verdict = UrlClassifier().classify(url)
+    assert reason in (verdict.reason, verdict.early_reason, verdict.late_reason)
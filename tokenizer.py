@@ -0,0 +1,93 @@
+import hashlib
+import re
+from collections import Counter
+from functools import lru_cache
+
+
+@lru_cache(maxsize=None)
+def load_stop_words(file_name="stopwords.txt"):
+    """
+    Returns the stop words listed in the given file, one per line, as a lowercase frozenset. The file is read once per
+    process
+    """
+    with open(file_name, "r", encoding="utf-8") as stop_words_file:
+        return frozenset(line.strip().lower() for line in stop_words_file if line.strip())
+
+
+@lru_cache(maxsize=1 << 16)
+def hash_word(word):
+    """
+    Returns the 64-bit hash of a word, given as str or utf-8 bytes. The most common words of a crawl are hashed once
+    """
+    if isinstance(word, str):
+        word = word.encode("utf-8", "surrogatepass")
+    return int.from_bytes(hashlib.blake2b(word, digest_size=8).digest(), "little")
+
+
+class Tokenizer:
+    """
+    This class splits the text of a page into tokens and shingles. It works over str or bytes and runs the scanning in
+    precompiled regular expressions instead of character by character.
+
+    Tokens are the runs of ascii letters and digits of the lowercase text. tokens and words are generators, so the
+    tokens of a page are only materialized by the caller if it needs them.
+
+    Shingles are the phrases of up to n_length whitespace separated words of the text: the phrase window grows by one
+    word at a time until it is n_length words long and then slides along the text one word at a time. Each word is
+    hashed once to a 64-bit value and each phrase is represented by the hash of the tuple of the values of its words,
+    so the phrases are never built as strings. Hashes of tuples of integers do not depend on PYTHONHASHSEED, so the
+    shingles of a page are the same in every process.
+
+    Attributes:
+        stop_words: a frozenset of the words removed by words and remove_stop_words
+        n_length: the maximum number of words of a shingle
+    """
+
+    TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+    BYTES_TOKEN_PATTERN = re.compile(rb"[a-z0-9]+")
+
+    def __init__(self, stop_words=frozenset(), n_length=5):
+        self.stop_words = frozenset(stop_words)
+        self.n_length = n_length
+
+    def tokens(self, text):
+        """
+        Yields the lowercase tokens made of ascii letters and digits of the text, in order
+        """
+        if isinstance(text, (bytes, bytearray, memoryview)):
+            for match in self.BYTES_TOKEN_PATTERN.finditer(bytes(text).lower()):
+                yield match.group().decode("ascii")
+        else:
+            for match in self.TOKEN_PATTERN.finditer(text.lower()):
+                yield match.group()
+
+    def words(self, text):
+        """
+        Yields the tokens of the text that are not stop words
+        """
+        return self.remove_stop_words(self.tokens(text))
+
+    def remove_stop_words(self, tokens):
+        """
+        Yields the given tokens that are not stop words
+        """
+        stop_words = self.stop_words
+        return (token for token in tokens if token not in stop_words)
+
+    def shingles(self, text):
+        """
+        Returns a dictionary of the hashes of the phrases of the text -> the number of times they appear
+        """
+        if isinstance(text, (bytes, bytearray, memoryview)):
+            words = bytes(text).lower().split()
+        else:
+            words = text.lower().split()
+
+        hashes = list(map(hash_word, words))
+        n_length = self.n_length
+        # the full windows: the tuples of n_length consecutive word hashes, built and hashed without a python loop
+        shingles = Counter(map(hash, zip(*[hashes[start:] for start in range(n_length)])))
+        # the growing windows at the start of the text
+        for length in range(1, min(n_length, len(hashes) + 1)):
+            shingles[hash(tuple(hashes[:length]))] += 1
+        return shingles
@@ -0,0 +1,175 @@
+from collections import Counter
+from functools import lru_cache
+from urllib.parse import parse_qs, urlparse
+
+# Reason codes of the verdicts, in the order the rules are applied
+INVALID_URL = "invalid_url"
+NOT_HTTP = "not_http"
+OUT_OF_DOMAIN = "out_of_domain"
+FILE_EXTENSION = "file_extension"
+TRAP_QUERY_KEY = "trap_query_key"
+ALREADY_CHECKED = "already_checked"
+FRAGMENT = "fragment"
+WHITELISTED_DIRECTORY = "whitelisted_directory"
+BLACKLISTED_DIRECTORY = "blacklisted_directory"
+SPACE = "space"
+TOO_LONG = "too_long"
+TOO_MANY_PARAMS = "too_many_params"
+REPEATED_DIRECTORY = "repeated_directory"
+SIMILAR_CONTENT = "similar_content"
+UNIQUE_CONTENT = "unique_content"
+SIMILARITY_ERROR = "similarity_error"
+DEFERRED_SIMILARITY = "deferred_similarity"
+# a crawled page dropped as a near-duplicate by the deferred similarity check, not a verdict on a link
+NEAR_DUPLICATE_PAGE = "near_duplicate_page"
+
+
+class UrlVerdict:
+    """
+    This class is the verdict of the UrlClassifier on one url, with everything the crawler still needs to finish it.
+
+    Attributes:
+        url: the classified url
+        accepted: True or False once decided, None while the rules that depend on the crawl state are pending
+        reason: the reason code of the rule that decided the verdict
+        directory: the directory of the url, as used by the black and white lists
+        early_reason: the reason code of a url-only rule that rejects the url before the already checked rule
+        fragment: whether the url has a fragment
+        late_reason: the reason code of a url-only rule that rejects the url unless its directory is whitelisted
+    """
+
+    __slots__ = ("url", "accepted", "reason", "directory", "early_reason", "fragment", "late_reason")
+
+    def __init__(self, url):
+        self.url = url
+        self.accepted = None
+        self.reason = None
+        self.directory = ""
+        self.early_reason = None
+        self.fragment = False
+        self.late_reason = None
+
+    def decide(self, accepted, reason):
+        self.accepted = accepted
+        self.reason = reason
+        return self
+
+
+class UrlClassifier:
+    """
+    This class applies the url-only rules of the crawler to all the links of a page at once. Each url is parsed once,
+    the rules use precompiled tables (an extension frozenset, a query key frozenset and length limits), and the
+    repeated directory rule is memoized per directory.
+
+    classify_batch returns one UrlVerdict per url. Urls rejected by the rules that come first (scheme, domain,
+    extension) are decided; for the others the verdict keeps the results of the url-only rules so the crawler can
+    finish it against its black and white lists and content similarity, in the same order as before.
+
+    reason_counts counts the verdicts by reason code, for tuning the rules.
+    """
+
+    DOMAIN = ".ics.uci.edu"
+    FILE_EXTENSIONS = frozenset([
+        "css", "js", "bmp", "gif", "jpg", "jpeg", "ico", "png", "tif", "tiff", "mid", "mp2", "mp3", "mp4", "wav", "avi",
+        "mov", "mpeg", "ram", "m4v", "mkv", "ogg", "ogv", "pdf", "ps", "eps", "tex", "ppt", "pptx", "doc", "docx", "xls",
+        "xlsx", "names", "data", "dat", "exe", "bz2", "tar", "msi", "bin", "7z", "psd", "dmg", "iso", "epub", "dll",
+        "cnf", "tgz", "sha1", "thmx", "mso", "arff", "rtf", "jar", "csv", "rm", "smil", "wmv", "swf", "wma", "zip",
+        "rar", "gz"
+    ])
+    TRAP_QUERY_KEYS = frozenset([
+        "action", "download", "upname", "session", "session_id", "sessionid", "do", "ucinetid", "format", "task",
+        "sort", "name", "search"
+    ])
+    # reducing links based on len of the links ~79 avg len of all links
+    MAX_URL_LENGTH = 80
+    MAX_QUERY_PARAMS = 3
+
+    def __init__(self, directory_memo_size=65536):
+        self.reason_counts = Counter()
+        self.directory_segments = lru_cache(maxsize=directory_memo_size)(self._directory_segments)
+
+    def classify_batch(self, urls):
+        """
+        Returns the verdicts of the url-only rules for the given urls, in the same order
+        """
+        return [self.classify(url) for url in urls]
+
+    def classify(self, url):
+        """
+        Returns the verdict of the url-only rules for one url
+        """
+        verdict = UrlVerdict(url)
+        try:
+            parsed = urlparse(url)
+        except ValueError:
+            return verdict.decide(False, INVALID_URL)
+        reason = self.crawlable_reason(parsed)
+        if reason is not None:
+            return verdict.decide(False, reason)
+
+        query_params = parse_qs(parsed.query)
+        if not self.TRAP_QUERY_KEYS.isdisjoint(query_params):
+            verdict.early_reason = TRAP_QUERY_KEY
+        # all fragments do is lead to part of a page -> duplicate content
+        verdict.fragment = parsed.fragment != ""
+        path = parsed.path
+        verdict.directory = self.get_directory(path)
+
+        if " " in url:
+            # not a url
+            verdict.late_reason = SPACE
+        elif len(url) > self.MAX_URL_LENGTH:
+            verdict.late_reason = TOO_LONG
+        elif len(query_params) > self.MAX_QUERY_PARAMS:
+            verdict.late_reason = TOO_MANY_PARAMS
+        elif self.has_repeated_directory(path.lower()):
+            verdict.late_reason = REPEATED_DIRECTORY
+        return verdict
+
+    def crawlable_reason(self, parsed):
+        """
+        Returns the reason code if the parsed url is not an http(s) url of the domain pointing to an html page, based on
+        its extension, or None if it is
+        """
+        if parsed.scheme not in ("http", "https"):
+            return NOT_HTTP
+        hostname = parsed.hostname
+        if hostname is None or self.DOMAIN not in hostname:
+            return OUT_OF_DOMAIN
+        path = parsed.path.lower()
+        dot = path.rfind(".")
+        if dot != -1 and path[dot + 1:] in self.FILE_EXTENSIONS:
+            return FILE_EXTENSION
+        # the j_peg.php pages, where any character can stand between j_peg and php
+        if len(path) >= 10 and path[-10] == "." and path[-9:-4] == "j_peg" and path.endswith("php"):
+            return FILE_EXTENSION
+        return None
+
+    @staticmethod
+    def get_directory(path):
+        """
+        Returns the directory of a url path, as used by the black and white lists: the path up to its last slash
+        """
+        return path[:path.rfind("/")] if "/" in path else ""
+
+    def has_repeated_directory(self, path):
+        """
+        Returns True if any directory or file name appears twice in the (lowercase) path
+        """
+        slash = path.rfind("/")
+        repeated, segments = self.directory_segments(path[:slash + 1])
+        name = path[slash + 1:]
+        return repeated or (name != "" and name in segments)
+
+    @staticmethod
+    def _directory_segments(directory):
+        segments = [part for part in directory.split("/") if part != ""]
+        unique = frozenset(segments)
+        return len(unique) != len(segments), unique
+
+    def count(self, verdict):
+        """
+        Counts a decided verdict by its reason code
+        """
+        self.reason_counts[verdict.reason] += 1
+        return verdict
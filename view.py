@@ -6,7 +6,7 @@ if __name__ == "__main__":
     c = Corpus(corpus_dir)
     url_data = c.fetch_url(input("Enter url:"))
     print(url_data)
-    text = (BeautifulSoup(url_data["content"]).prettify())
+    text = (BeautifulSoup(bytes(url_data["content"])).prettify())
     Path.touch("html.html")
     with open("html.html", 'w', encoding="utf-8") as html_file:
         html_file.write(text)
\ No newline at end of file